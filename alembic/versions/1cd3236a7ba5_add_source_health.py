@@ -0,0 +1,38 @@
+"""Add source health
+
+Revision ID: 1cd3236a7ba5
+Revises: 3f2bc2fc7e96
+Create Date: 2026-10-19 19:42:08.551903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1cd3236a7ba5'
+down_revision: Union[str, Sequence[str], None] = '3f2bc2fc7e96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('source_health',
+    sa.Column('host', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    sa.Column('consecutive_failures', sa.Integer(), nullable=False),
+    sa.Column('last_success_at', sa.DateTime(), nullable=True),
+    sa.Column('last_failure_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('retry_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('host')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('source_health')
@@ -0,0 +1,60 @@
+"""Add offer full-text search
+
+Revision ID: 58dc6cf29c31
+Revises: 6e8f295033b2
+Create Date: 2026-10-19 20:21:33.647018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58dc6cf29c31'
+down_revision: Union[str, Sequence[str], None] = '6e8f295033b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # FTS5 is SQLite-only; other databases go without full-text search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE offers_fts USING fts5(
+            title, district,
+            content='offers', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER offers_fts_insert AFTER INSERT ON offers BEGIN
+            INSERT INTO offers_fts(rowid, title, district) VALUES (new.id, new.title, new.district);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER offers_fts_delete AFTER DELETE ON offers BEGIN
+            INSERT INTO offers_fts(offers_fts, rowid, title, district) VALUES ('delete', old.id, old.title, old.district);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER offers_fts_update AFTER UPDATE OF title, district ON offers BEGIN
+            INSERT INTO offers_fts(offers_fts, rowid, title, district) VALUES ('delete', old.id, old.title, old.district);
+            INSERT INTO offers_fts(rowid, title, district) VALUES (new.id, new.title, new.district);
+        END
+    """)
+    op.execute("INSERT INTO offers_fts(offers_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS offers_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS offers_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS offers_fts_insert")
+    op.execute("DROP TABLE IF EXISTS offers_fts")
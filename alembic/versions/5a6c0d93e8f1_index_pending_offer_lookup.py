@@ -0,0 +1,30 @@
+"""Index pending offer lookup
+
+Revision ID: 5a6c0d93e8f1
+Revises: e7d42b9a1c58
+Create Date: 2026-10-20 15:41:19.602384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a6c0d93e8f1'
+down_revision: Union[str, Sequence[str], None] = 'e7d42b9a1c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_offers_scraped_at', 'offers', ['scraped_at'], unique=False)
+    op.create_index(op.f('ix_offer_details_url'), 'offer_details', ['url'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_offer_details_url'), table_name='offer_details')
+    op.drop_index('ix_offers_scraped_at', table_name='offers')
@@ -0,0 +1,28 @@
+"""Add notification digest window
+
+Revision ID: 5b2f2fb53c85
+Revises: 4d9744d63f51
+Create Date: 2026-10-19 11:24:37.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f2fb53c85'
+down_revision: Union[str, Sequence[str], None] = '4d9744d63f51'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('notification_settings', sa.Column('digest_window_minutes', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notification_settings', 'digest_window_minutes')
@@ -0,0 +1,32 @@
+"""Add updated_at change markers
+
+Revision ID: 67e8aab2a96c
+Revises: e068c61df03f
+Create Date: 2026-10-19 14:55:52.130477
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '67e8aab2a96c'
+down_revision: Union[str, Sequence[str], None] = 'e068c61df03f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('search_queries', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('notification_settings', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE search_queries SET updated_at = created_at')
+    op.execute('UPDATE notification_settings SET updated_at = created_at')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('notification_settings', 'updated_at')
+    op.drop_column('search_queries', 'updated_at')
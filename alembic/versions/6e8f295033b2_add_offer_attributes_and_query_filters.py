@@ -0,0 +1,57 @@
+"""Add offer attributes and query filters
+
+Revision ID: 6e8f295033b2
+Revises: a5025909adcb
+Create Date: 2026-10-19 19:05:47.310992
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e8f295033b2'
+down_revision: Union[str, Sequence[str], None] = 'a5025909adcb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('offers', sa.Column('price', sa.Integer(), nullable=True))
+    op.add_column('offers', sa.Column('area', sa.Float(), nullable=True))
+    op.add_column('offers', sa.Column('rooms', sa.Integer(), nullable=True))
+    op.add_column('offers', sa.Column('district', sa.String(), nullable=True))
+    op.create_index(op.f('ix_offers_price'), 'offers', ['price'], unique=False)
+    op.create_index(op.f('ix_offers_area'), 'offers', ['area'], unique=False)
+    op.create_index(op.f('ix_offers_rooms'), 'offers', ['rooms'], unique=False)
+    op.create_index(op.f('ix_offers_district'), 'offers', ['district'], unique=False)
+
+    op.create_table('query_filters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('query_id', sa.Integer(), nullable=False),
+    sa.Column('field', sa.String(), nullable=False),
+    sa.Column('op', sa.String(), nullable=False),
+    sa.Column('value', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['query_id'], ['search_queries.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_query_filters_id'), 'query_filters', ['id'], unique=False)
+    op.create_index(op.f('ix_query_filters_query_id'), 'query_filters', ['query_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_query_filters_query_id'), table_name='query_filters')
+    op.drop_index(op.f('ix_query_filters_id'), table_name='query_filters')
+    op.drop_table('query_filters')
+    op.drop_index(op.f('ix_offers_district'), table_name='offers')
+    op.drop_index(op.f('ix_offers_rooms'), table_name='offers')
+    op.drop_index(op.f('ix_offers_area'), table_name='offers')
+    op.drop_index(op.f('ix_offers_price'), table_name='offers')
+    op.drop_column('offers', 'district')
+    op.drop_column('offers', 'rooms')
+    op.drop_column('offers', 'area')
+    op.drop_column('offers', 'price')
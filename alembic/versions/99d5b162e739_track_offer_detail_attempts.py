@@ -0,0 +1,34 @@
+"""Track offer detail attempts
+
+Revision ID: 99d5b162e739
+Revises: f41c7a9e2d36
+Create Date: 2026-10-20 14:37:05.219384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '99d5b162e739'
+down_revision: Union[str, Sequence[str], None] = 'f41c7a9e2d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('offer_details') as batch_op:
+        batch_op.add_column(sa.Column('attempts', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.drop_index(batch_op.f('ix_offer_details_content_hash'))
+        batch_op.drop_column('content_hash')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('offer_details') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_offer_details_content_hash'), ['content_hash'], unique=False)
+        batch_op.drop_column('attempts')
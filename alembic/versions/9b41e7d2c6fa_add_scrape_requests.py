@@ -0,0 +1,58 @@
+"""Add scrape requests
+
+Revision ID: 9b41e7d2c6fa
+Revises: cde7c5511ee0
+Create Date: 2026-10-19 21:04:12.518930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b41e7d2c6fa'
+down_revision: Union[str, Sequence[str], None] = 'cde7c5511ee0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scrape_requests',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('query_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('requested_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['query_id'], ['search_queries.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scrape_requests_id'), 'scrape_requests', ['id'], unique=False)
+    op.create_index(op.f('ix_scrape_requests_query_id'), 'scrape_requests', ['query_id'], unique=False)
+    op.create_index(op.f('ix_scrape_requests_status'), 'scrape_requests', ['status'], unique=False)
+    op.create_table('scrape_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('request_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['request_id'], ['scrape_requests.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scrape_events_request_id'), 'scrape_events', ['request_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_scrape_events_request_id'), table_name='scrape_events')
+    op.drop_table('scrape_events')
+    op.drop_index(op.f('ix_scrape_requests_status'), table_name='scrape_requests')
+    op.drop_index(op.f('ix_scrape_requests_query_id'), table_name='scrape_requests')
+    op.drop_index(op.f('ix_scrape_requests_id'), table_name='scrape_requests')
+    op.drop_table('scrape_requests')
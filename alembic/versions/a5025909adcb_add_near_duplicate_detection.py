@@ -0,0 +1,55 @@
+"""Add near-duplicate detection
+
+Revision ID: a5025909adcb
+Revises: ba9477362763
+Create Date: 2026-10-19 17:30:14.884120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5025909adcb'
+down_revision: Union[str, Sequence[str], None] = 'ba9477362763'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('offers') as batch_op:
+        batch_op.add_column(sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_offers_duplicate_of_id_offers', 'offers', ['duplicate_of_id'], ['id'],
+                                    ondelete='SET NULL')
+
+    op.create_table('offer_signatures',
+    sa.Column('offer_id', sa.Integer(), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['offer_id'], ['offers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('offer_id')
+    )
+    op.create_table('offer_lsh_bands',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('offer_id', sa.Integer(), nullable=False),
+    sa.Column('band', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['offer_id'], ['offers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_offer_lsh_bands_offer_id'), 'offer_lsh_bands', ['offer_id'], unique=False)
+    op.create_index('ix_offer_lsh_bands_band_bucket', 'offer_lsh_bands', ['band', 'bucket'], unique=False)
+    # Signatures for existing offers are backfilled by run_scraper.py
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_offer_lsh_bands_band_bucket', table_name='offer_lsh_bands')
+    op.drop_index(op.f('ix_offer_lsh_bands_offer_id'), table_name='offer_lsh_bands')
+    op.drop_table('offer_lsh_bands')
+    op.drop_table('offer_signatures')
+    with op.batch_alter_table('offers') as batch_op:
+        batch_op.drop_constraint('fk_offers_duplicate_of_id_offers', type_='foreignkey')
+        batch_op.drop_column('duplicate_of_id')
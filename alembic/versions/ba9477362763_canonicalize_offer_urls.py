@@ -0,0 +1,78 @@
+"""Canonicalize offer URLs and merge duplicates
+
+Revision ID: ba9477362763
+Revises: 67e8aab2a96c
+Create Date: 2026-10-19 16:12:40.551873
+
+"""
+from typing import Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ba9477362763'
+down_revision: Union[str, Sequence[str], None] = '67e8aab2a96c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The canonicalization rules as of this revision, so later changes to the scraper don't change what it does
+TRACKING_PARAMS = {
+    "reason", "search_reason", "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid", "ref", "referrer", "source", "sl", "promoted", "highlighted",
+}
+OLX_HOSTS = {"www.olx.pl", "m.olx.pl", "olx.pl"}
+PATH_KEYED_HOSTS = {
+    "gdansk.nieruchomosci-online.pl", "ogloszenia.trojmiasto.pl", "rentola.pl", "gratka.pl",
+    "www.otodom.pl", "www.morizon.pl",
+}
+
+
+def canonicalize_url(url: str) -> str:
+    split = urlsplit(url)
+    split = split._replace(netloc=split.netloc.lower(), fragment="")
+    if split.netloc in OLX_HOSTS:
+        split = split._replace(scheme="https", netloc="www.olx.pl", query="")
+    elif split.netloc in PATH_KEYED_HOSTS:
+        split = split._replace(scheme="https", query="")
+    else:
+        query = [(key, value) for key, value in parse_qsl(split.query, keep_blank_values=True)
+                 if key.lower() not in TRACKING_PARAMS]
+        split = split._replace(query=urlencode(query))
+    return urlunsplit(split)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, url FROM offers ORDER BY id')).fetchall()
+
+    # Group offers by canonical URL, keeping the oldest row of each group
+    keepers = {}
+    duplicates = []
+    renames = []
+    for offer_id, url in rows:
+        canonical = canonicalize_url(url)
+        if canonical in keepers:
+            duplicates.append(offer_id)
+            continue
+        keepers[canonical] = offer_id
+        if canonical != url:
+            renames.append({"id": offer_id, "url": canonical})
+
+    # Remove duplicates first so renaming the keepers can't violate the unique constraint
+    for offer_id in duplicates:
+        connection.execute(sa.text('DELETE FROM notification_outbox WHERE offer_id = :id'), {"id": offer_id})
+        connection.execute(sa.text('DELETE FROM offers WHERE id = :id'), {"id": offer_id})
+    if renames:
+        connection.execute(sa.text('UPDATE offers SET url = :url WHERE id = :id'), renames)
+
+    print(f"Merged {len(duplicates)} duplicate offers, canonicalized {len(renames)} offer URLs")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Merged duplicates can't be restored and canonical URLs remain valid, so there's nothing to undo
+    pass
@@ -0,0 +1,40 @@
+"""Add scrape runs
+
+Revision ID: c3a81f5e7b24
+Revises: 99d5b162e739
+Create Date: 2026-10-20 14:37:05.913264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a81f5e7b24'
+down_revision: Union[str, Sequence[str], None] = '99d5b162e739'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scrape_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('notification_outbox') as batch_op:
+        batch_op.add_column(sa.Column('scrape_run_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_notification_outbox_scrape_run_id_scrape_runs', 'scrape_runs',
+                                    ['scrape_run_id'], ['id'], ondelete='SET NULL')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('notification_outbox') as batch_op:
+        batch_op.drop_constraint('fk_notification_outbox_scrape_run_id_scrape_runs', type_='foreignkey')
+        batch_op.drop_column('scrape_run_id')
+    op.drop_table('scrape_runs')
@@ -0,0 +1,30 @@
+"""Add scrape checkpoints
+
+Revision ID: cde7c5511ee0
+Revises: 1cd3236a7ba5
+Create Date: 2026-10-19 20:21:37.310448
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cde7c5511ee0'
+down_revision: Union[str, Sequence[str], None] = '1cd3236a7ba5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('search_queries', sa.Column('checkpoint_url', sa.Text(), nullable=True))
+    op.add_column('search_queries', sa.Column('checkpoint_page', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('search_queries', 'checkpoint_page')
+    op.drop_column('search_queries', 'checkpoint_url')
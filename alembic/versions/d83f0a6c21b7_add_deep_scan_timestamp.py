@@ -0,0 +1,28 @@
+"""Add deep scan timestamp
+
+Revision ID: d83f0a6c21b7
+Revises: 9b41e7d2c6fa
+Create Date: 2026-10-19 21:47:55.102384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd83f0a6c21b7'
+down_revision: Union[str, Sequence[str], None] = '9b41e7d2c6fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('search_queries', sa.Column('last_deep_scan_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('search_queries', 'last_deep_scan_at')
@@ -0,0 +1,32 @@
+"""Add query statistics
+
+Revision ID: e068c61df03f
+Revises: 5b2f2fb53c85
+Create Date: 2026-10-19 13:41:08.266035
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e068c61df03f'
+down_revision: Union[str, Sequence[str], None] = '5b2f2fb53c85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('search_queries', sa.Column('scrape_runs', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('search_queries', sa.Column('total_scrape_duration', sa.Float(), nullable=False, server_default='0'))
+    op.create_index('ix_offers_user_query_scraped', 'offers', ['user_id', 'query_id', 'scraped_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_offers_user_query_scraped', table_name='offers')
+    op.drop_column('search_queries', 'total_scrape_duration')
+    op.drop_column('search_queries', 'scrape_runs')
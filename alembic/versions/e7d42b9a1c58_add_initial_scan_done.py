@@ -0,0 +1,43 @@
+"""Add initial scan done
+
+Revision ID: e7d42b9a1c58
+Revises: c3a81f5e7b24
+Create Date: 2026-10-20 15:02:44.271806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7d42b9a1c58'
+down_revision: Union[str, Sequence[str], None] = 'c3a81f5e7b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('search_queries') as batch_op:
+        batch_op.add_column(sa.Column('initial_scan_done', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+    # Queries that finished a deep scan, or were scraped and have no interrupted scan left, are past their first run
+    search_queries = sa.table(
+        'search_queries',
+        sa.column('initial_scan_done', sa.Boolean()),
+        sa.column('last_scraped_at', sa.DateTime()),
+        sa.column('last_deep_scan_at', sa.DateTime()),
+        sa.column('checkpoint_url', sa.Text()),
+    )
+    op.execute(search_queries.update().where(sa.or_(
+        search_queries.c.last_deep_scan_at.is_not(None),
+        sa.and_(search_queries.c.last_scraped_at.is_not(None), search_queries.c.checkpoint_url.is_(None)),
+    )).values(initial_scan_done=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('search_queries') as batch_op:
+        batch_op.drop_column('initial_scan_done')
@@ -0,0 +1,30 @@
+"""Add query claims
+
+Revision ID: f41c7a9e2d36
+Revises: d83f0a6c21b7
+Create Date: 2026-10-20 10:12:31.448219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41c7a9e2d36'
+down_revision: Union[str, Sequence[str], None] = 'd83f0a6c21b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('search_queries', sa.Column('claimed_by', sa.String(), nullable=True))
+    op.add_column('search_queries', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('search_queries', 'claimed_at')
+    op.drop_column('search_queries', 'claimed_by')
@@ -1,19 +1,35 @@
+import asyncio
 import os
 from pathlib import Path
-from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Form
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy.orm import Session
-
-from database import get_db
-from models import User, SearchQuery, NotificationSetting
-from auth import authenticate_user, get_current_user, get_password_hash, NotAuthenticatedError
-from scraper import test_query
+from sqlalchemy import func, case, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database import AsyncSessionLocal, engine, get_async_db, get_async_engine
+from models import User, SearchQuery, NotificationSetting, Offer, QueryFilter, ScrapeRequest
+from auth import authenticate_user, get_current_user, get_password_hash, NotAuthenticatedError, ip_throttle, username_throttle
+from scraper import preview_query
+from filters import parse_filter_form, filter_form_values
+from search import ensure_search_index, search_offers, search_supported, SEARCH_PAGE_SIZE
+from health import list_source_health
+from export import EXPORT_FORMATS, export_offers, parse_export_date
+from scrape_requests import FINISHED_EVENTS, SCRAPE_EVENTS_POLL_INTERVAL, events_after, format_sse, request_scrape
+from http_cache import (
+    CachedStaticFiles, cache_headers, is_not_modified, make_etag, not_modified_response,
+    notification_change_marker, query_change_marker, source_health_marker,
+)
 
 app = FastAPI(title="Rent Scraper")
+# Routes use the async engine; only the web app creates it
+get_async_engine()
 
 # Add session middleware
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SECRET_KEY", "your-secret-key-change-this"))
@@ -24,12 +40,22 @@ async def startup_event():
     """Create database tables if they don't exist."""
     from database import engine, Base
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
 
 # Static files and templates
 BASE_DIR = Path(__file__).parent
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
+app.mount("/static", CachedStaticFiles(directory=str(BASE_DIR / "static")), name="static")
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 
+# Part of every page ETag, so deploying new templates invalidates cached pages
+APP_STARTED_AT = datetime.now(timezone.utc).isoformat()
+
+# Pages showing relative times ("5m ago") change as time passes, even if the data doesn't
+RELATIVE_TIME_BUCKET = 60  # seconds
+
+# Comment sent on an idle event stream, so proxies don't close it
+SSE_KEEPALIVE_INTERVAL = 15  # seconds
+
 
 @app.exception_handler(NotAuthenticatedError)
 async def not_authenticated_handler(request: Request, exc: NotAuthenticatedError):
@@ -81,9 +107,25 @@ def format_relative_time(dt: datetime) -> str:
         return f"{days}d ago"
 
 
+async def query_offer_stats(db: AsyncSession, user_id: int, now: datetime) -> dict:
+    """Offers in total, new in the last 24 hours and new in the last 7 days, per query, in a single grouped aggregate."""
+    return {
+        query_id: (total, last_day, last_week)
+        for query_id, total, last_day, last_week in await db.execute(select(
+            Offer.query_id,
+            func.count(Offer.id),
+            func.sum(case((Offer.scraped_at >= now - timedelta(days=1), 1), else_=0)),
+            func.sum(case((Offer.scraped_at >= now - timedelta(days=7), 1), else_=0)),
+        ).where(Offer.user_id == user_id).group_by(Offer.query_id))
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request, current_user: User = Depends(get_current_user)):
-    return templates.TemplateResponse(request, "dashboard.html", context={"user": current_user})
+    headers = cache_headers(make_etag("dashboard", APP_STARTED_AT, current_user.id, current_user.username), None)
+    if is_not_modified(request, headers["ETag"], None):
+        return not_modified_response(headers)
+    return templates.TemplateResponse(request, "dashboard.html", context={"user": current_user}, headers=headers)
 
 
 @app.get("/login", response_class=HTMLResponse)
@@ -92,11 +134,22 @@ async def login_page(request: Request):
 
 
 @app.post("/login")
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = authenticate_user(db, username, password)
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_async_db)):
+    # Behind a reverse proxy this is the X-Forwarded-For address, see FORWARDED_ALLOW_IPS in the README
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = max(ip_throttle.retry_after(client_ip), username_throttle.retry_after((username, client_ip)))
+    if retry_after:
+        return templates.TemplateResponse(request, "login.html", context={
+            "error": f"Too many login attempts. Please try again in {int(retry_after) + 1} seconds."
+        }, status_code=429, headers={"Retry-After": str(int(retry_after) + 1)})
+    
+    ip_throttle.record(client_ip)
+    user = await authenticate_user(db, username, password)
     if not user:
+        username_throttle.record((username, client_ip))
         return templates.TemplateResponse(request, "login.html", context={"error": "Invalid username or password"})
     
+    username_throttle.reset((username, client_ip))
     request.session["user_id"] = user.id
     return RedirectResponse(url="/", status_code=303)
 
@@ -108,11 +161,36 @@ async def logout(request: Request):
 
 
 @app.get("/queries", response_class=HTMLResponse)
-async def queries_page(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    queries = db.query(SearchQuery).filter(SearchQuery.user_id == current_user.id).all()
+async def queries_page(request: Request, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    last_changed, query_count = await query_change_marker(db, current_user.id)
+    health_changed = await source_health_marker(db)
+    now_ts = int(datetime.now(timezone.utc).timestamp())
+    time_bucket = datetime.fromtimestamp(now_ts - now_ts % RELATIVE_TIME_BUCKET, timezone.utc)
+    last_modified = max(filter(None, [
+        last_changed and last_changed.replace(tzinfo=timezone.utc),
+        health_changed and health_changed.replace(tzinfo=timezone.utc),
+        time_bucket,
+    ]))
+    etag = make_etag("queries", APP_STARTED_AT, current_user.id, current_user.username, last_changed, query_count,
+                     health_changed, time_bucket)
+    headers = cache_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+    
+    queries = (await db.scalars(
+        select(SearchQuery).options(selectinload(SearchQuery.filters)).where(SearchQuery.user_id == current_user.id)
+    )).all()
+    
+    stats = await query_offer_stats(db, current_user.id, datetime.utcnow())
     
     # Add formatted time information to each query
     for query in queries:
+        query.total_offers, query.new_last_day, query.new_last_week = stats.get(query.id, (0, 0, 0))
+        if query.scrape_runs:
+            query.avg_scrape_duration = f"{query.total_scrape_duration / query.scrape_runs:.1f}s"
+        else:
+            query.avg_scrape_duration = None
+        
         if query.last_scraped_at:
             query.formatted_time = format_relative_time(query.last_scraped_at)
             # Also keep the absolute time in local timezone for display
@@ -121,6 +199,7 @@ async def queries_page(request: Request, current_user: User = Depends(get_curren
         else:
             query.formatted_time = "Never"
             query.absolute_time = "Never"
+        query.deep_scan_time = query.last_deep_scan_at and format_relative_time(query.last_deep_scan_at)
         
         # Convert created_at to local timezone
         if query.created_at:
@@ -129,7 +208,17 @@ async def queries_page(request: Request, current_user: User = Depends(get_curren
         else:
             query.created_at_local = "Unknown"
     
-    return templates.TemplateResponse(request, "queries.html", context={"user": current_user, "queries": queries})
+    # Health of the portals the user's queries scrape
+    sources = await db.run_sync(list_source_health, [urlsplit(query.url).netloc for query in queries])
+    for source in sources:
+        source.last_success_local = source.last_success_at and \
+            source.last_success_at.replace(tzinfo=timezone.utc).astimezone().strftime('%m/%d %H:%M')
+        source.retry_local = source.retry_at and \
+            source.retry_at.replace(tzinfo=timezone.utc).astimezone().strftime('%m/%d %H:%M')
+    
+    return templates.TemplateResponse(request, "queries.html", context={
+        "user": current_user, "queries": queries, "sources": sources,
+    }, headers=headers)
 
 
 @app.get("/queries/add", response_class=HTMLResponse)
@@ -138,62 +227,163 @@ async def add_query_form(request: Request, current_user: User = Depends(get_curr
 
 
 @app.post("/queries/add")
-async def add_query(request: Request, name: str = Form(...), url: str = Form(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def add_query(request: Request, name: str = Form(...), url: str = Form(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    form = await request.form()
+    try:
+        filters = parse_filter_form(form)
+    except ValueError as e:
+        return templates.TemplateResponse(request, "query_form.html", context={
+            "user": current_user, "mode": "add", "error": str(e), "filter_values": form,
+            "query": {"name": name, "url": url},
+        }, status_code=400)
+    
     query = SearchQuery(name=name.strip(), url=url.strip(), user_id=current_user.id)
+    query.filters = [QueryFilter(field=field, op=op, value=value) for field, op, value in filters]
     db.add(query)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/queries", status_code=303)
 
 
 @app.get("/queries/{query_id}/edit", response_class=HTMLResponse)
-async def edit_query_form(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(SearchQuery).filter(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id).first()
+async def edit_query_form(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    query = await db.scalar(select(SearchQuery).options(selectinload(SearchQuery.filters)).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
-    return templates.TemplateResponse(request, "query_form.html", context={"user": current_user, "mode": "edit", "query": query})
+    return templates.TemplateResponse(request, "query_form.html", context={"user": current_user, "mode": "edit", "query": query, "filter_values": filter_form_values(query.filters)})
 
 
 @app.post("/queries/{query_id}/edit")
-async def update_query(request: Request, query_id: int, name: str = Form(...), url: str = Form(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(SearchQuery).filter(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id).first()
+async def update_query(request: Request, query_id: int, name: str = Form(...), url: str = Form(...), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    query = await db.scalar(select(SearchQuery).options(selectinload(SearchQuery.filters)).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
+    form = await request.form()
+    try:
+        filters = parse_filter_form(form)
+    except ValueError as e:
+        return templates.TemplateResponse(request, "query_form.html", context={
+            "user": current_user, "mode": "edit", "error": str(e), "filter_values": form, "query": query,
+        }, status_code=400)
+    
     query.name = name.strip()
+    if url.strip() != query.url:
+        # A checkpoint only applies to the URL it was taken for, and the new URL needs a deep scan first
+        query.checkpoint_url = None
+        query.checkpoint_page = None
+        query.last_deep_scan_at = None
     query.url = url.strip()
-    db.commit()
+    query.filters = [QueryFilter(field=field, op=op, value=value) for field, op, value in filters]
+    # Filters live in their own table, so mark the query itself as changed
+    query.updated_at = datetime.utcnow()
+    await db.commit()
     return RedirectResponse(url="/queries", status_code=303)
 
 
 @app.post("/queries/{query_id}/delete")
-async def delete_query(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(SearchQuery).filter(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id).first()
+async def delete_query(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    query = await db.scalar(select(SearchQuery).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
-    # First delete all offers related to this query
-    from models import Offer
-    offers_deleted = db.query(Offer).filter(Offer.query_id == query_id).delete()
+    # First delete all queued notifications and offers related to this query
+    from models import NotificationOutbox, OfferSignature, OfferLshBand, ScrapeEvent
+    await db.execute(delete(NotificationOutbox).where(NotificationOutbox.query_id == query_id))
+    query_request_ids = select(ScrapeRequest.id).where(ScrapeRequest.query_id == query_id).scalar_subquery()
+    await db.execute(delete(ScrapeEvent).where(ScrapeEvent.request_id.in_(query_request_ids)), execution_options={"synchronize_session": False})
+    await db.execute(delete(ScrapeRequest).where(ScrapeRequest.query_id == query_id), execution_options={"synchronize_session": False})
+    query_offer_ids = select(Offer.id).where(Offer.query_id == query_id).scalar_subquery()
+    await db.execute(delete(OfferSignature).where(OfferSignature.offer_id.in_(query_offer_ids)), execution_options={"synchronize_session": False})
+    await db.execute(delete(OfferLshBand).where(OfferLshBand.offer_id.in_(query_offer_ids)), execution_options={"synchronize_session": False})
+    await db.execute(update(Offer).where(Offer.duplicate_of_id.in_(query_offer_ids)).values(duplicate_of_id=None), execution_options={"synchronize_session": False})
+    offers_deleted = (await db.execute(delete(Offer).where(Offer.query_id == query_id))).rowcount
     print(f"Deleted {offers_deleted} offers for query {query_id}")
     
     # Then delete the query itself
-    db.delete(query)
-    db.commit()
+    await db.delete(query)
+    await db.commit()
     return RedirectResponse(url="/queries", status_code=303)
 
 
 @app.post("/queries/{query_id}/toggle")
-async def toggle_query(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    query = db.query(SearchQuery).filter(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id).first()
+async def toggle_query(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    query = await db.scalar(select(SearchQuery).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
     
     query.is_active = not query.is_active
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/queries", status_code=303)
 
 
+@app.post("/queries/{query_id}/scrape")
+async def scrape_query_now(request: Request, query_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    query = await db.scalar(select(SearchQuery).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+    
+    # Picked up by the scrape worker; the progress page follows it
+    scrape_request = await db.run_sync(request_scrape, query)
+    return RedirectResponse(url=f"/scrape-requests/{scrape_request.id}", status_code=303)
+
+
+async def _get_scrape_request(db: AsyncSession, request_id: int, user: User) -> ScrapeRequest:
+    scrape_request = await db.scalar(
+        select(ScrapeRequest).options(selectinload(ScrapeRequest.query))
+        .where(ScrapeRequest.id == request_id, ScrapeRequest.user_id == user.id)
+    )
+    if not scrape_request:
+        raise HTTPException(status_code=404, detail="Scrape request not found")
+    return scrape_request
+
+
+@app.get("/scrape-requests/{request_id}", response_class=HTMLResponse)
+async def scrape_progress_page(request: Request, request_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    scrape_request = await _get_scrape_request(db, request_id, current_user)
+    return templates.TemplateResponse(request, "scrape_progress.html", context={
+        "user": current_user, "scrape_request": scrape_request, "query": scrape_request.query,
+    })
+
+
+async def _poll_scrape_events(request_id: int, after_id: int):
+    # The request's session is closed once streaming starts, so every poll uses its own
+    async with AsyncSessionLocal() as db:
+        return await db.run_sync(events_after, request_id, after_id)
+
+
+@app.get("/scrape-requests/{request_id}/events")
+async def scrape_events(request: Request, request_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Stream the progress of an on-demand scrape as Server-Sent Events, until it is done."""
+    await _get_scrape_request(db, request_id, current_user)
+    try:
+        # Sent by a reconnecting browser, to continue after the last event it received
+        after_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        after_id = 0
+    
+    async def stream():
+        nonlocal after_id
+        idle = 0.0
+        while not await request.is_disconnected():
+            events = await _poll_scrape_events(request_id, after_id)
+            for event in events:
+                yield format_sse(event)
+                after_id = event.id
+            if events and events[-1].kind in FINISHED_EVENTS:
+                return
+            idle = 0.0 if events else idle + SCRAPE_EVENTS_POLL_INTERVAL
+            if idle >= SSE_KEEPALIVE_INTERVAL:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(SCRAPE_EVENTS_POLL_INTERVAL)
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
 @app.post("/queries/test", response_class=HTMLResponse)
 async def test_query_endpoint(request: Request, name: str = Form(...), url: str = Form(...), current_user: User = Depends(get_current_user)):
     # Create a temporary query object for testing (strip whitespace)
@@ -202,7 +392,7 @@ async def test_query_endpoint(request: Request, name: str = Form(...), url: str
     test_query_obj = type('Query', (), {'name': clean_name, 'url': clean_url})()
     
     try:
-        offers, has_more_results = test_query(clean_url, limit=5)
+        offers, has_more_results = await preview_query(clean_url, limit=5)
         return templates.TemplateResponse(request, "test_results.html", context={
             "query": test_query_obj,
             "offers": offers,
@@ -217,10 +407,60 @@ async def test_query_endpoint(request: Request, name: str = Form(...), url: str
         })
 
 
+@app.get("/offers/search", response_class=HTMLResponse)
+async def search_page(request: Request, q: str = "", after: Optional[str] = None, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    if not search_supported(engine):
+        return templates.TemplateResponse(request, "search.html", context={
+            "user": current_user, "q": q, "search_available": False,
+        }, status_code=404)
+    
+    try:
+        results, next_cursor = await db.run_sync(search_offers, current_user.id, q, after=after, limit=SEARCH_PAGE_SIZE)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    return templates.TemplateResponse(request, "search.html", context={
+        "user": current_user,
+        "q": q,
+        "results": results,
+        "next_cursor": next_cursor,
+        "is_first_page": after is None,
+        "search_available": True,
+    })
+
+
+@app.get("/offers/export")
+async def export_offers_endpoint(format: str = "csv", query_id: Optional[int] = None, since: Optional[str] = None, until: Optional[str] = None, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Stream the user's offer history as CSV or NDJSON, optionally for one query and a date range."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported format")
+    try:
+        since_date, until_date = parse_export_date(since), parse_export_date(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if query_id is not None:
+        query = await db.scalar(select(SearchQuery).where(SearchQuery.id == query_id, SearchQuery.user_id == current_user.id))
+        if not query:
+            raise HTTPException(status_code=404, detail="Query not found")
+    
+    # Rows are read and sent chunk by chunk on the export's own connection
+    chunks = export_offers(engine, format, user_id=current_user.id, query_id=query_id, since=since_date, until=until_date)
+    filename = f"offers-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
+
+
 @app.get("/notifications", response_class=HTMLResponse)
-async def notifications_page(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notifications = db.query(NotificationSetting).filter(NotificationSetting.user_id == current_user.id).all()
-    return templates.TemplateResponse(request, "notifications.html", context={"user": current_user, "notifications": notifications})
+async def notifications_page(request: Request, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    last_changed, notification_count = await notification_change_marker(db, current_user.id)
+    etag = make_etag("notifications", APP_STARTED_AT, current_user.id, current_user.username, last_changed, notification_count)
+    headers = cache_headers(etag, last_changed)
+    if is_not_modified(request, etag, last_changed):
+        return not_modified_response(headers)
+    
+    notifications = (await db.scalars(select(NotificationSetting).where(NotificationSetting.user_id == current_user.id))).all()
+    return templates.TemplateResponse(request, "notifications.html", context={"user": current_user, "notifications": notifications}, headers=headers)
 
 
 @app.get("/notifications/add", response_class=HTMLResponse)
@@ -229,16 +469,16 @@ async def add_notification_form(request: Request, current_user: User = Depends(g
 
 
 @app.post("/notifications/add")
-async def add_notification(request: Request, discord_webhook_url: str = Form(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = NotificationSetting(discord_webhook_url=discord_webhook_url.strip(), user_id=current_user.id)
+async def add_notification(request: Request, discord_webhook_url: str = Form(...), digest_window_minutes: int = Form(0), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    notification = NotificationSetting(discord_webhook_url=discord_webhook_url.strip(), digest_window_minutes=max(digest_window_minutes, 0), user_id=current_user.id)
     db.add(notification)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/notifications", status_code=303)
 
 
 @app.get("/notifications/{notification_id}/edit", response_class=HTMLResponse)
-async def edit_notification_form(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.query(NotificationSetting).filter(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id).first()
+async def edit_notification_form(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    notification = await db.scalar(select(NotificationSetting).where(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id))
     if not notification:
         raise HTTPException(status_code=404, detail="Notification setting not found")
     
@@ -246,35 +486,38 @@ async def edit_notification_form(request: Request, notification_id: int, current
 
 
 @app.post("/notifications/{notification_id}/edit")
-async def update_notification(request: Request, notification_id: int, discord_webhook_url: str = Form(...), current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.query(NotificationSetting).filter(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id).first()
+async def update_notification(request: Request, notification_id: int, discord_webhook_url: str = Form(...), digest_window_minutes: int = Form(0), current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    notification = await db.scalar(select(NotificationSetting).where(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id))
     if not notification:
         raise HTTPException(status_code=404, detail="Notification setting not found")
     
     notification.discord_webhook_url = discord_webhook_url.strip()
-    db.commit()
+    notification.digest_window_minutes = max(digest_window_minutes, 0)
+    await db.commit()
     return RedirectResponse(url="/notifications", status_code=303)
 
 
 @app.post("/notifications/{notification_id}/delete")
-async def delete_notification(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.query(NotificationSetting).filter(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id).first()
+async def delete_notification(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    notification = await db.scalar(select(NotificationSetting).where(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id))
     if not notification:
         raise HTTPException(status_code=404, detail="Notification setting not found")
     
-    db.delete(notification)
-    db.commit()
+    from models import NotificationOutbox
+    await db.execute(delete(NotificationOutbox).where(NotificationOutbox.notification_setting_id == notification_id))
+    await db.delete(notification)
+    await db.commit()
     return RedirectResponse(url="/notifications", status_code=303)
 
 
 @app.post("/notifications/{notification_id}/toggle")
-async def toggle_notification(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.query(NotificationSetting).filter(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id).first()
+async def toggle_notification(request: Request, notification_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    notification = await db.scalar(select(NotificationSetting).where(NotificationSetting.id == notification_id, NotificationSetting.user_id == current_user.id))
     if not notification:
         raise HTTPException(status_code=404, detail="Notification setting not found")
     
     notification.is_active = not notification.is_active
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/notifications", status_code=303)
 
 
@@ -298,10 +541,11 @@ async def test_notification_endpoint(request: Request, discord_webhook_url: str
             }]
         }
         
-        response = requests.post(clean_webhook_url, 
-                               json=payload, 
-                               headers={'Content-Type': 'application/json'},
-                               timeout=10)
+        # Run the blocking request in a worker thread to keep the event loop responsive
+        response = await run_in_threadpool(requests.post, clean_webhook_url,
+                                           json=payload,
+                                           headers={'Content-Type': 'application/json'},
+                                           timeout=10)
         
         if response.status_code == 204:
             return templates.TemplateResponse(request, "notification_test_results.html", context={
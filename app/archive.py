@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import zstandard
+
+# Record mode: keep every fetched results page, so parsers can be re-run on real pages later
+SCRAPE_RECORD = os.getenv("SCRAPE_RECORD", "").lower() in ("1", "true", "yes")
+SCRAPE_ARCHIVE_DIR = os.getenv("SCRAPE_ARCHIVE_DIR", "./archive")
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "10"))
+
+
+@dataclass(frozen=True)
+class ArchivedPage:
+    """Index entry of a recorded page. The body is a separate zstd frame at offset in the archive's data file."""
+    url: str
+    host: str
+    status: int
+    encoding: Optional[str]
+    fetched_at: str
+    path: str
+    offset: int
+    length: int
+    truncated: bool = False  # download stopped after the pagination, see sources.fetch_page
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class PageArchive:
+    """
+    Append-only archive of fetched pages, one data file and one index file per day.
+    Each body is compressed as its own zstd frame, so any page can be read without the ones before it.
+    Safe to use from several fetcher threads.
+    """
+
+    def __init__(self, directory: str = SCRAPE_ARCHIVE_DIR, level: int = ARCHIVE_COMPRESSION_LEVEL):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+
+    def record(self, url: str, status: int, headers: Dict[str, str], body: bytes,
+               encoding: Optional[str] = None, truncated: bool = False) -> ArchivedPage:
+        now = datetime.utcnow()
+        data_path = self.directory / f"pages-{now:%Y-%m-%d}.zst"
+        with self._lock:
+            frame = self._compressor.compress(body)
+            with open(data_path, "ab") as data:
+                offset = data.tell()
+                data.write(frame)
+            page = ArchivedPage(
+                url=url, host=urlsplit(url).netloc, status=status, encoding=encoding,
+                fetched_at=now.isoformat(), path=data_path.name, offset=offset, length=len(frame),
+                truncated=truncated, headers=dict(headers),
+            )
+            # The index is written last: a crash in between leaves unindexed bytes, never a dangling entry
+            with open(data_path.with_suffix(".idx"), "a", encoding="utf-8") as index:
+                index.write(json.dumps(page.__dict__, ensure_ascii=False) + "\n")
+        return page
+
+
+def iter_archived_pages(directory: str = SCRAPE_ARCHIVE_DIR, since: Optional[date] = None,
+                        until: Optional[date] = None, host: Optional[str] = None) -> Iterator[ArchivedPage]:
+    """Index entries of the recorded pages, oldest first, optionally limited to a range of days and a host."""
+    for index_path in sorted(Path(directory).glob("pages-*.idx")):
+        day = date.fromisoformat(index_path.stem.removeprefix("pages-"))
+        if (since and day < since) or (until and day > until):
+            continue
+        with open(index_path, encoding="utf-8") as index:
+            for line in index:
+                page = ArchivedPage(**json.loads(line))
+                if host is None or page.host == host:
+                    yield page
+
+
+def read_page(directory: str, page: ArchivedPage) -> bytes:
+    """The body of a recorded page."""
+    with open(Path(directory) / page.path, "rb") as data:
+        data.seek(page.offset)
+        frame = data.read(page.length)
+    return zstandard.ZstdDecompressor().decompress(frame)
@@ -1,8 +1,34 @@
-from fastapi import Request, Depends
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request
 import bcrypt
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
-from database import get_db
+from database import AsyncSessionLocal
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+
+LOGIN_WINDOW = float(os.getenv("LOGIN_WINDOW", "300"))  # seconds
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", "20"))
+LOGIN_MAX_FAILURES_PER_USERNAME = int(os.getenv("LOGIN_MAX_FAILURES_PER_USERNAME", "5"))
+
+# bcrypt is CPU-bound, so hashing runs on a small dedicated pool instead of the event loop
+_password_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_dummy_hash: Optional[str] = None
+
+# user id -> (expires at, detached User)
+_user_cache: Dict[int, Tuple[float, User]] = {}
+_user_cache_lock = threading.Lock()
 
 
 def verify_password(plain_password, hashed_password):
@@ -10,27 +36,137 @@ def verify_password(plain_password, hashed_password):
 
 
 def get_password_hash(password):
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """Check if a hash was created with a different cost factor than the configured one."""
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
 
+async def _run_in_password_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    global _dummy_hash
+
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
+        # Verify against a dummy hash so unknown usernames take as long as known ones
+        if _dummy_hash is None:
+            _dummy_hash = await _run_in_password_pool(get_password_hash, "dummy-password")
+        await _run_in_password_pool(verify_password, password, _dummy_hash)
+        return False
+
+    if not await _run_in_password_pool(verify_password, password, user.hashed_password):
         return False
+
+    if needs_rehash(user.hashed_password):
+        user.hashed_password = await _run_in_password_pool(get_password_hash, password)
+        await db.commit()
+        invalidate_user(user.id)
     return user
 
 
+class LoginThrottle:
+    """Sliding-window counter of login attempts per key, e.g. a client IP."""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._attempts: Dict[Hashable, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def _prune(self, key: Hashable, now: float) -> Deque[float]:
+        attempts = self._attempts.get(key)
+        if attempts is None:
+            return deque()
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if not attempts:
+            del self._attempts[key]
+        return attempts
+
+    def _sweep(self, now: float) -> None:
+        """Drop every key whose attempts have all left the window, even if it is never looked up again."""
+        expired = [key for key, attempts in self._attempts.items() if attempts[-1] <= now - self.window]
+        for key in expired:
+            del self._attempts[key]
+        self._next_sweep = now + self.window
+
+    def retry_after(self, key: Hashable) -> float:
+        """Seconds until the key may try again, or 0 if it's not throttled."""
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._prune(key, now)
+            if len(attempts) < self.limit:
+                return 0
+            return attempts[0] + self.window - now
+
+    def record(self, key: Hashable) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._attempts.setdefault(key, deque()).append(now)
+
+    def reset(self, key: Hashable) -> None:
+        with self._lock:
+            self._attempts.pop(key, None)
+
+
+ip_throttle = LoginThrottle(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_WINDOW)
+# Keyed by (username, client IP): failures from one client can't lock the account out for everyone else
+username_throttle = LoginThrottle(LOGIN_MAX_FAILURES_PER_USERNAME, LOGIN_WINDOW)
+
+
 class NotAuthenticatedError(Exception):
     pass
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+def invalidate_user(user_id: int) -> None:
+    """Drop a user from the auth cache. Call this whenever a user is changed or deleted."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def _get_cached_user(user_id: int) -> Optional[User]:
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        _user_cache.pop(user_id, None)
+        return None
+
+
+async def _load_user(user_id: int) -> Optional[User]:
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
+        if user:
+            # Detach the user so it can outlive the session; only its column attributes are used
+            db.expunge(user)
+        return user
+
+
+async def get_current_user(request: Request):
     user_id = request.session.get("user_id")
     if not user_id:
         raise NotAuthenticatedError()
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = _get_cached_user(user_id)
+    if user:
+        return user
+
+    user = await _load_user(user_id)
     if not user:
         request.session.clear()
         raise NotAuthenticatedError()
-    return user
\ No newline at end of file
+
+    with _user_cache_lock:
+        _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, user)
+    return user
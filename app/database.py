@@ -1,15 +1,53 @@
 import os
+from typing import Optional
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./rent_scraper.db")
 
+# Async drivers for the web app, by database backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """The same database, through its async driver: aiosqlite for SQLite, asyncpg for PostgreSQL."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.drivername == driver:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# Synchronous engine, used by the scraper, the workers, the command line tools and Alembic
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite" else {},
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions for the web app, so database calls don't block the event loop. Bound by
+# get_async_engine(). Objects stay usable after commit: async sessions can't lazy-load expired attributes
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+_async_engine: Optional[AsyncEngine] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    The web app's async engine, created on first use and bound to AsyncSessionLocal. Other processes
+    never create it, so they don't need the async driver (asyncpg for PostgreSQL) installed.
+    """
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(async_database_url(SQLALCHEMY_DATABASE_URL))
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
 Base = declarative_base()
 
 
@@ -18,4 +56,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import random
+import re
+import struct
+import unicodedata
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from urllib.parse import urlsplit
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from models import Offer, OfferSignature, OfferLshBand
+
+# MinHash signature length and LSH banding. With 16 bands of 8 rows, offers with a title
+# similarity of ~0.7 become candidates with 50% probability, ~0.9 with almost certainty.
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 4
+
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.7"))
+NEAR_DUPLICATE_WINDOW_DAYS = int(os.getenv("NEAR_DUPLICATE_WINDOW_DAYS", "30"))
+# Relative differences up to which the price and area of two cross-posts are considered the same.
+# Portals round differently and some show the rent with and others without the admin fee.
+NEAR_DUPLICATE_PRICE_TOLERANCE = float(os.getenv("NEAR_DUPLICATE_PRICE_TOLERANCE", "0.05"))
+NEAR_DUPLICATE_AREA_TOLERANCE = float(os.getenv("NEAR_DUPLICATE_AREA_TOLERANCE", "0.05"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 61) - 1
+_SIGNATURE_FORMAT = f"<{NUM_PERM}Q"
+
+# Fixed seed, so signatures stay comparable across processes and runs
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip diacritics and punctuation, collapse whitespace."""
+    text = text.lower().replace("ł", "l")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text))
+
+
+def shingles(text: str) -> Set[str]:
+    """Character shingles of the normalized text."""
+    text = normalize_text(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash_shingle(shingle: str) -> int:
+    digest = hashlib.blake2b(shingle.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") & _MAX_HASH
+
+
+def minhash(text: str) -> List[int]:
+    """MinHash signature of a text's shingle set."""
+    hashes = [_hash_shingle(shingle) for shingle in shingles(text)]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_hashes(signature: List[int]) -> List[int]:
+    """One bucket per LSH band; offers sharing any bucket are near-duplicate candidates."""
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<{LSH_ROWS}Q", *rows), digest_size=8).digest()
+        # Signed, so it fits an SQLite INTEGER
+        buckets.append(int.from_bytes(digest, "little", signed=True))
+    return buckets
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def pack_signature(signature: List[int]) -> bytes:
+    return struct.pack(_SIGNATURE_FORMAT, *signature)
+
+
+def unpack_signature(data: bytes) -> List[int]:
+    return list(struct.unpack(_SIGNATURE_FORMAT, data))
+
+
+def _within(a, b, tolerance: float) -> bool:
+    return abs(a - b) <= tolerance * max(abs(a), abs(b))
+
+
+def attributes_match(a: Offer, b: Offer) -> bool:
+    """
+    Whether the structured attributes of two offers allow them to be the same listing.
+    Only attributes both offers have are compared; titles alone are too generic to rely on.
+    """
+    if a.price is not None and b.price is not None and not _within(a.price, b.price, NEAR_DUPLICATE_PRICE_TOLERANCE):
+        return False
+    if a.area is not None and b.area is not None and not _within(a.area, b.area, NEAR_DUPLICATE_AREA_TOLERANCE):
+        return False
+    if a.rooms is not None and b.rooms is not None and a.rooms != b.rooms:
+        return False
+    return True
+
+
+def index_offer(db: Session, offer: Offer, signature: Optional[List[int]] = None) -> None:
+    """Store an offer's signature and LSH buckets. The offer must already have an id."""
+    if signature is None:
+        signature = minhash(offer.title)
+    db.add(OfferSignature(offer_id=offer.id, signature=pack_signature(signature)))
+    for band, bucket in enumerate(band_hashes(signature)):
+        db.add(OfferLshBand(offer_id=offer.id, band=band, bucket=bucket))
+
+
+def find_near_duplicate(db: Session, offer: Offer, signature: List[int]) -> Optional[int]:
+    """
+    Find an earlier offer of the same user for the same listing posted on another portal.
+    Candidates come from the LSH buckets, so only a handful of signatures are compared;
+    a similar title only counts if price, area and rooms agree as well.
+    Returns the id of the original offer, or None.
+    """
+    since = datetime.utcnow() - timedelta(days=NEAR_DUPLICATE_WINDOW_DAYS)
+    bucket_keys = list(enumerate(band_hashes(signature)))
+
+    candidates = db.query(Offer, OfferSignature.signature).join(
+        OfferSignature, OfferSignature.offer_id == Offer.id
+    ).filter(
+        Offer.id.in_(
+            db.query(OfferLshBand.offer_id).filter(
+                tuple_(OfferLshBand.band, OfferLshBand.bucket).in_(bucket_keys)
+            )
+        ),
+        Offer.user_id == offer.user_id,
+        Offer.id != offer.id,
+        Offer.scraped_at >= since,
+    ).all()
+
+    host = urlsplit(offer.url).netloc
+    best_id, best_similarity = None, NEAR_DUPLICATE_THRESHOLD
+    for candidate, candidate_signature in candidates:
+        # Same-portal duplicates are already caught by the canonical URL
+        if urlsplit(candidate.url).netloc == host:
+            continue
+        if not attributes_match(offer, candidate):
+            continue
+        similarity = estimate_similarity(signature, unpack_signature(candidate_signature))
+        if similarity >= best_similarity:
+            best_id, best_similarity = candidate.duplicate_of_id or candidate.id, similarity
+    return best_id
+
+
+def group_cross_posts(db: Session, offers: List[Offer]) -> List[Offer]:
+    """
+    Index new offers and link cross-posts to the offer they duplicate.
+    The offers must already be flushed. Returns the offers that aren't cross-posts.
+    """
+    originals = []
+    for offer in offers:
+        signature = minhash(offer.title)
+        offer.duplicate_of_id = find_near_duplicate(db, offer, signature)
+        index_offer(db, offer, signature)
+        if offer.duplicate_of_id is None:
+            originals.append(offer)
+    return originals
+
+
+def backfill_signatures(db: Session, batch_size: int = 1000) -> int:
+    """Index offers that have no signature yet. Returns the number of offers indexed."""
+    total = 0
+    while True:
+        offers = db.query(Offer).outerjoin(
+            OfferSignature, OfferSignature.offer_id == Offer.id
+        ).filter(OfferSignature.offer_id.is_(None)).order_by(Offer.id).limit(batch_size).all()
+        if not offers:
+            return total
+        for offer in offers:
+            index_offer(db, offer)
+        db.commit()
+        total += len(offers)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from models import Offer, OfferDetail
+from sources import USER_AGENT, extract_attributes
+
+ENRICH_DETAILS = os.getenv("ENRICH_DETAILS", "").lower() in ("1", "true", "yes")
+ENRICH_MAX_WORKERS = int(os.getenv("ENRICH_MAX_WORKERS", "8"))
+ENRICH_PER_HOST = int(os.getenv("ENRICH_PER_HOST", "2"))  # concurrent requests per portal
+ENRICH_TIMEOUT = float(os.getenv("ENRICH_TIMEOUT", "15"))  # seconds
+ENRICH_MAX_ATTEMPTS = int(os.getenv("ENRICH_MAX_ATTEMPTS", "3"))  # fetches of a listing before giving up
+ENRICH_RETRY_BATCH = int(os.getenv("ENRICH_RETRY_BATCH", "100"))  # listings retried per run
+ENRICH_RETRY_DAYS = int(os.getenv("ENRICH_RETRY_DAYS", "7"))  # how far back to look for listings without details
+
+# Columns a fetch fills in; a retry overwrites all of them, so nothing is left over from a failed fetch
+DETAIL_FIELDS = ("status_code", "error", "description", "price", "photos", "latitude", "longitude")
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _json_ld_objects(page: BeautifulSoup) -> Iterable[Dict[str, Any]]:
+    for script in page.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        items = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+        for item in items:
+            if isinstance(item, dict):
+                yield item
+
+
+def parse_detail_page(html: str) -> Dict[str, Any]:
+    """Extract description, price, photos and coordinates from a listing page."""
+    page = BeautifulSoup(html, features="html.parser")
+    details: Dict[str, Any] = {}
+    photos: List[str] = []
+
+    # Structured data is the most reliable source where portals provide it
+    for item in _json_ld_objects(page):
+        offers = item.get("offers")
+        if isinstance(offers, dict) and offers.get("price") and "price" not in details:
+            try:
+                details["price"] = int(float(str(offers["price"]).replace(",", ".")))
+            except ValueError:
+                pass
+        geo = item.get("geo")
+        if isinstance(geo, dict) and geo.get("latitude") and "latitude" not in details:
+            try:
+                details["latitude"] = float(geo["latitude"])
+                details["longitude"] = float(geo["longitude"])
+            except (KeyError, TypeError, ValueError):
+                pass
+        images = item.get("image")
+        if isinstance(images, str):
+            images = [images]
+        if isinstance(images, list):
+            photos.extend(image for image in images if isinstance(image, str))
+        if item.get("description") and "description" not in details:
+            details["description"] = str(item["description"])
+
+    # Fall back to the Open Graph tags most portals set for link previews
+    if "description" not in details:
+        meta = page.find("meta", property="og:description") or page.find("meta", attrs={"name": "description"})
+        if meta and meta.get("content"):
+            details["description"] = meta["content"].strip()
+    for meta in page.find_all("meta", property="og:image"):
+        if meta.get("content"):
+            photos.append(meta["content"])
+
+    if "price" not in details and details.get("description"):
+        price = extract_attributes(details["description"]).get("price")
+        if price:
+            details["price"] = price
+
+    if photos:
+        details["photos"] = json.dumps(list(dict.fromkeys(photos)))
+    return details
+
+
+class HostLimiter:
+    """Bounds the number of concurrent requests per host."""
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch_detail(url: str, limiter: HostLimiter) -> Dict[str, Any]:
+    """Fetch and parse one listing page. Runs in a worker thread and doesn't touch the database."""
+    result: Dict[str, Any] = {"url_hash": url_hash(url), "url": url}
+    try:
+        with limiter(urlsplit(url).netloc):
+            response = requests.get(url, headers={'User-Agent': USER_AGENT}, timeout=ENRICH_TIMEOUT)
+        result["status_code"] = response.status_code
+        if not response.ok:
+            result["error"] = f"HTTP {response.status_code}"
+            return result
+        result.update(parse_detail_page(response.text))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def enrich_offers(db: Session, offers: List[Offer]) -> int:
+    """
+    Fetch detail pages for the given offers. The cache is keyed by URL: a listing fetched once
+    isn't fetched again, and one that failed ENRICH_MAX_ATTEMPTS times is given up on.
+    Returns the number of pages fetched.
+    """
+    urls = {url_hash(offer.url): offer.url for offer in offers}
+    if not urls:
+        return 0
+
+    attempts = {}
+    for row in db.query(OfferDetail.url_hash, OfferDetail.error, OfferDetail.attempts).filter(
+        OfferDetail.url_hash.in_(list(urls))
+    ):
+        if row.error is None or row.attempts >= ENRICH_MAX_ATTEMPTS:
+            del urls[row.url_hash]
+        else:
+            attempts[row.url_hash] = row.attempts
+    to_fetch = list(urls.values())
+    if not to_fetch:
+        return 0
+
+    limiter = HostLimiter(ENRICH_PER_HOST)
+    with ThreadPoolExecutor(max_workers=ENRICH_MAX_WORKERS, thread_name_prefix="enrich") as executor:
+        results = list(executor.map(lambda url: fetch_detail(url, limiter), to_fetch))
+
+    for result in results:
+        # merge replaces the row of an earlier failed fetch
+        fields = {**dict.fromkeys(DETAIL_FIELDS), **result}
+        db.merge(OfferDetail(fetched_at=datetime.utcnow(), attempts=attempts.get(result["url_hash"], 0) + 1, **fields))
+    db.commit()
+
+    failed = sum(1 for result in results if result.get("error"))
+    print(f"  Enriched {len(results) - failed} offers ({failed} failed)")
+    return len(results)
+
+
+def pending_offers(db: Session, now: Optional[datetime] = None) -> List[Offer]:
+    """
+    Recent offers whose detail page hasn't been fetched or failed to load, for the scraper to retry
+    on every run; at most ENRICH_RETRY_BATCH, newest first.
+    """
+    since = (now or datetime.utcnow()) - timedelta(days=ENRICH_RETRY_DAYS)
+    return (
+        db.query(Offer)
+        .outerjoin(OfferDetail, OfferDetail.url == Offer.url)
+        .filter(
+            Offer.scraped_at >= since,
+            or_(OfferDetail.url_hash.is_(None),
+                and_(OfferDetail.error.is_not(None), OfferDetail.attempts < ENRICH_MAX_ATTEMPTS)),
+        )
+        .order_by(Offer.scraped_at.desc())
+        .limit(ENRICH_RETRY_BATCH)
+        .all()
+    )
+
+
+def get_offer_detail(db: Session, offer: Offer) -> Optional[OfferDetail]:
+    return db.query(OfferDetail).filter(OfferDetail.url_hash == url_hash(offer.url)).first()
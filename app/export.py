@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+from models import Offer, SearchQuery
+
+# Rows fetched from the cursor and written out per step; memory use depends on this, not on the export size
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_COLUMNS = [
+    "id", "query_id", "query_name", "title", "url", "price", "area", "rooms", "district",
+    "scraped_at", "duplicate_of_id",
+]
+
+
+def parse_export_date(value: Optional[str]) -> Optional[date]:
+    """Parse a YYYY-MM-DD date. Raises ValueError on bad input."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+def export_statement(user_id: Optional[int] = None, query_id: Optional[int] = None,
+                     since: Optional[date] = None, until: Optional[date] = None) -> Select:
+    """Offers to export, oldest first. since and until are inclusive days."""
+    statement = select(
+        Offer.id, Offer.query_id, SearchQuery.name.label("query_name"), Offer.title, Offer.url,
+        Offer.price, Offer.area, Offer.rooms, Offer.district, Offer.scraped_at, Offer.duplicate_of_id,
+    ).join(SearchQuery, SearchQuery.id == Offer.query_id).order_by(Offer.id)
+
+    if user_id is not None:
+        statement = statement.where(Offer.user_id == user_id)
+    if query_id is not None:
+        statement = statement.where(Offer.query_id == query_id)
+    if since is not None:
+        statement = statement.where(Offer.scraped_at >= datetime.combine(since, datetime.min.time()))
+    if until is not None:
+        statement = statement.where(Offer.scraped_at < datetime.combine(until + timedelta(days=1), datetime.min.time()))
+    return statement
+
+
+def iter_offer_chunks(engine: Engine, statement: Select, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[Sequence]]:
+    """
+    Stream the statement's rows in chunks through a server-side cursor.
+    Uses its own connection, so it can outlive the request's session while a response streams.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(statement)
+        for partition in result.partitions(chunk_size):
+            yield partition
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(chunks: Iterator[List[Sequence]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([_format_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, if there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(chunks: Iterator[List[Sequence]]) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_format_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def export_offers(engine: Engine, export_format: str, **filters) -> Iterator[str]:
+    """Stream offers in the given format ('csv' or 'ndjson'), chunk by chunk."""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {export_format}")
+    chunks = iter_offer_chunks(engine, export_statement(**filters))
+    return csv_chunks(chunks) if export_format == "csv" else ndjson_chunks(chunks)
@@ -0,0 +1,93 @@
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import Float, Integer, String, Text, column, exists, func, or_, select, values
+from sqlalchemy.orm import Session
+
+from models import Offer, QueryFilter
+import sources
+
+FILTER_FIELDS = {
+    "price": Integer,
+    "area": Float,
+    "rooms": Integer,
+    "district": String,
+}
+
+# Form field name -> (offer field, operator)
+FILTER_FORM_FIELDS: Dict[str, Tuple[str, str]] = {
+    "min_price": ("price", "ge"),
+    "max_price": ("price", "le"),
+    "min_area": ("area", "ge"),
+    "max_area": ("area", "le"),
+    "min_rooms": ("rooms", "ge"),
+    "max_rooms": ("rooms", "le"),
+    "district": ("district", "contains"),
+}
+
+# Offers are checked in chunks to stay below the database's bound parameter limit
+FILTER_CHUNK_SIZE = 500
+
+
+def parse_filter_form(form: Mapping[str, Optional[str]]) -> List[Tuple[str, str, str]]:
+    """Turn the filter fields of the query form into (field, op, value) triples. Raises ValueError on bad input."""
+    filters = []
+    for name, (field, op) in FILTER_FORM_FIELDS.items():
+        value = (form.get(name) or "").strip()
+        if not value:
+            continue
+        if FILTER_FIELDS[field] is not String:
+            try:
+                number = float(value.replace(",", "."))
+            except ValueError:
+                raise ValueError(f"Invalid {field} filter: {value}")
+            if number < 0:
+                raise ValueError(f"Invalid {field} filter: {value}")
+            value = str(int(number)) if FILTER_FIELDS[field] is Integer else str(number)
+        filters.append((field, op, value))
+    return filters
+
+
+def filter_form_values(filters: List[QueryFilter]) -> Dict[str, str]:
+    """Inverse of parse_filter_form, for pre-filling the query form."""
+    form_names = {spec: name for name, spec in FILTER_FORM_FIELDS.items()}
+    return {form_names[(f.field, f.op)]: f.value for f in filters if (f.field, f.op) in form_names}
+
+
+def _predicate(col, query_filter: QueryFilter):
+    if query_filter.op == "contains":
+        condition = func.lower(col).contains(query_filter.value.lower(), autoescape=True)
+    else:
+        value = float(query_filter.value)
+        condition = col <= value if query_filter.op == "le" else col >= value
+    # Listings whose card doesn't show the attribute are kept
+    return or_(col.is_(None), condition)
+
+
+def select_new_offers(db: Session, offers: sources.OfferBatch, filters: List[QueryFilter]) -> sources.OfferBatch:
+    """
+    Return the scraped offers that aren't in the database yet and match all filters.
+    Both checks run in SQL, one statement per chunk of offers, straight from the batch's columns.
+    """
+    selected: List[int] = []
+    for start in range(0, len(offers), FILTER_CHUNK_SIZE):
+        positions = range(start, min(start + FILTER_CHUNK_SIZE, len(offers)))
+        scraped = values(
+            column("idx", Integer),
+            column("url", Text),
+            column("price", Integer),
+            column("area", Float),
+            column("rooms", Integer),
+            column("district", String),
+            name="scraped",
+        ).data([
+            (i, offers.urls[i], offers.prices[i], offers.areas[i], offers.rooms[i], offers.districts[i])
+            for i in positions
+        ]).cte("scraped")
+
+        statement = select(scraped.c.idx).where(
+            ~exists().where(Offer.url == scraped.c.url),
+            *[_predicate(scraped.c[f.field], f) for f in filters if f.field in FILTER_FIELDS],
+        ).order_by(scraped.c.idx)
+
+        selected.extend(db.execute(statement).scalars())
+    return offers.take(selected)
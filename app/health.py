@@ -0,0 +1,74 @@
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import SourceHealth
+
+# Consecutive failed scrapes after which a portal's circuit opens
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# Delay before the first probe of an open circuit; doubles with every failed probe
+CIRCUIT_BASE_DELAY = int(os.getenv("CIRCUIT_BASE_DELAY", "600"))  # seconds
+CIRCUIT_MAX_DELAY = int(os.getenv("CIRCUIT_MAX_DELAY", str(6 * 3600)))  # seconds
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def get_source_health(db: Session, host: str) -> SourceHealth:
+    """Health record of a portal, created on first use."""
+    health = db.get(SourceHealth, host)
+    if health is None:
+        health = SourceHealth(host=host, state=CLOSED, consecutive_failures=0)
+        db.add(health)
+        # Sessions may not autoflush, and db.get only finds persisted rows
+        db.flush()
+    return health
+
+
+def allow_request(db: Session, host: str, now: Optional[datetime] = None) -> bool:
+    """
+    Whether a portal may be scraped. An open circuit rejects requests until its retry time,
+    then lets requests through half-open; the next result closes or reopens it.
+    """
+    now = now or datetime.utcnow()
+    health = get_source_health(db, host)
+    if health.state == OPEN:
+        if health.retry_at and health.retry_at > now:
+            return False
+        health.state = HALF_OPEN
+    return True
+
+
+def probe_delay(consecutive_failures: int) -> timedelta:
+    """Exponential backoff between probes of an open circuit."""
+    exponent = max(consecutive_failures - CIRCUIT_FAILURE_THRESHOLD, 0)
+    return timedelta(seconds=min(CIRCUIT_BASE_DELAY * 2 ** min(exponent, 20), CIRCUIT_MAX_DELAY))
+
+
+def record_success(db: Session, host: str, now: Optional[datetime] = None) -> None:
+    health = get_source_health(db, host)
+    health.state = CLOSED
+    health.consecutive_failures = 0
+    health.last_success_at = now or datetime.utcnow()
+    health.retry_at = None
+
+
+def record_failure(db: Session, host: str, error: str, now: Optional[datetime] = None) -> None:
+    now = now or datetime.utcnow()
+    health = get_source_health(db, host)
+    health.consecutive_failures = (health.consecutive_failures or 0) + 1
+    health.last_failure_at = now
+    health.last_error = error
+    # A failed probe reopens the circuit right away
+    if health.state == HALF_OPEN or health.consecutive_failures >= CIRCUIT_FAILURE_THRESHOLD:
+        health.state = OPEN
+        health.retry_at = now + probe_delay(health.consecutive_failures)
+
+
+def list_source_health(db: Session, hosts: List[str]) -> List[SourceHealth]:
+    """Health of the given portals, sorted by host. Portals never scraped are reported as closed."""
+    known = {health.host: health for health in db.query(SourceHealth).filter(SourceHealth.host.in_(hosts))}
+    return [known.get(host) or SourceHealth(host=host, state=CLOSED, consecutive_failures=0) for host in sorted(set(hosts))]
@@ -0,0 +1,92 @@
+import hashlib
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import SearchQuery, NotificationSetting, SourceHealth
+
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))  # seconds
+
+
+class CachedStaticFiles(StaticFiles):
+    """Static files served with long-lived cache headers."""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers.setdefault("Cache-Control", f"public, max-age={STATIC_MAX_AGE}")
+        return response
+
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        # Database timestamps are naive UTC
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.replace(microsecond=0)
+
+
+async def query_change_marker(db: AsyncSession, user_id: int) -> tuple:
+    """Latest scrape/edit time and count of a user's queries. Changes whenever the queries page would."""
+    last_scraped, last_updated, count = (await db.execute(select(
+        func.max(SearchQuery.last_scraped_at),
+        func.max(SearchQuery.updated_at),
+        func.count(SearchQuery.id),
+    ).where(SearchQuery.user_id == user_id))).one()
+    return max(filter(None, [last_scraped, last_updated]), default=None), count
+
+
+async def source_health_marker(db: AsyncSession) -> Optional[datetime]:
+    """Latest change of any portal's health."""
+    return await db.scalar(select(func.max(SourceHealth.updated_at)))
+
+
+async def notification_change_marker(db: AsyncSession, user_id: int) -> tuple:
+    """Latest edit time and count of a user's notification settings."""
+    last_updated, count = (await db.execute(select(
+        func.max(NotificationSetting.updated_at),
+        func.count(NotificationSetting.id),
+    ).where(NotificationSetting.user_id == user_id))).one()
+    return last_updated, count
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    # Private pages: browsers may keep them but must revalidate on every use
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    last_modified = _as_utc(last_modified)
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate the request's conditional headers. If-None-Match takes precedence over If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = _as_utc(last_modified)
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Boolean, Float, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -25,15 +25,46 @@ class SearchQuery(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Scraping status fields
     last_scraped_at = Column(DateTime, nullable=True)
     last_scrape_count = Column(Integer, nullable=True)  # Number of offers found in last scrape
-    last_scrape_status = Column(String, nullable=True)  # 'success', 'error', 'no_results'
+    last_scrape_status = Column(String, nullable=True)  # 'success', 'error', 'no_results', 'partial', 'timeout', 'source_down'
     last_scrape_error = Column(Text, nullable=True)  # Error message if scrape failed
     
+    # Where to resume an interrupted scrape; cleared once the last page was fetched
+    checkpoint_url = Column(Text, nullable=True)
+    checkpoint_page = Column(Integer, nullable=True)
+    
+    # Last completed scan of all pages; scans in between only poll the first pages
+    last_deep_scan_at = Column(DateTime, nullable=True)
+    # Set once the first deep scan got through all pages; until then new offers aren't notified
+    initial_scan_done = Column(Boolean, nullable=False, default=False)
+    
+    # Who is scraping the query right now (the scraper run or the scrape worker), so it isn't scraped twice at once
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    
+    # Incrementally maintained scrape statistics, of runs that didn't fail
+    scrape_runs = Column(Integer, nullable=False, default=0)
+    total_scrape_duration = Column(Float, nullable=False, default=0.0)  # Seconds, summed over those runs
+    
     user = relationship("User", back_populates="search_queries")
     offers = relationship("Offer", back_populates="query", cascade="all, delete-orphan")
+    filters = relationship("QueryFilter", back_populates="query", cascade="all, delete-orphan")
+
+
+class QueryFilter(Base):
+    __tablename__ = "query_filters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"), nullable=False, index=True)
+    field = Column(String, nullable=False)  # 'price', 'area', 'rooms', 'district'
+    op = Column(String, nullable=False)  # 'le', 'ge', 'contains'
+    value = Column(String, nullable=False)
+    
+    query = relationship("SearchQuery", back_populates="filters")
 
 
 class NotificationSetting(Base):
@@ -43,7 +74,9 @@ class NotificationSetting(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     discord_webhook_url = Column(Text)
     is_active = Column(Boolean, default=True)
+    digest_window_minutes = Column(Integer, nullable=False, default=0)  # 0 = send a digest after every scraper run
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     user = relationship("User", back_populates="notification_settings")
 
@@ -55,8 +88,135 @@ class Offer(Base):
     title = Column(Text, nullable=False)
     url = Column(Text, nullable=False, unique=True)
     scraped_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Structured attributes from the listing card
+    price = Column(Integer, nullable=True, index=True)
+    area = Column(Float, nullable=True, index=True)
+    rooms = Column(Integer, nullable=True, index=True)
+    district = Column(String, nullable=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"), nullable=False)
+    duplicate_of_id = Column(Integer, ForeignKey("offers.id", ondelete="SET NULL"), nullable=True)  # Same listing posted on another portal
     
     user = relationship("User")
-    query = relationship("SearchQuery", back_populates="offers")
\ No newline at end of file
+    query = relationship("SearchQuery", back_populates="offers")
+    duplicate_of = relationship("Offer", remote_side=[id])
+
+    __table_args__ = (
+        # Covers the per-query statistics aggregate on the queries dashboard
+        Index("ix_offers_user_query_scraped", "user_id", "query_id", "scraped_at"),
+        # Serves the newest-first scan of recent offers waiting for their detail pages
+        Index("ix_offers_scraped_at", "scraped_at"),
+    )
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"), nullable=False)
+    offer_id = Column(Integer, ForeignKey("offers.id", ondelete="CASCADE"), nullable=False)
+    notification_setting_id = Column(Integer, ForeignKey("notification_settings.id", ondelete="CASCADE"), nullable=False)
+    # The scraper run that queued the entry; its digest waits until the run has finished
+    scrape_run_id = Column(Integer, ForeignKey("scrape_runs.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Delivery state fields
+    status = Column(String, nullable=False, default="pending", index=True)  # 'pending', 'sent', 'failed', 'skipped'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, index=True)
+    last_error = Column(Text, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    offer = relationship("Offer")
+    query = relationship("SearchQuery")
+    notification_setting = relationship("NotificationSetting")
+    scrape_run = relationship("ScrapeRun")
+
+
+class ScrapeRun(Base):
+    __tablename__ = "scrape_runs"
+
+    # A run of run_scraper.py over all active queries; finished_at is set once it is done
+    id = Column(Integer, primary_key=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class OfferSignature(Base):
+    __tablename__ = "offer_signatures"
+
+    offer_id = Column(Integer, ForeignKey("offers.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)  # Packed MinHash signature of the title
+
+
+class OfferLshBand(Base):
+    __tablename__ = "offer_lsh_bands"
+
+    id = Column(Integer, primary_key=True)
+    offer_id = Column(Integer, ForeignKey("offers.id", ondelete="CASCADE"), nullable=False, index=True)
+    band = Column(Integer, nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("ix_offer_lsh_bands_band_bucket", "band", "bucket"),
+    )
+
+
+class OfferDetail(Base):
+    __tablename__ = "offer_details"
+
+    # Keyed by a hash of the canonical offer URL, so a listing is fetched once for all queries and users
+    url_hash = Column(String(64), primary_key=True)
+    url = Column(Text, nullable=False, index=True)  # Joined against offers.url when looking for pending offers
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    status_code = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)  # Fetches so far; failed ones are retried up to a limit
+
+    # Extracted details
+    description = Column(Text, nullable=True)
+    price = Column(Integer, nullable=True)
+    photos = Column(Text, nullable=True)  # JSON list of image URLs
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+
+class SourceHealth(Base):
+    __tablename__ = "source_health"
+
+    host = Column(String, primary_key=True)  # Portal host, e.g. www.olx.pl
+    state = Column(String, nullable=False, default="closed")  # 'closed', 'open', 'half_open'
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    last_success_at = Column(DateTime, nullable=True)
+    last_failure_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    retry_at = Column(DateTime, nullable=True)  # When an open circuit lets the next probe through
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ScrapeRequest(Base):
+    __tablename__ = "scrape_requests"
+
+    # An on-demand scrape of one query, picked up by the scrape worker ahead of the regular cycle
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    query_id = Column(Integer, ForeignKey("search_queries.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending", index=True)  # 'pending', 'running', 'done', 'error'
+    requested_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+    query = relationship("SearchQuery")
+
+
+class ScrapeEvent(Base):
+    __tablename__ = "scrape_events"
+
+    # Progress of an on-demand scrape, streamed to the browser in id order
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, ForeignKey("scrape_requests.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # 'started', 'page', 'done', 'error'
+    data = Column(Text, nullable=False)  # JSON payload
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,235 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from models import SearchQuery, NotificationSetting, NotificationOutbox, Offer, ScrapeRun
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "30"))  # seconds
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))  # seconds
+# Entries of a scraper run that never finished, e.g. because it crashed, are delivered after this
+OUTBOX_RUN_TIMEOUT = float(os.getenv("OUTBOX_RUN_TIMEOUT", "7200"))  # seconds
+
+DIGEST_MAX_EMBEDS = 10  # Discord limit per message
+DIGEST_MAX_MESSAGES = int(os.getenv("DIGEST_MAX_MESSAGES", "5"))
+DIGEST_MESSAGE_DELAY = float(os.getenv("DIGEST_MESSAGE_DELAY", "1"))  # seconds between messages to one webhook
+
+
+class NotificationError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def normalize_webhook_url(url: str) -> str:
+    """Normalize a webhook URL so that settings pointing at the same webhook collapse into one."""
+    split = urlsplit(url.strip())
+    netloc = split.netloc.lower()
+    if netloc in ("discordapp.com", "www.discordapp.com", "www.discord.com"):
+        netloc = "discord.com"
+    return urlunsplit(("https", netloc, split.path.rstrip("/"), split.query, None))
+
+
+def build_digest_messages(items: List[Tuple[Offer, List[str]]]) -> List[Tuple[dict, List[Offer]]]:
+    """
+    Build as few Discord messages as possible for the given offers.
+    Each item is an offer with the names of the queries that matched it.
+    Returns a list of (payload, offers covered by the message).
+    """
+    total = len(items)
+    shown = items[:DIGEST_MAX_EMBEDS * DIGEST_MAX_MESSAGES]
+    messages = []
+
+    for start in range(0, len(shown), DIGEST_MAX_EMBEDS):
+        chunk = shown[start:start + DIGEST_MAX_EMBEDS]
+        embeds = []
+        for offer, query_names in chunk:
+            label = "Query" if len(query_names) == 1 else "Queries"
+            embeds.append({
+                "title": offer.title[:256],  # Discord embed title limit
+                "url": offer.url,
+                "color": 0x00ff00,  # Green color
+                "footer": {
+                    "text": f"{label}: {', '.join(query_names)}"[:2048]  # Discord footer limit
+                }
+            })
+        messages.append(({"content": None, "embeds": embeds}, [offer for offer, _ in chunk]))
+
+    # Create the main message
+    content = f"🏠 **{total} new rental listing{'s' if total != 1 else ''} found!**"
+    if total > len(shown):
+        content += f"\n_(Showing first {len(shown)} of {total} offers)_"
+        # Offers that did not fit are covered by the summary line
+        messages[-1][1].extend(offer for offer, _ in items[len(shown):])
+    messages[0][0]["content"] = content
+    for payload, _ in messages[1:]:
+        del payload["content"]
+
+    return messages
+
+
+def post_discord_message(webhook_url: str, payload: dict) -> None:
+    """Post a single message to a Discord webhook. Raises NotificationError on failure."""
+    try:
+        response = requests.post(webhook_url,
+                                 json=payload,
+                                 headers={'Content-Type': 'application/json'},
+                                 timeout=10)
+    except requests.exceptions.RequestException as e:
+        raise NotificationError(f"Network error: {e}")
+
+    if response.status_code == 429:
+        # Discord reports the rate limit reset in seconds
+        try:
+            retry_after = float(response.json().get("retry_after", 0))
+        except ValueError:
+            retry_after = None
+        raise NotificationError("Rate limited by Discord", retry_after=retry_after)
+
+    if response.status_code != 204:
+        raise NotificationError(f"Discord returned status {response.status_code}: {response.text[:200]}")
+
+
+def enqueue_notifications(db: Session, query: SearchQuery, offers: List[Offer],
+                          scrape_run_id: Optional[int] = None) -> int:
+    """
+    Add outbox entries for new offers, one per active notification channel.
+    Entries are only added to the session - the caller commits them together
+    with the offers so a crash can never lose a notification.
+    Entries queued by a scraper run are held until the run has finished.
+    """
+    if not offers:
+        return 0
+
+    settings = db.query(NotificationSetting).filter(
+        NotificationSetting.user_id == query.user_id,
+        NotificationSetting.is_active == True
+    ).all()
+
+    count = 0
+    for setting in settings:
+        if not setting.discord_webhook_url:
+            continue
+        for offer in offers:
+            db.add(NotificationOutbox(
+                user_id=query.user_id,
+                query_id=query.id,
+                offer_id=offer.id,
+                notification_setting_id=setting.id,
+                scrape_run_id=scrape_run_id,
+            ))
+            count += 1
+    return count
+
+
+def backoff_delay(attempts: int) -> timedelta:
+    """Exponential backoff for the given number of failed attempts."""
+    seconds = OUTBOX_BACKOFF_BASE * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, OUTBOX_BACKOFF_MAX))
+
+
+def _retry_later(entries: List[NotificationOutbox], error: NotificationError, now: datetime) -> None:
+    for entry in entries:
+        entry.attempts += 1
+        entry.last_error = str(error)
+        if entry.attempts >= OUTBOX_MAX_ATTEMPTS:
+            entry.status = "failed"
+        else:
+            delay = backoff_delay(entry.attempts)
+            if error.retry_after:
+                delay = max(delay, timedelta(seconds=error.retry_after))
+            entry.next_attempt_at = now + delay
+
+
+def deliver_digest(db: Session, webhook_url: str, entries: List[NotificationOutbox], now: datetime) -> None:
+    """Merge the entries for one webhook into a digest and send it."""
+    # Deduplicate offers matched by several queries or queued through several settings
+    by_url: Dict[str, Tuple[Offer, List[str], List[NotificationOutbox]]] = {}
+    for entry in entries:
+        if not entry.offer:
+            entry.status = "skipped"
+            continue
+        offer, query_names, offer_entries = by_url.setdefault(entry.offer.url, (entry.offer, [], []))
+        if entry.query and entry.query.name not in query_names:
+            query_names.append(entry.query.name)
+        offer_entries.append(entry)
+
+    items = [(offer, query_names) for offer, query_names, _ in by_url.values()]
+    if not items:
+        db.commit()
+        return
+
+    pending_urls = set(by_url)
+    try:
+        for i, (payload, offers) in enumerate(build_digest_messages(items)):
+            if i > 0:
+                time.sleep(DIGEST_MESSAGE_DELAY)
+            post_discord_message(webhook_url, payload)
+            for offer in offers:
+                for entry in by_url[offer.url][2]:
+                    entry.status = "sent"
+                    entry.sent_at = datetime.utcnow()
+                    entry.last_error = None
+                pending_urls.discard(offer.url)
+        print(f"  ✓ Discord digest sent: {len(items)} offers")
+    except NotificationError as e:
+        print(f"  ✗ Discord digest failed: {e}")
+        _retry_later([entry for url in pending_urls for entry in by_url[url][2]], e, now)
+
+    db.commit()
+
+
+def deliver_pending(db: Session, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Deliver one batch of due outbox entries.
+    Entries for the same webhook URL are merged into a digest, which is held back
+    until the scraper runs that queued the entries have finished, and until the
+    oldest entry is older than the configured digest window.
+    Returns the number of entries processed.
+    """
+    now = datetime.utcnow()
+    entries = db.query(NotificationOutbox).outerjoin(ScrapeRun).filter(
+        NotificationOutbox.status == "pending",
+        NotificationOutbox.next_attempt_at <= now,
+        or_(
+            NotificationOutbox.scrape_run_id.is_(None),
+            ScrapeRun.finished_at.is_not(None),
+            ScrapeRun.started_at <= now - timedelta(seconds=OUTBOX_RUN_TIMEOUT),
+        )
+    ).order_by(NotificationOutbox.id).limit(batch_size).all()
+
+    groups: Dict[str, List[NotificationOutbox]] = {}
+    for entry in entries:
+        setting = entry.notification_setting
+        if not setting or not setting.is_active or not setting.discord_webhook_url:
+            entry.status = "skipped"
+            continue
+        groups.setdefault(normalize_webhook_url(setting.discord_webhook_url), []).append(entry)
+    db.commit()
+
+    for webhook_url, group in groups.items():
+        settings = {entry.notification_setting for entry in group}
+        window = min(setting.digest_window_minutes or 0 for setting in settings)
+        if window:
+            # Hold the digest until the oldest pending entry for this webhook leaves the window
+            oldest = db.query(func.min(NotificationOutbox.created_at)).filter(
+                NotificationOutbox.status == "pending",
+                NotificationOutbox.notification_setting_id.in_([setting.id for setting in settings])
+            ).scalar()
+            send_at = oldest + timedelta(minutes=window)
+            if send_at > now:
+                for entry in group:
+                    entry.next_attempt_at = send_at
+                db.commit()
+                continue
+
+        deliver_digest(db, webhook_url, group, now)
+
+    return len(entries)
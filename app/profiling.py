@@ -0,0 +1,210 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+# Profiling of scraper runs: "cprofile" (deterministic) or "sampling", off by default
+SCRAPE_PROFILE = os.getenv("SCRAPE_PROFILE", "")
+SCRAPE_PROFILE_DIR = os.getenv("SCRAPE_PROFILE_DIR", "./profiles")
+# Only write the profiles of the N slowest queries of a run, 0 for all of them
+SCRAPE_PROFILE_SLOWEST = int(os.getenv("SCRAPE_PROFILE_SLOWEST", "0"))
+SAMPLING_INTERVAL = float(os.getenv("SCRAPE_PROFILE_INTERVAL", "0.01"))  # seconds between samples
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+T = TypeVar("T")
+
+
+class Profiler:
+    """
+    Profiles a scraper run in named sections, e.g. one per query. A section may be entered several
+    times, from any thread; its profiles and wall time add up. This base class profiles nothing.
+    """
+    # Whether sections must run one at a time, rather than concurrently in fetcher threads
+    serial = False
+
+    def __init__(self, directory: str = SCRAPE_PROFILE_DIR, slowest: int = SCRAPE_PROFILE_SLOWEST):
+        self.directory = Path(directory)
+        self.slowest = slowest
+        self.durations: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.durations[name] += time.monotonic() - started
+
+    def run(self, name: str, function: Callable[..., T], *args) -> T:
+        """Call function in a section; for running sections in a thread pool."""
+        with self.section(name):
+            return function(*args)
+
+    def sections_to_write(self) -> List[str]:
+        """Sections whose profiles are kept: all non-query sections and the slowest queries."""
+        queries = sorted((name for name in self.durations if name.startswith("query-")),
+                         key=self.durations.get, reverse=True)
+        kept = set(queries[:self.slowest] if self.slowest else queries)
+        return [name for name in self.durations if name in kept or not name.startswith("query-")]
+
+    def write(self) -> Optional[Path]:
+        """Write the run's profiles to a new directory. Returns the directory, if anything was written."""
+        return None
+
+    def _run_directory(self) -> Path:
+        directory = self.directory / datetime.now().strftime("%Y%m%d-%H%M%S")
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "summary.txt", "w") as summary:
+            for name, duration in sorted(self.durations.items(), key=lambda item: item[1], reverse=True):
+                summary.write(f"{name}\t{duration:.3f}s\n")
+        return directory
+
+
+class DeterministicProfiler(Profiler):
+    """
+    cProfile each section. Only one cProfile profiler can be active at a time, so sections run
+    one at a time and a section entered while another one is profiled isn't profiled itself.
+    Writes a pstats file per section and one for the whole run.
+    """
+    serial = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiles: Dict[str, List[cProfile.Profile]] = defaultdict(list)
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active
+            profile = None
+        try:
+            with super().section(name):
+                yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self.profiles[name].append(profile)
+
+    def write(self) -> Optional[Path]:
+        if not self.profiles:
+            return None
+        directory = self._run_directory()
+        for name in self.sections_to_write():
+            if self.profiles.get(name):
+                pstats.Stats(*self.profiles[name]).dump_stats(directory / f"{name}.pstats")
+        # The run as a whole, including queries whose own profiles weren't kept
+        pstats.Stats(*[profile for profiles in self.profiles.values() for profile in profiles]).dump_stats(directory / "cycle.pstats")
+        return directory
+
+
+class SamplingProfiler(Profiler):
+    """
+    Samples the stacks of all threads at a fixed interval, cheap enough to leave on in production.
+    Samples of a thread are attributed to the section it is in. Writes collapsed stacks
+    ("folded" format, as read by flamegraph.pl, speedscope and inferno) per section and for the whole run.
+    """
+
+    def __init__(self, *args, interval: float = SAMPLING_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.samples: Dict[str, Counter] = defaultdict(Counter)
+        self.cycle_samples: Counter = Counter()
+        self._sections: Dict[int, str] = {}  # thread ident -> section the thread is in
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        ident = threading.get_ident()
+        outer = self._sections.get(ident)
+        self._sections[ident] = name
+        try:
+            with super().section(name):
+                yield
+        finally:
+            if outer is None:
+                self._sections.pop(ident, None)
+            else:
+                self._sections[ident] = outer
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = ";".join([names.get(ident, str(ident)), *_fold(frame)])
+                self.cycle_samples[stack] += 1
+                section = self._sections.get(ident)
+                if section is not None:
+                    self.samples[section][stack] += 1
+
+    def write(self) -> Optional[Path]:
+        if not self.cycle_samples:
+            return None
+        directory = self._run_directory()
+        for name in self.sections_to_write():
+            if self.samples.get(name):
+                _write_folded(directory / f"{name}.folded", self.samples[name])
+        _write_folded(directory / "cycle.folded", self.cycle_samples)
+        return directory
+
+
+def _fold(frame) -> List[str]:
+    """The frames of a stack, outermost first."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _write_folded(path: Path, samples: Counter) -> None:
+    with open(path, "w") as output:
+        for stack, count in samples.most_common():
+            output.write(f"{stack} {count}\n")
+
+
+def make_profiler(mode: str = SCRAPE_PROFILE, directory: str = SCRAPE_PROFILE_DIR,
+                  slowest: int = SCRAPE_PROFILE_SLOWEST) -> Profiler:
+    """A profiler for the given mode; with no mode, one that only measures section durations."""
+    if mode == "cprofile":
+        return DeterministicProfiler(directory, slowest)
+    if mode == "sampling":
+        return SamplingProfiler(directory, slowest)
+    if mode:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+    return Profiler(directory, slowest)
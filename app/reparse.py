@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+
+from archive import SCRAPE_ARCHIVE_DIR, ArchivedPage, read_page
+from sources import PAGE_PARSERS, OfferBatch, parse_html
+
+# Pages handed to a worker process at a time; the index entries are small, the workers read the bodies themselves
+REPARSE_CHUNK_SIZE = 16
+
+
+@dataclass
+class ReparseResult:
+    page: ArchivedPage
+    offers: OfferBatch
+    next_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+def reparse_page(page: ArchivedPage, directory: str = SCRAPE_ARCHIVE_DIR) -> ReparseResult:
+    """Run the portal's current parser over a recorded page. Never touches the network."""
+    if page.status >= 400:
+        # Recorded error pages have no listings to parse
+        return ReparseResult(page, OfferBatch())
+    parse_page = PAGE_PARSERS.get(page.host)
+    if parse_page is None:
+        return ReparseResult(page, OfferBatch(), error=f"No parser for {page.host}")
+    try:
+        html = read_page(directory, page).decode(page.encoding or "utf-8", errors="replace")
+        offers, next_url = parse_html(parse_page, html, page.url)
+        return ReparseResult(page, offers, next_url)
+    except Exception as e:
+        return ReparseResult(page, OfferBatch(), error=str(e))
+
+
+def _reparse_in_worker(args) -> ReparseResult:
+    return reparse_page(*args)
+
+
+def reparse_archive(pages: Iterable[ArchivedPage], directory: str = SCRAPE_ARCHIVE_DIR,
+                    processes: int = 1) -> Iterator[ReparseResult]:
+    """Re-parse recorded pages, in a pool of worker processes if processes > 1. Results keep the archive's order."""
+    if processes <= 1:
+        for page in pages:
+            yield reparse_page(page, directory)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        yield from pool.map(_reparse_in_worker, ((page, directory) for page in pages), chunksize=REPARSE_CHUNK_SIZE)
@@ -0,0 +1,118 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from models import SearchQuery, ScrapeRequest, ScrapeEvent
+
+# How often the scrape worker looks for new requests and the event stream for new events
+SCRAPE_WORKER_POLL_INTERVAL = float(os.getenv("SCRAPE_WORKER_POLL_INTERVAL", "1"))  # seconds
+SCRAPE_EVENTS_POLL_INTERVAL = float(os.getenv("SCRAPE_EVENTS_POLL_INTERVAL", "0.5"))  # seconds
+# Requests not picked up by then are failed, e.g. when no worker is running
+SCRAPE_REQUEST_EXPIRY = int(os.getenv("SCRAPE_REQUEST_EXPIRY", "600"))  # seconds
+# Claims on a query older than this are taken to be left behind by a crashed process
+SCRAPE_CLAIM_TIMEOUT = int(os.getenv("SCRAPE_CLAIM_TIMEOUT", "3600"))  # seconds
+
+FINISHED_EVENTS = ("done", "error")
+
+
+def claim_owner(role: str) -> str:
+    """Claim owner name of this process, e.g. "scraper-1234"."""
+    return f"{role}-{os.getpid()}"
+
+
+def claim_query(db: Session, query_id: int, owner: str, now: Optional[datetime] = None) -> bool:
+    """
+    Claim a query before scraping it, so the scraper run and the scrape worker never scrape
+    the same query at once and race to insert the same offers. Returns False if another
+    process holds the claim. Committed right away.
+    """
+    now = now or datetime.utcnow()
+    claimed = db.query(SearchQuery).filter(
+        SearchQuery.id == query_id,
+        or_(
+            SearchQuery.claimed_by.is_(None),
+            SearchQuery.claimed_by == owner,
+            SearchQuery.claimed_at < now - timedelta(seconds=SCRAPE_CLAIM_TIMEOUT),
+        ),
+    ).update({
+        SearchQuery.claimed_by: owner, SearchQuery.claimed_at: now,
+        # A claim isn't a change of the query; keeps the onupdate timestamp from firing
+        SearchQuery.updated_at: SearchQuery.updated_at,
+    }, synchronize_session=False)
+    db.commit()
+    return bool(claimed)
+
+
+def release_query(db: Session, owner: str, query_id: Optional[int] = None) -> None:
+    """Release the owner's claim on a query, or on all its queries. Committed right away."""
+    claims = db.query(SearchQuery).filter(SearchQuery.claimed_by == owner)
+    if query_id is not None:
+        claims = claims.filter(SearchQuery.id == query_id)
+    claims.update({
+        SearchQuery.claimed_by: None, SearchQuery.claimed_at: None, SearchQuery.updated_at: SearchQuery.updated_at,
+    }, synchronize_session=False)
+    db.commit()
+
+
+def request_scrape(db: Session, query: SearchQuery) -> ScrapeRequest:
+    """Queue an on-demand scrape of the query. A query already waiting or being scraped isn't queued twice."""
+    active = db.query(ScrapeRequest).filter(
+        ScrapeRequest.query_id == query.id,
+        ScrapeRequest.status.in_(["pending", "running"])
+    ).order_by(ScrapeRequest.id.desc()).first()
+    if active:
+        return active
+    scrape_request = ScrapeRequest(user_id=query.user_id, query_id=query.id, status="pending")
+    db.add(scrape_request)
+    db.commit()
+    return scrape_request
+
+
+def add_event(db: Session, scrape_request: ScrapeRequest, kind: str, **data: Any) -> ScrapeEvent:
+    """Record a progress event. Committed right away, so the event stream sees it."""
+    event = ScrapeEvent(request_id=scrape_request.id, kind=kind, data=json.dumps(data, ensure_ascii=False))
+    db.add(event)
+    db.commit()
+    return event
+
+
+def claim_next_request(db: Session, now: Optional[datetime] = None) -> Optional[ScrapeRequest]:
+    """Take the oldest pending request, failing the ones that waited too long. Safe with several workers."""
+    now = now or datetime.utcnow()
+    for scrape_request in db.query(ScrapeRequest).filter(ScrapeRequest.status == "pending").order_by(ScrapeRequest.id):
+        if scrape_request.requested_at and scrape_request.requested_at < now - timedelta(seconds=SCRAPE_REQUEST_EXPIRY):
+            finish_request(db, scrape_request, error="Not picked up in time")
+            continue
+        claimed = db.query(ScrapeRequest).filter(
+            ScrapeRequest.id == scrape_request.id, ScrapeRequest.status == "pending"
+        ).update({ScrapeRequest.status: "running", ScrapeRequest.started_at: now}, synchronize_session=False)
+        db.commit()
+        if claimed:
+            db.refresh(scrape_request)
+            return scrape_request
+    return None
+
+
+def finish_request(db: Session, scrape_request: ScrapeRequest, error: Optional[str] = None, **data: Any) -> None:
+    scrape_request.status = "error" if error else "done"
+    scrape_request.error = error
+    scrape_request.finished_at = datetime.utcnow()
+    if error:
+        add_event(db, scrape_request, "error", error=error, **data)
+    else:
+        add_event(db, scrape_request, "done", **data)
+
+
+def events_after(db: Session, request_id: int, after_id: int = 0) -> List[ScrapeEvent]:
+    return db.query(ScrapeEvent).filter(
+        ScrapeEvent.request_id == request_id, ScrapeEvent.id > after_id
+    ).order_by(ScrapeEvent.id).all()
+
+
+def format_sse(event: ScrapeEvent) -> str:
+    """A Server-Sent Events message. The id lets a reconnecting browser continue where it left off."""
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {event.data}\n\n"
@@ -1,7 +1,28 @@
-from typing import List, Tuple
-from urllib.parse import urlsplit
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
-from sources import Offer, HANDLERS
+from sources import Offer, OfferBatch, HANDLERS, Checkpoint, Deadline, ScrapeInterrupted
+
+PREVIEW_CACHE_TTL = float(os.getenv("PREVIEW_CACHE_TTL", "300"))  # seconds
+PREVIEW_CACHE_MAX_ENTRIES = int(os.getenv("PREVIEW_CACHE_MAX_ENTRIES", "256"))
+
+# normalized URL -> (expires at, offers on the first page)
+_preview_cache: Dict[str, Tuple[float, OfferBatch]] = {}
+# normalized URL -> fetch in progress, shared by concurrent identical previews
+_preview_inflight: Dict[str, "asyncio.Future[OfferBatch]"] = {}
+
+
+def fetch_first_page(url: str) -> OfferBatch:
+    """Fetch all offers from the first page of a query URL."""
+    split = urlsplit(url)
+    if split.netloc not in HANDLERS:
+        raise ValueError(f"Unsupported site: {split.netloc}")
+
+    handler = HANDLERS[split.netloc]
+    return handler(url, max_pages=1)  # Only fetch first page for testing
 
 
 def test_query(url: str, limit: int = 5) -> Tuple[List[Offer], bool]:
@@ -11,27 +32,74 @@ def test_query(url: str, limit: int = 5) -> Tuple[List[Offer], bool]:
     Returns a tuple of (offers, has_more_results).
     """
     try:
-        split = urlsplit(url)
-        if split.netloc not in HANDLERS:
-            raise ValueError(f"Unsupported site: {split.netloc}")
-        
-        handler = HANDLERS[split.netloc]
-        offers = handler(url, max_pages=1)  # Only fetch first page for testing
-        
+        offers = fetch_first_page(url)
+
         # Check if there might be more results
         has_more_results = len(offers) > limit
-        
+
         # Return only the first 'limit' offers for preview
         return offers[:limit], has_more_results
-        
+
     except Exception as e:
         raise Exception(f"Error testing query: {str(e)}")
 
 
-def scrape_query(url: str) -> List[Offer]:
+def normalize_query_url(url: str) -> str:
+    """Normalize a query URL for use as a cache key."""
+    split = urlsplit(url.strip())
+    # Parameter order doesn't change the search, but the parameters themselves are kept verbatim
+    query = "&".join(sorted(part for part in split.query.split("&") if part))
+    return urlunsplit((split.scheme.lower(), split.netloc.lower(), split.path, query, None))
+
+
+def _store_preview(key: str, offers: OfferBatch) -> None:
+    now = time.monotonic()
+    for cached_key in [k for k, (expires, _) in _preview_cache.items() if expires <= now]:
+        del _preview_cache[cached_key]
+    while len(_preview_cache) >= PREVIEW_CACHE_MAX_ENTRIES:
+        # Dicts keep insertion order, so the first entry is the oldest
+        del _preview_cache[next(iter(_preview_cache))]
+    _preview_cache[key] = (now + PREVIEW_CACHE_TTL, offers)
+
+
+async def _fetch_preview(key: str, url: str) -> OfferBatch:
+    offers = await asyncio.to_thread(fetch_first_page, url)
+    _store_preview(key, offers)
+    return offers
+
+
+async def preview_query(url: str, limit: int = 5) -> Tuple[List[Offer], bool]:
+    """
+    Non-blocking version of test_query.
+    Results are cached per normalized URL and concurrent identical previews
+    share a single upstream fetch.
+    """
+    key = normalize_query_url(url)
+
+    cached = _preview_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        offers = cached[1]
+    else:
+        future = _preview_inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(_fetch_preview(key, url))
+            _preview_inflight[key] = future
+            future.add_done_callback(lambda _: _preview_inflight.pop(key, None))
+        try:
+            # Shield the shared fetch so one disconnecting client doesn't cancel it for the others
+            offers = await asyncio.shield(future)
+        except Exception as e:
+            raise Exception(f"Error testing query: {str(e)}")
+
+    return offers[:limit], len(offers) > limit
+
+
+def scrape_query(url: str, deadline: Optional[Deadline] = None, resume: Optional[Checkpoint] = None,
+                 max_pages: Optional[int] = None) -> OfferBatch:
     """
-    Scrape all offers from a query URL.
-    This is used for the full scraping process.
+    Scrape all offers from a query URL, or from a checkpoint of an earlier interrupted scrape onwards.
+    This is used for the full scraping process; max_pages limits it to the first pages.
+    Raises ScrapeInterrupted (or ScrapeTimeout if the deadline passes) with the offers found so far.
     """
     try:
         split = urlsplit(url)
@@ -39,8 +107,10 @@ def scrape_query(url: str) -> List[Offer]:
             raise ValueError(f"Unsupported site: {split.netloc}")
         
         handler = HANDLERS[split.netloc]
-        return handler(url)  # Fetch all pages for full scraping
+        return handler(url, max_pages, deadline, resume)
         
+    except ScrapeInterrupted:
+        raise
     except Exception as e:
         raise Exception(f"Error scraping query: {str(e)}")
 
@@ -0,0 +1,130 @@
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+# External-content FTS5 index over offers, kept in sync by triggers.
+# remove_diacritics lets "garaz" match "garaż".
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS offers_fts USING fts5(
+        title, district,
+        content='offers', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS offers_fts_insert AFTER INSERT ON offers BEGIN
+        INSERT INTO offers_fts(rowid, title, district) VALUES (new.id, new.title, new.district);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS offers_fts_delete AFTER DELETE ON offers BEGIN
+        INSERT INTO offers_fts(offers_fts, rowid, title, district) VALUES ('delete', old.id, old.title, old.district);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS offers_fts_update AFTER UPDATE OF title, district ON offers BEGIN
+        INSERT INTO offers_fts(offers_fts, rowid, title, district) VALUES ('delete', old.id, old.title, old.district);
+        INSERT INTO offers_fts(rowid, title, district) VALUES (new.id, new.title, new.district);
+    END
+    """,
+]
+
+SEARCH_PAGE_SIZE = 20
+
+
+@dataclass
+class SearchResult:
+    id: int
+    title: str
+    url: str
+    scraped_at: str  # Raw SQLite timestamp
+    price: Optional[int]
+    district: Optional[str]
+    query_name: str
+    score: float
+
+
+def search_supported(engine: Engine) -> bool:
+    """Full-text search relies on SQLite's FTS5."""
+    return engine.dialect.name == "sqlite"
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Create the full-text index and its triggers if they don't exist yet."""
+    if not search_supported(engine):
+        return
+    with engine.begin() as connection:
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'offers_fts'")).first()
+        for statement in SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # Index offers stored before the index existed
+            connection.execute(text("INSERT INTO offers_fts(offers_fts) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    """Rebuild the full-text index from the offers table."""
+    with engine.begin() as connection:
+        for statement in SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO offers_fts(offers_fts) VALUES ('rebuild')"))
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Turn user input into an FTS5 query matching all words as prefixes."""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    # Quoting keeps FTS5 operators in user input from being interpreted
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def encode_cursor(result: SearchResult) -> str:
+    return f"{result.score!r}:{result.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    score, offer_id = cursor.rsplit(":", 1)
+    return float(score), int(offer_id)
+
+
+def search_offers(db: Session, user_id: int, query: str, after: Optional[str] = None,
+                  limit: int = SEARCH_PAGE_SIZE) -> Tuple[List[SearchResult], Optional[str]]:
+    """
+    Search a user's offers, best matches first.
+    Pages are addressed with a keyset cursor on (score, id) instead of an offset,
+    so deep pages cost the same as the first one.
+    Returns the results and the cursor of the next page, if there is one.
+    """
+    match = build_match_query(query)
+    if not match:
+        return [], None
+
+    params = {"match": match, "user_id": user_id, "limit": limit + 1}
+    keyset = ""
+    if after:
+        params["after_score"], params["after_id"] = decode_cursor(after)
+        keyset = "WHERE score > :after_score OR (score = :after_score AND id > :after_id)"
+
+    rows = db.execute(text(f"""
+        SELECT * FROM (
+            SELECT offers.id, offers.title, offers.url, offers.scraped_at, offers.price, offers.district,
+                   search_queries.name AS query_name, bm25(offers_fts) AS score
+            FROM offers_fts
+            JOIN offers ON offers.id = offers_fts.rowid
+            JOIN search_queries ON search_queries.id = offers.query_id
+            WHERE offers_fts MATCH :match AND offers.user_id = :user_id
+        )
+        {keyset}
+        ORDER BY score, id
+        LIMIT :limit
+    """), params).all()
+
+    results = [SearchResult(**row._mapping) for row in rows[:limit]]
+    next_cursor = encode_cursor(results[-1]) if len(rows) > limit else None
+    return results, next_cursor
@@ -0,0 +1,196 @@
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from models import User, SearchQuery, NotificationSetting, Offer
+
+# Rows per bulk insert statement
+SEED_BATCH_SIZE = int(os.getenv("SEED_BATCH_SIZE", "10000"))
+SEED_USERNAME_PREFIX = "loadtest-"
+
+# Offers are spread over this many days before now
+SEED_HISTORY_DAYS = 90
+
+CITIES = {
+    "warszawa": ["Mokotów", "Wola", "Śródmieście", "Praga-Południe", "Ursynów", "Bemowo", "Bielany", "Targówek"],
+    "krakow": ["Stare Miasto", "Kazimierz", "Podgórze", "Krowodrza", "Nowa Huta", "Bronowice"],
+    "gdansk": ["Wrzeszcz", "Oliwa", "Przymorze", "Śródmieście", "Zaspa", "Orunia"],
+    "wroclaw": ["Krzyki", "Fabryczna", "Psie Pole", "Stare Miasto", "Śródmieście"],
+    "poznan": ["Jeżyce", "Grunwald", "Wilda", "Łazarz", "Winogrady"],
+}
+
+# Search URL per portal, as users paste them from the browser
+SEARCH_URLS = {
+    "www.olx.pl": "https://www.olx.pl/nieruchomosci/mieszkania/wynajem/{city}/?search%5Bfilter_enum_rooms%5D%5B0%5D={rooms}&page={variant}",
+    "gratka.pl": "https://gratka.pl/nieruchomosci/mieszkania/{city}/wynajem?liczba-pokoi:min={rooms}&page={variant}",
+    "rentola.pl": "https://rentola.pl/wynajem?location={city}&property_types=apartment&rooms={rooms}&page={variant}",
+    "gdansk.nieruchomosci-online.pl": "https://gdansk.nieruchomosci-online.pl/szukaj.html?3,mieszkanie,wynajem,,Gda%C5%84sk:7183,,,,,,,,,,,{rooms}-{rooms}&p={variant}",
+    "ogloszenia.trojmiasto.pl": "https://ogloszenia.trojmiasto.pl/nieruchomosci-mam-do-wynajecia/ri,{rooms}_{rooms}.html?strona={variant}",
+}
+# Portals covering a single city; the others are searched in any of CITIES
+SEARCH_URL_CITIES = {
+    "gdansk.nieruchomosci-online.pl": "gdansk",
+    "ogloszenia.trojmiasto.pl": "gdansk",
+}
+OFFER_URLS = {
+    "www.olx.pl": "https://www.olx.pl/d/oferta/mieszkanie-{rooms}-pokoje-{slug}-CID3-ID{id}.html",
+    "gratka.pl": "https://gratka.pl/nieruchomosci/mieszkanie-{slug}/ob/{id}",
+    "rentola.pl": "https://rentola.pl/listings/mieszkanie-{rooms}-pokoje-{slug}-{id}",
+    "gdansk.nieruchomosci-online.pl": "https://gdansk.nieruchomosci-online.pl/mieszkanie,{slug}/{id}.html",
+    "ogloszenia.trojmiasto.pl": "https://ogloszenia.trojmiasto.pl/nieruchomosci-mam-do-wynajecia/mieszkanie-{slug}-ogl{id}.html",
+}
+
+# Outcome of the last scrape, roughly as often as seen in production
+SCRAPE_STATUSES = ["success"] * 85 + ["no_results"] * 6 + ["partial"] * 4 + ["timeout"] * 2 + ["error"] * 3
+
+
+@dataclass
+class SeedScale:
+    users: int
+    queries: int
+    offers: int
+    notifications: int
+
+
+def seed_username(number: int, prefix: str = SEED_USERNAME_PREFIX) -> str:
+    """Username of the n-th (1-based) seeded user, as used by the load test to log in."""
+    return f"{prefix}{number:05d}"
+
+
+def _next_id(engine: Engine, column) -> int:
+    with engine.connect() as conn:
+        return (conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _bulk_insert(engine: Engine, table, rows: Iterator[dict], batch_size: int) -> int:
+    """Insert the rows with one executemany per batch, each batch in its own transaction."""
+    inserted = 0
+    for batch in _batches(rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        inserted += len(batch)
+        if inserted % (batch_size * 10) == 0:
+            print(f"  {table.name}: {inserted} rows")
+    return inserted
+
+
+def generate_users(first_id: int, count: int, hashed_password: str, prefix: str, now: datetime) -> Iterator[dict]:
+    for number in range(1, count + 1):
+        yield {
+            "id": first_id + number - 1,
+            "username": seed_username(number, prefix),
+            "hashed_password": hashed_password,
+            "created_at": now - timedelta(days=SEED_HISTORY_DAYS),
+        }
+
+
+def generate_queries(rng: random.Random, first_id: int, user_ids: List[int], count: int, now: datetime) -> Iterator[dict]:
+    """Queries are dealt out to the users in turn, so every user has about the same number."""
+    for number in range(count):
+        city = rng.choice(list(CITIES))
+        host = rng.choice([host for host in SEARCH_URLS if SEARCH_URL_CITIES.get(host, city) == city])
+        rooms = rng.randint(1, 4)
+        status = rng.choice(SCRAPE_STATUSES)
+        scraped_at = now - timedelta(seconds=rng.randint(60, 3600))
+        runs = rng.randint(1, 2000)
+        yield {
+            "id": first_id + number,
+            "name": f"{city.capitalize()}, {rooms} rooms #{number + 1}",
+            "url": SEARCH_URLS[host].format(city=city, rooms=rooms, variant=number + 1),
+            "user_id": user_ids[number % len(user_ids)],
+            "is_active": rng.random() < 0.9,
+            "created_at": now - timedelta(days=SEED_HISTORY_DAYS),
+            "updated_at": now - timedelta(days=rng.randint(0, SEED_HISTORY_DAYS)),
+            "last_scraped_at": scraped_at,
+            "last_deep_scan_at": scraped_at,
+            "initial_scan_done": True,
+            "last_scrape_count": 0 if status == "no_results" else rng.randint(1, 200),
+            "last_scrape_status": status,
+            "last_scrape_error": "Read timed out" if status in ("partial", "timeout", "error") else None,
+            "scrape_runs": runs,
+            "total_scrape_duration": runs * rng.uniform(2, 60),
+        }
+
+
+def generate_notifications(rng: random.Random, first_id: int, user_ids: List[int], count: int, now: datetime) -> Iterator[dict]:
+    for number in range(count):
+        yield {
+            "id": first_id + number,
+            "user_id": user_ids[number % len(user_ids)],
+            "discord_webhook_url": f"https://discord.com/api/webhooks/{first_id + number}/{rng.getrandbits(128):032x}",
+            "is_active": rng.random() < 0.9,
+            "digest_window_minutes": rng.choice([0, 0, 0, 15, 60]),
+            "created_at": now - timedelta(days=SEED_HISTORY_DAYS),
+            "updated_at": now - timedelta(days=rng.randint(0, SEED_HISTORY_DAYS)),
+        }
+
+
+def generate_offers(rng: random.Random, first_id: int, queries: List[dict], count: int, now: datetime) -> Iterator[dict]:
+    """Offers of random queries, on the query's portal and in its city, scraped over the last days."""
+    for number in range(count):
+        query = rng.choice(queries)
+        offer_id = first_id + number
+        host = query["url"].split("/")[2]
+        # Not every portal has the city in its search URL, but every query has it in its name
+        city = query["name"].split(",")[0].lower()
+        district = rng.choice(CITIES[city])
+        rooms = rng.randint(1, 4)
+        area = round(rng.uniform(18, 35) * rooms, 1)
+        yield {
+            "id": offer_id,
+            "title": f"Mieszkanie {rooms}-pokojowe, {area} m², {district}",
+            "url": OFFER_URLS[host].format(rooms=rooms, slug=city, id=offer_id),
+            # Skewed towards recent offers, like a live database
+            "scraped_at": now - timedelta(seconds=int(SEED_HISTORY_DAYS * 86400 * rng.random() ** 2)),
+            "price": int(round(rng.uniform(35, 70) * area, -1)),
+            "area": area,
+            "rooms": rooms,
+            "district": district,
+            "user_id": query["user_id"],
+            "query_id": query["id"],
+        }
+
+
+def seed(engine: Engine, scale: SeedScale, hashed_password: str, prefix: str = SEED_USERNAME_PREFIX,
+         random_seed: int = 0, batch_size: int = SEED_BATCH_SIZE) -> Dict[str, int]:
+    """Add synthetic users with their queries, notification settings and offers. Raises ValueError
+    if users with the prefix already exist; ids continue after the existing rows."""
+    if scale.users < 1 and (scale.queries or scale.notifications or scale.offers):
+        raise ValueError("Queries, notifications and offers need at least one user")
+    if scale.queries < 1 and scale.offers:
+        raise ValueError("Offers need at least one query")
+    with engine.connect() as conn:
+        if conn.execute(select(User.id).where(User.username.startswith(prefix, autoescape=True)).limit(1)).first():
+            raise ValueError(f"Users named {prefix}* already exist")
+
+    rng = random.Random(random_seed)
+    now = datetime.utcnow()
+    first_user_id = _next_id(engine, User.id)
+    user_ids = list(range(first_user_id, first_user_id + scale.users))
+    # Kept in memory: offers are assigned to them. A few MB even for tens of thousands of queries
+    queries = list(generate_queries(rng, _next_id(engine, SearchQuery.id), user_ids, scale.queries, now))
+
+    return {
+        "users": _bulk_insert(engine, User.__table__, generate_users(first_user_id, scale.users, hashed_password, prefix, now), batch_size),
+        "queries": _bulk_insert(engine, SearchQuery.__table__, iter(queries), batch_size),
+        "notifications": _bulk_insert(engine, NotificationSetting.__table__, generate_notifications(
+            rng, _next_id(engine, NotificationSetting.id), user_ids, scale.notifications, now), batch_size),
+        "offers": _bulk_insert(engine, Offer.__table__, generate_offers(
+            rng, _next_id(engine, Offer.id), queries, scale.offers, now), batch_size),
+    }
@@ -1,271 +1,586 @@
+import itertools
 import json
-from dataclasses import dataclass
-from typing import List, Dict, Callable, Optional
-from urllib.parse import urljoin, urlsplit, parse_qs, urlencode, urlunsplit
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, List, Dict, Callable, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, parse_qs, parse_qsl, urlencode, urlunsplit, SplitResult
 
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
+
+from archive import PageArchive
+
+SCRAPE_CONNECT_TIMEOUT = float(os.getenv("SCRAPE_CONNECT_TIMEOUT", "10"))  # seconds
+SCRAPE_READ_TIMEOUT = float(os.getenv("SCRAPE_READ_TIMEOUT", "30"))  # seconds
+# Stop downloading a results page once everything the parser needs has arrived
+SCRAPE_STREAMING = os.getenv("SCRAPE_STREAMING", "1").lower() in ("1", "true", "yes")
+STREAM_CHUNK_SIZE = 16 * 1024
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36"
 
 
-@dataclass(frozen=True, eq=True)
+@dataclass(frozen=True, eq=True, slots=True)
 class Offer:
     title: str
     url: str
+    # Structured attributes, when the listing card shows them
+    price: Optional[int] = field(default=None, compare=False)
+    area: Optional[float] = field(default=None, compare=False)
+    rooms: Optional[int] = field(default=None, compare=False)
+    district: Optional[str] = field(default=None, compare=False)
+
+
+class OfferBatch:
+    """
+    Offers stored column-wise, one list per field instead of one object per offer,
+    so deep queries don't allocate an object per listing. Offers are unique by URL,
+    the first occurrence wins. Iterating yields Offer objects for code that wants them.
+    """
+    __slots__ = ("titles", "urls", "prices", "areas", "rooms", "districts", "_positions")
+
+    def __init__(self) -> None:
+        self.titles: List[str] = []
+        self.urls: List[str] = []
+        self.prices: List[Optional[int]] = []
+        self.areas: List[Optional[float]] = []
+        self.rooms: List[Optional[int]] = []
+        self.districts: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}  # URL -> index
+
+    def add(self, title: str, url: str, price: Optional[int] = None, area: Optional[float] = None,
+            rooms: Optional[int] = None, district: Optional[str] = None) -> bool:
+        """Append an offer unless its URL is already in the batch. Returns whether it was added."""
+        if url in self._positions:
+            return False
+        self._positions[url] = len(self.urls)
+        self.titles.append(title)
+        self.urls.append(url)
+        self.prices.append(price)
+        self.areas.append(area)
+        self.rooms.append(rooms)
+        self.districts.append(district)
+        return True
+
+    def extend(self, other: "OfferBatch") -> None:
+        for row in other.rows():
+            self.add(*row)
+
+    def rows(self) -> Iterator[Tuple[str, str, Optional[int], Optional[float], Optional[int], Optional[str]]]:
+        """(title, url, price, area, rooms, district) tuples, in the order of the Offer fields."""
+        return zip(self.titles, self.urls, self.prices, self.areas, self.rooms, self.districts)
+
+    def take(self, indices: Iterable[int]) -> "OfferBatch":
+        """A new batch with the offers at the given positions."""
+        batch = OfferBatch()
+        for i in indices:
+            batch.add(self.titles[i], self.urls[i], self.prices[i], self.areas[i], self.rooms[i], self.districts[i])
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __iter__(self) -> Iterator[Offer]:
+        return (Offer(*row) for row in self.rows())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Offer(*row) for row in itertools.islice(self.rows(), *index.indices(len(self)))]
+        return Offer(self.titles[index], self.urls[index], self.prices[index], self.areas[index],
+                     self.rooms[index], self.districts[index])
+
+    def __getstate__(self):
+        # Sent back from parse workers; the URL index is cheaper to rebuild than to pickle
+        return self.titles, self.urls, self.prices, self.areas, self.rooms, self.districts
+
+    def __setstate__(self, state) -> None:
+        self.titles, self.urls, self.prices, self.areas, self.rooms, self.districts = state
+        self._positions = {url: i for i, url in enumerate(self.urls)}
+
+
+PRICE_RE = re.compile(r"(?<![\w.,])(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?:[.,]\d{1,2})?\s*zł(?!\s*/)")
+AREA_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*m(?:²|2)(?!\d)")
+ROOMS_RE = re.compile(r"(\d+)\s*-?\s*(?:pokoj|pokoi|pokój|pok\.)", re.IGNORECASE)
+
+
+def _parse_number(text: str) -> float:
+    return float(text.replace(" ", "").replace("\u00a0", "").replace(",", "."))
+
+
+def extract_attributes(text: str) -> Dict[str, Any]:
+    """Extract price, area and number of rooms from the text of a listing card."""
+    attributes: Dict[str, Any] = {}
+
+    # The first amount is the rent; later ones are usually fees or the price per m²
+    match = PRICE_RE.search(text)
+    if match:
+        attributes["price"] = int(_parse_number(match.group(1)))
+
+    match = AREA_RE.search(text)
+    if match:
+        attributes["area"] = _parse_number(match.group(1))
+
+    match = ROOMS_RE.search(text)
+    if match:
+        attributes["rooms"] = int(match.group(1))
+    elif "kawalerka" in text.lower():
+        attributes["rooms"] = 1
+
+    return attributes
+
+
+def parse_district(location: str) -> Optional[str]:
+    """Get the district from a location like 'Gdańsk, Wrzeszcz - Odświeżono dnia 12 października'."""
+    parts = location.split(" - ")[0].split(",")
+    district = parts[-1].strip() if len(parts) > 1 else None
+    return district or None
+
+
+class Deadline:
+    """A point in time after which scraping should stop. Checked cooperatively between requests."""
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        expires = [time.monotonic() + seconds] if seconds else []
+        if parent is not None and parent.expires_at is not None:
+            expires.append(parent.expires_at)
+        self.expires_at = min(expires) if expires else None
 
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None if there is no limit."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
 
-def get_olx_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    links = set()
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
 
-    current_url = url
-    pages_fetched = 0
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
-        page = BeautifulSoup(response.text, features="html.parser")
-        offers = page.find_all("div", {"data-cy": "ad-card-title"})
+@dataclass(frozen=True)
+class Checkpoint:
+    """Position in a query's result pages to resume scraping from."""
+    url: str
+    page: int  # 1-based number of the page at url
 
-        for offer in offers:
-            link = offer.find("a")["href"]
-            title = offer.text.strip()
-            links.add(Offer(title=title, url=normalize_url(link, default_host="www.olx.pl")))
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
+class ScrapeInterrupted(Exception):
+    """
+    Pagination stopped before the last page. Carries the offers from the pages fetched until then
+    and the checkpoint of the first page that wasn't fetched.
+    """
 
-        # check next page
-        next_link = page.find("a", {"data-cy": "pagination-forward"})
-        if not next_link:
-            break
+    def __init__(self, message: str, offers: OfferBatch, pages_fetched: int, resume_at: Checkpoint):
+        super().__init__(message)
+        self.offers = offers
+        self.pages_fetched = pages_fetched
+        self.resume_at = resume_at
+
+
+class ScrapeTimeout(ScrapeInterrupted):
+    """The time budget ran out."""
+
+
+def fetch(url: str, deadline: Optional[Deadline] = None, stream: bool = False) -> requests.Response:
+    """GET a page with connect/read timeouts, never waiting past the deadline."""
+    read_timeout = SCRAPE_READ_TIMEOUT
+    if deadline is not None:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            read_timeout = min(read_timeout, remaining)
+    if read_timeout <= 0:
+        raise requests.Timeout("Deadline exceeded before request")
+    response = requests.get(url, headers={'User-Agent': USER_AGENT},
+                            timeout=(min(SCRAPE_CONNECT_TIMEOUT, read_timeout), read_timeout), stream=stream)
+    if _page_archive is not None and response.status_code >= 400:
+        # Error pages are recorded too, to see what a portal served when scrapes failed
+        _record_page(url, response, response.content)
+    response.raise_for_status()
+    return response
+
+
+# Parses one results page into its offers and the URL of the next page, if any
+PageParser = Callable[[BeautifulSoup, str], Tuple[OfferBatch, Optional[str]]]
+
+
+@dataclass(frozen=True)
+class PageEnd:
+    """
+    Recognizes the end of the part of a results page a PageParser reads: the pagination
+    after the listings. Pagination shown above the listings as well doesn't count.
+    """
+    is_listing: Callable[[etree._Element], bool]
+    is_pagination: Callable[[etree._Element], bool]
+
+
+def _has_class(element: etree._Element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+def _element_text(element: etree._Element) -> str:
+    return "".join(element.itertext()).strip()
 
-        current_url = normalize_url(next_link["href"], default_host="www.olx.pl")  
 
-    return list(links)
+# Parsing is CPU-bound; when a pool is started, pages are parsed in worker processes
+# so concurrent scrapes use all cores instead of sharing one GIL
+_parse_pool: Optional[ProcessPoolExecutor] = None
 
-def get_nieruchomosci_online_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    links = set()
 
-    current_url = url
+def _warm_up() -> None:
+    pass
+
+
+def start_parse_pool(processes: int) -> None:
+    """Parse pages in a pool of worker processes from now on."""
+    global _parse_pool
+    shutdown_parse_pool()
+    _parse_pool = ProcessPoolExecutor(max_workers=processes)
+    # Start all workers up front, so the first pages don't wait for process startup
+    for future in [_parse_pool.submit(_warm_up) for _ in range(processes)]:
+        future.result()
+
+
+def shutdown_parse_pool() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown()
+        _parse_pool = None
+
+
+def parse_html(parse_page: PageParser, html: str, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    """Parse a results page. Runs in a worker process if the parse pool is started."""
+    return parse_page(BeautifulSoup(html, features="html.parser"), url)
+
+
+# In record mode, every results page fetched is also written to this archive
+_page_archive: Optional[PageArchive] = None
+
+
+def start_recording(archive: PageArchive) -> None:
+    """Record fetched results pages in the archive from now on."""
+    global _page_archive
+    _page_archive = archive
+
+
+def stop_recording() -> None:
+    global _page_archive
+    _page_archive = None
+
+
+def _record_page(url: str, response: requests.Response, body: bytes, truncated: bool = False) -> None:
+    if _page_archive is None:
+        return
+    try:
+        _page_archive.record(url, response.status_code, response.headers, body, response.encoding, truncated)
+    except OSError as e:
+        # A full disk shouldn't stop the scrape
+        print(f"  Failed to record {url}: {e}")
+
+
+def fetch_page(url: str, deadline: Optional[Deadline] = None, page_end: Optional[PageEnd] = None) -> str:
+    """
+    Fetch a results page. With page_end, the body is streamed through an incremental parser
+    and the download stops once the closing element has been received; trailing scripts and
+    footers are never read. Without it, or if the element never appears, the whole page is read.
+    """
+    if page_end is None or not SCRAPE_STREAMING:
+        response = fetch(url, deadline)
+        if _page_archive is not None:
+            _record_page(url, response, response.content)
+        return response.text
+
+    with fetch(url, deadline, stream=True) as response:
+        encoding = response.encoding or "utf-8"
+        parser = etree.HTMLPullParser(events=("end",), encoding=encoding)
+        chunks = []
+        seen_listing = False
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            parser.feed(chunk)
+            for _, element in parser.read_events():
+                seen_listing = seen_listing or page_end.is_listing(element)
+                if seen_listing and page_end.is_pagination(element):
+                    body = b"".join(chunks)
+                    _record_page(url, response, body, truncated=True)
+                    return body.decode(encoding, errors="replace")
+    body = b"".join(chunks)
+    _record_page(url, response, body)
+    return body.decode(encoding, errors="replace")
+
+
+# Called with the page number and offers after each results page a thread fetches, e.g. to report progress
+PageListener = Callable[[int, OfferBatch], None]
+_page_listeners = threading.local()
+
+
+@contextmanager
+def listen_to_pages(listener: PageListener) -> Iterator[None]:
+    """Call listener after every results page fetched by this thread within the block."""
+    outer = getattr(_page_listeners, "listener", None)
+    _page_listeners.listener = listener
+    try:
+        yield
+    finally:
+        _page_listeners.listener = outer
+
+
+def paginate(url: str, parse_page: PageParser, max_pages: Optional[int] = None,
+             deadline: Optional[Deadline] = None, resume: Optional[Checkpoint] = None,
+             page_end: Optional[PageEnd] = None) -> OfferBatch:
+    """
+    Follow a query's result pages, collecting the offers of each, starting at the resume checkpoint if given.
+    Raises ScrapeInterrupted if a page fails, or ScrapeTimeout if the deadline passes,
+    so the offers of the pages fetched before aren't lost.
+    """
+    offers = OfferBatch()
+    current_url: Optional[str] = resume.url if resume else url
+    page_number = resume.page if resume else 1
     pages_fetched = 0
-    
-    reached_end = False
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
-        page = BeautifulSoup(response.text, features="html.parser")
-
-        cards = page.find_all("div", {"class": "tile"})
-        for card in cards:
-            if "tile-infon" in card["class"]:
-                continue
-
-            if card.get("data-pie") not in ["normal", "", "prime"]: 
-                reached_end = True
-                break
-
-            link_element = card.find("a")
-            if not link_element:
-                continue
-
-            link = link_element["href"]
-            title = card.find("h2").text.strip()
-            links.add(Offer(title=title, url=normalize_url(link)))
+
+    while current_url:
+        checkpoint = Checkpoint(url=current_url, page=page_number)
+        if deadline is not None and deadline.expired:
+            raise ScrapeTimeout(f"Time budget exceeded after {pages_fetched} pages", offers, pages_fetched, checkpoint)
+        try:
+            html = fetch_page(current_url, deadline, page_end)
+            if _parse_pool is not None:
+                # Only the HTML and the resulting offers cross the process boundary
+                page_offers, current_url = _parse_pool.submit(parse_html, parse_page, html, url).result()
+            else:
+                page_offers, current_url = parse_html(parse_page, html, url)
+        except requests.Timeout as e:
+            # A request cut short by the deadline, rather than a portal that stopped responding
+            if deadline is not None and deadline.expired:
+                raise ScrapeTimeout(f"Time budget exceeded after {pages_fetched} pages", offers, pages_fetched, checkpoint) from e
+            raise ScrapeInterrupted(f"Page {page_number} failed: {e}", offers, pages_fetched, checkpoint) from e
+        except Exception as e:
+            raise ScrapeInterrupted(f"Page {page_number} failed: {e}", offers, pages_fetched, checkpoint) from e
+        offers.extend(page_offers)
+        listener = getattr(_page_listeners, "listener", None)
+        if listener is not None:
+            listener(page_number, page_offers)
 
         pages_fetched += 1
+        page_number += 1
         if max_pages and pages_fetched >= max_pages:
             break
 
-        if reached_end:
-            break
+    return offers
 
-        next_wrapper = page.find("li", {"class": "next-wrapper"})
-        if not next_wrapper:
-            break
 
-        current_url = normalize_url(next_wrapper.find("a")["href"])
+OLX_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "div" and element.get("data-cy") == "ad-card-title",
+    is_pagination=lambda element: element.tag == "a" and element.get("data-cy") == "pagination-forward",
+)
 
-    return list(links)
 
-def get_otodom_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    offers = set()
+def parse_olx_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    links = OfferBatch()
+    for offer in page.find_all("div", {"data-cy": "ad-card-title"}):
+        link = offer.find("a")["href"]
+        title = offer.text.strip()
+        card = offer.find_parent("div", {"data-cy": "l-card"}) or offer
+        location = card.find("p", {"data-testid": "location-date"})
+        district = parse_district(location.text) if location else None
+        links.add(title=title, url=canonicalize_url(link, default_host="www.olx.pl"),
+                  district=district, **extract_attributes(card.get_text(" ")))
 
-    current_url = url
-    pages_fetched = 0
+    # check next page
+    next_link = page.find("a", {"data-cy": "pagination-forward"})
+    if not next_link:
+        return links, None
+    return links, normalize_url(next_link["href"], default_host="www.olx.pl")
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
-        page = BeautifulSoup(response.text, features="html.parser")
 
-        listings = page.find_all("a", {"data-cy": "listing-item-link"})
+NIERUCHOMOSCI_ONLINE_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "div" and _has_class(element, "tile"),
+    is_pagination=lambda element: element.tag == "li" and _has_class(element, "next-wrapper"),
+)
 
-        for listing in listings:
-            title = listing.find("h3").get_text()
-            url = normalize_url(urljoin("https://www.otodom.pl", listing["href"]))
-            offer = Offer(title=title, url=url)
-            offers.add(offer)
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
+def parse_nieruchomosci_online_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    links = OfferBatch()
+    for card in page.find_all("div", {"class": "tile"}):
+        if "tile-infon" in card["class"]:
+            continue
 
-        data = json.loads(page.find("script", id="__NEXT_DATA__").text)
+        if card.get("data-pie") not in ["normal", "", "prime"]:
+            # Results from outside the search follow
+            return links, None
 
-        try:
-            pagination = data["props"]["pageProps"]["data"]["searchAds"]["pagination"]
-            page = pagination["page"]
-            total_pages = pagination["totalPages"]
-
-            if page < total_pages:
-                split = urlsplit(current_url)
-                query = parse_qs(split.query)
-                query["page"] = [str(page + 1)]
-                new_query = urlencode(query, doseq=True)
-                current_url = urlunsplit((split.scheme, split.netloc, split.path, new_query, None))
-            else:
-                break
-        except TypeError:
-            break
+        link_element = card.find("a")
+        if not link_element:
+            continue
 
-    return list(offers)
+        link = link_element["href"]
+        title = card.find("h2").text.strip()
+        links.add(title=title, url=canonicalize_url(link), **extract_attributes(card.get_text(" ")))
 
+    next_wrapper = page.find("li", {"class": "next-wrapper"})
+    if not next_wrapper:
+        return links, None
+    return links, normalize_url(next_wrapper.find("a")["href"])
 
-def get_trojmiasto_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    offers = set()
-    current_url = url
-    pages_fetched = 0
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
+OTODOM_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "a" and element.get("data-cy") == "listing-item-link",
+    is_pagination=lambda element: element.tag == "script" and element.get("id") == "__NEXT_DATA__",
+)
 
-        page = BeautifulSoup(response.text, features="html.parser")
-        listings = page.find_all("a", class_="list__item__content__title__name")
 
-        for listing in listings:
-            title = listing["title"]
-            offer_url = normalize_url(listing["href"])
-            offer = Offer(title=title, url=offer_url)
-            offers.add(offer)
+def parse_otodom_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    offers = OfferBatch()
+    for listing in page.find_all("a", {"data-cy": "listing-item-link"}):
+        title = listing.find("h3").get_text()
+        offer_url = canonicalize_url(urljoin("https://www.otodom.pl", listing["href"]))
+        card = listing.find_parent("article") or listing
+        offers.add(title=title, url=offer_url, **extract_attributes(card.get_text(" ")))
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
+    next_data = page.find("script", id="__NEXT_DATA__")
+    if not next_data:
+        return offers, None
+    data = json.loads(next_data.text)
 
-        next_page_button = page.find("a", title="następna")
-        if not next_page_button:
-            break
+    try:
+        pagination = data["props"]["pageProps"]["data"]["searchAds"]["pagination"]
+        page_number = pagination["page"]
+        total_pages = pagination["totalPages"]
+    except TypeError:
+        return offers, None
 
-        current_url = urljoin(url, next_page_button["href"])
+    if page_number >= total_pages:
+        return offers, None
+    split = urlsplit(url)
+    query = parse_qs(split.query)
+    query["page"] = [str(page_number + 1)]
+    new_query = urlencode(query, doseq=True)
+    return offers, urlunsplit((split.scheme, split.netloc, split.path, new_query, None))
 
-    return list(offers)
 
+TROJMIASTO_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "a" and _has_class(element, "list__item__content__title__name"),
+    is_pagination=lambda element: element.tag == "a" and element.get("title") == "następna",
+)
 
-def get_gratka_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    offers = set()
-    current_url = url
-    pages_fetched = 0
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
+def parse_trojmiasto_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    offers = OfferBatch()
+    for listing in page.find_all("a", class_="list__item__content__title__name"):
+        title = listing["title"]
+        offer_url = canonicalize_url(listing["href"])
+        card = listing.find_parent(class_="list__item") or listing
+        offers.add(title=title, url=offer_url, **extract_attributes(card.get_text(" ")))
 
-        page = BeautifulSoup(response.text, features="html.parser")
-        listings = page.find_all("div", class_="card__outer")
+    next_page_button = page.find("a", title="następna")
+    if not next_page_button:
+        return offers, None
+    return offers, urljoin(url, next_page_button["href"])
 
-        for listing in listings:
-            title = listing.find("div", {"data-cy": "propertyCardTitle"}).text
-            offer_url = normalize_url(listing.find("a")["href"], default_host="gratka.pl")
-            offer = Offer(title=title, url=offer_url)
-            offers.add(offer)
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
+GRATKA_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "div" and _has_class(element, "card__outer"),
+    is_pagination=lambda element: (element.tag == "a" and element.get("aria-current") == "page"
+                                   and _element_text(element) == "Następna strona"),
+)
 
-        candidate_links = page.find_all("a", {"aria-current": "page"})
-        for link in candidate_links:
-            if link.text.strip() == "Następna strona":
-                next_page_button = link
-                break
-        else:
-            break
 
-        current_url = normalize_url(next_page_button["href"], default_host="gratka.pl")
+def parse_gratka_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    offers = OfferBatch()
+    for listing in page.find_all("div", class_="card__outer"):
+        title = listing.find("div", {"data-cy": "propertyCardTitle"}).text
+        offer_url = canonicalize_url(listing.find("a")["href"], default_host="gratka.pl")
+        offers.add(title=title, url=offer_url, **extract_attributes(listing.get_text(" ")))
 
-    return list(offers)
+    for link in page.find_all("a", {"aria-current": "page"}):
+        if link.text.strip() == "Następna strona":
+            return offers, normalize_url(link["href"], default_host="gratka.pl")
+    return offers, None
 
 
-def get_morizon_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    offers = set()
-    current_url = url
-    pages_fetched = 0
+MORIZON_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "div" and _has_class(element, "row-property"),
+    is_pagination=lambda element: element.tag == "a" and element.get("title") == "następna strona",
+)
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
 
-        page = BeautifulSoup(response.text, features="html.parser")
-        listings = page.find_all("div", class_="row-property")
+def parse_morizon_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    offers = OfferBatch()
+    for listing in page.find_all("div", class_="row-property"):
+        if "finances" in listing["class"]:
+            # skip ad
+            continue
 
-        for listing in listings:
-            if "finances" in listing["class"]:
-                # skip ad
-                continue
+        title = listing.find("h2").text.strip()
+        offer_url = canonicalize_url(listing.find("a", class_="property-url")["href"], default_host="www.morizon.pl")
+        offers.add(title=title, url=offer_url, **extract_attributes(listing.get_text(" ")))
 
-            title = listing.find("h2").text.strip()
-            offer_url = listing.find("a", class_="property-url")["href"]
-            offer = Offer(title=title, url=offer_url)
-            offers.add(offer)
+    next_page_button = page.find("a", title="następna strona")
+    if not next_page_button or not next_page_button.has_attr("href"):
+        return offers, None
+    return offers, urljoin(url, next_page_button["href"])
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
 
-        next_page_button = page.find("a", title="następna strona")
-        if not next_page_button or not next_page_button.has_attr("href"):
-            break
+RENTOLA_PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "div" and element.get("data-testid") == "propertyTile",
+    is_pagination=lambda element: element.tag == "div" and element.get("role") == "navigation",
+)
 
-        current_url = urljoin(url, next_page_button["href"])
 
-    return list(offers)
+def parse_rentola_page(page: BeautifulSoup, url: str) -> Tuple[OfferBatch, Optional[str]]:
+    offers = OfferBatch()
+    for listing in page.find_all("div", {"data-testid": "propertyTile"}):
+        title = listing.find("p").text
+        offer_url = listing.find("a")["href"]
+        offers.add(title=title, url=canonicalize_url(offer_url, default_host="rentola.pl"),
+                   **extract_attributes(listing.get_text(" ")))
 
-def get_rentola_offers(url: str, max_pages: Optional[int] = None) -> List[Offer]:
-    offers = set()
-    current_url = url
-    pages_fetched = 0
+    pagination = page.find("div", {"role": "navigation"})
+    if not pagination:
+        return offers, None
 
-    while True:
-        response = requests.get(current_url, headers={'User-Agent': USER_AGENT})
-        assert response.ok
+    next_page_button = pagination.find_all("a")[-1]
+    if not next_page_button or next_page_button.get("aria-disabled") == "true":
+        return offers, None
+    return offers, normalize_url(next_page_button["href"], default_host="rentola.pl")
 
-        page = BeautifulSoup(response.text, features="html.parser")
-        listings = page.find_all("div", {"data-testid": "propertyTile"})
 
-        for listing in listings:
-            title = listing.find("p").text
-            offer_url = listing.find("a")["href"]
-            offer = Offer(title=title, url=normalize_url(offer_url, default_host="rentola.pl"))
-            offers.add(offer)
+def get_olx_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                   resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_olx_page, max_pages, deadline, resume, OLX_PAGE_END)
 
-        pages_fetched += 1
-        if max_pages and pages_fetched >= max_pages:
-            break
 
-        pagination = page.find("div", {"role": "navigation"})
-        if not pagination:
-            break
+def get_nieruchomosci_online_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                                    resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_nieruchomosci_online_page, max_pages, deadline, resume, NIERUCHOMOSCI_ONLINE_PAGE_END)
+
+
+def get_otodom_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                      resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_otodom_page, max_pages, deadline, resume, OTODOM_PAGE_END)
 
-        next_page_button = pagination.find_all("a")[-1]
-        if not next_page_button or next_page_button.get("aria-disabled") == "true":
-            break
 
-        current_url = normalize_url(next_page_button["href"], default_host="rentola.pl")
+def get_trojmiasto_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                          resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_trojmiasto_page, max_pages, deadline, resume, TROJMIASTO_PAGE_END)
 
-    return list(offers)
+
+def get_gratka_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                      resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_gratka_page, max_pages, deadline, resume, GRATKA_PAGE_END)
+
+
+def get_morizon_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                       resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_morizon_page, max_pages, deadline, resume, MORIZON_PAGE_END)
+
+
+def get_rentola_offers(url: str, max_pages: Optional[int] = None, deadline: Optional[Deadline] = None,
+                       resume: Optional[Checkpoint] = None) -> OfferBatch:
+    return paginate(url, parse_rentola_page, max_pages, deadline, resume, RENTOLA_PAGE_END)
 
 
 def normalize_url(url: str, default_host: str | None = None) -> str:
@@ -275,7 +590,38 @@ def normalize_url(url: str, default_host: str | None = None) -> str:
     return urlunsplit((split.scheme, split.netloc, split.path, split.query, None))
 
 
-HANDLERS: Dict[str, Callable[[str, Optional[int]], List[Offer]]] = {
+# Query parameters that only carry tracking or search context, never listing identity
+TRACKING_PARAMS = {
+    "reason", "search_reason", "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "fbclid", "gclid", "ref", "referrer", "source", "sl", "promoted", "highlighted",
+}
+
+
+def strip_tracking_params(split: SplitResult) -> SplitResult:
+    query = [(key, value) for key, value in parse_qsl(split.query, keep_blank_values=True) if key.lower() not in TRACKING_PARAMS]
+    return split._replace(query=urlencode(query))
+
+
+def canonicalize_olx_url(split: SplitResult) -> SplitResult:
+    # Listing pages are identified by their path (ending in -ID<listing id>.html), the query
+    # only carries search context and promotion variants. m.olx.pl serves the same listings.
+    return split._replace(scheme="https", netloc="www.olx.pl", query="")
+
+
+def canonicalize_by_path(split: SplitResult) -> SplitResult:
+    # Listing pages are identified by their path alone
+    return split._replace(scheme="https", query="")
+
+
+def canonicalize_url(url: str, default_host: str | None = None) -> str:
+    """Normalize an offer URL to a canonical form, so the same listing always maps to the same URL."""
+    split = urlsplit(normalize_url(url, default_host=default_host))
+    split = split._replace(netloc=split.netloc.lower())
+    canonicalizer = CANONICALIZERS.get(split.netloc, strip_tracking_params)
+    return urlunsplit(canonicalizer(split))
+
+
+HANDLERS: Dict[str, Callable[[str, Optional[int], Optional[Deadline], Optional[Checkpoint]], OfferBatch]] = {
     "www.olx.pl": get_olx_offers,
     "m.olx.pl": get_olx_offers,
     "gdansk.nieruchomosci-online.pl": get_nieruchomosci_online_offers,
@@ -287,3 +633,28 @@ HANDLERS: Dict[str, Callable[[str, Optional[int]], List[Offer]]] = {
     # "www.otodom.pl": get_otodom_offers,
     # "www.morizon.pl": get_morizon_offers,
 }
+
+# Results page parsers by portal, for re-parsing recorded pages; includes the portals whose handlers are disabled
+PAGE_PARSERS: Dict[str, PageParser] = {
+    "www.olx.pl": parse_olx_page,
+    "m.olx.pl": parse_olx_page,
+    "gdansk.nieruchomosci-online.pl": parse_nieruchomosci_online_page,
+    "ogloszenia.trojmiasto.pl": parse_trojmiasto_page,
+    "rentola.pl": parse_rentola_page,
+    "gratka.pl": parse_gratka_page,
+    "www.otodom.pl": parse_otodom_page,
+    "www.morizon.pl": parse_morizon_page,
+}
+
+# Offer URL canonicalization rules, keyed by the host of the offer URL
+CANONICALIZERS: Dict[str, Callable[[SplitResult], SplitResult]] = {
+    "www.olx.pl": canonicalize_olx_url,
+    "m.olx.pl": canonicalize_olx_url,
+    "olx.pl": canonicalize_olx_url,
+    "gdansk.nieruchomosci-online.pl": canonicalize_by_path,
+    "ogloszenia.trojmiasto.pl": canonicalize_by_path,
+    "rentola.pl": canonicalize_by_path,
+    "gratka.pl": canonicalize_by_path,
+    "www.otodom.pl": canonicalize_by_path,
+    "www.morizon.pl": canonicalize_by_path,
+}
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Export scraped offers as CSV or NDJSON, e.g. for analytics jobs.
+Offers are streamed from the database in chunks, so exports of any size run in constant memory.
+"""
+
+import sys
+import os
+import argparse
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from sqlalchemy.orm import sessionmaker
+from database import engine
+from models import User
+from export import EXPORT_FORMATS, export_offers, parse_export_date
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export offers as CSV or NDJSON")
+    parser.add_argument("--user", help="Only offers of this user (username); all users by default")
+    parser.add_argument("--query-id", type=int, help="Only offers of this query")
+    parser.add_argument("--since", help="First day to export (YYYY-MM-DD)")
+    parser.add_argument("--until", help="Last day to export (YYYY-MM-DD)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", help="File to write to; standard output by default")
+    args = parser.parse_args()
+
+    try:
+        since, until = parse_export_date(args.since), parse_export_date(args.until)
+    except ValueError as e:
+        parser.error(str(e))
+
+    user_id = None
+    if args.user:
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.username == args.user).first()
+        finally:
+            db.close()
+        if not user:
+            print(f"User {args.user} not found", file=sys.stderr)
+            sys.exit(1)
+        user_id = user.id
+
+    chunks = export_offers(engine, args.format, user_id=user_id, query_id=args.query_id, since=since, until=until)
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
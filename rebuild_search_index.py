@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Rebuild the full-text search index over offers, e.g. after restoring a backup.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from database import engine
+from search import rebuild_search_index, search_supported
+
+if __name__ == "__main__":
+    if not search_supported(engine):
+        print("Full-text search is only available with SQLite")
+        sys.exit(1)
+
+    rebuild_search_index(engine)
+    print("Search index rebuilt")
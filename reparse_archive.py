@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Re-run the current parsers over pages recorded with SCRAPE_RECORD=1, without touching the network.
+Used to check a parser change against real pages, or to extract fields that weren't parsed before.
+"""
+
+import sys
+import os
+import json
+import argparse
+from collections import Counter
+from dataclasses import asdict
+from datetime import date
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from archive import SCRAPE_ARCHIVE_DIR, iter_archived_pages
+from reparse import reparse_archive
+
+PROCESSES = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+# Pages without offers listed in the summary
+MAX_REPORTED_PAGES = 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse recorded results pages")
+    parser.add_argument("--archive-dir", default=SCRAPE_ARCHIVE_DIR)
+    parser.add_argument("--host", help="Only pages of this portal, e.g. www.olx.pl")
+    parser.add_argument("--since", type=date.fromisoformat, help="First day to re-parse (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="Last day to re-parse (YYYY-MM-DD)")
+    parser.add_argument("--processes", type=int, default=PROCESSES, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--output", help="Write the parsed offers to this file as NDJSON")
+    args = parser.parse_args()
+
+    pages = iter_archived_pages(args.archive_dir, args.since, args.until, args.host)
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    pages_per_host, offers_per_host = Counter(), Counter()
+    empty, failed = [], []
+    error_pages = 0
+    try:
+        for result in reparse_archive(pages, args.archive_dir, args.processes):
+            page = result.page
+            if page.status >= 400:
+                error_pages += 1
+                continue
+            pages_per_host[page.host] += 1
+            offers_per_host[page.host] += len(result.offers)
+            if result.error:
+                failed.append((page.url, result.error))
+            elif not result.offers:
+                empty.append(page.url)
+            if output:
+                for offer in result.offers:
+                    record = {"page_url": page.url, "fetched_at": page.fetched_at, **asdict(offer)}
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        if output:
+            output.close()
+
+    for host in sorted(pages_per_host):
+        print(f"{host}: {pages_per_host[host]} pages, {offers_per_host[host]} offers")
+    if error_pages:
+        print(f"{error_pages} error pages (HTTP 4xx/5xx) skipped")
+    # Pages that used to have listings but parse to nothing usually mean a broken parser
+    if empty:
+        print(f"{len(empty)} pages without offers:")
+        for url in empty[:MAX_REPORTED_PAGES]:
+            print(f"  {url}")
+    if failed:
+        print(f"{len(failed)} pages failed:")
+        for url, error in failed[:MAX_REPORTED_PAGES]:
+            print(f"  {url}: {error}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
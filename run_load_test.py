@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Load test for the web app. Virtual users log in as users created by seed_data.py and keep loading
+the queries and notifications pages; latency percentiles and throughput are reported per endpoint.
+Run the app under test with LOGIN_MAX_ATTEMPTS_PER_IP raised above the number of virtual users.
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from seeding import SEED_USERNAME_PREFIX, seed_username
+
+PAGES = ["/queries", "/notifications"]
+PERCENTILES = [50, 90, 95, 99]
+
+
+class Results:
+    """Latency and status of every request, by endpoint. Shared by the virtual users."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, status: str, latency: float) -> None:
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][status] += 1
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(len(sorted_values) * p / 100 + 0.5), 1)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def timed_request(session: requests.Session, results: Results, endpoint: str, method: str, url: str,
+                  ok_statuses: Tuple[int, ...], **kwargs) -> Optional[requests.Response]:
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, allow_redirects=False, timeout=30, **kwargs)
+    except requests.RequestException as e:
+        results.add(endpoint, type(e).__name__, time.perf_counter() - started)
+        return None
+    results.add(endpoint, str(response.status_code) if response.status_code in ok_statuses
+                else f"error {response.status_code}", time.perf_counter() - started)
+    return response
+
+
+def run_virtual_user(base_url: str, username: str, password: str, deadline: float, max_requests: int,
+                     revalidate: bool, results: Results) -> None:
+    session = requests.Session()
+    # A successful login redirects; a failed one shows the login form again
+    response = timed_request(session, results, "POST /login", "POST", f"{base_url}/login", (303,),
+                             data={"username": username, "password": password})
+    if response is None or response.status_code != 303:
+        return
+
+    etags: Dict[str, str] = {}
+    sent = 0
+    while time.monotonic() < deadline and (not max_requests or sent < max_requests):
+        page = PAGES[sent % len(PAGES)]
+        # Like a browser with the page in its cache, revalidate instead of downloading it again
+        headers = {"If-None-Match": etags[page]} if revalidate and page in etags else {}
+        response = timed_request(session, results, f"GET {page}", "GET", f"{base_url}{page}", (200, 304), headers=headers)
+        if response is not None and response.headers.get("ETag"):
+            etags[page] = response.headers["ETag"]
+        sent += 1
+
+
+def summarize(results: Results, elapsed: float) -> Dict[str, dict]:
+    summary = {}
+    for endpoint in sorted(results.latencies):
+        latencies = sorted(results.latencies[endpoint])
+        statuses = results.statuses[endpoint]
+        summary[endpoint] = {
+            "requests": len(latencies),
+            "errors": sum(count for status, count in statuses.items() if not status.isdigit()),
+            "statuses": dict(statuses),
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            **{f"p{p}_ms": percentile(latencies, p) * 1000 for p in PERCENTILES},
+            "max_ms": latencies[-1] * 1000,
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, dict], elapsed: float, virtual_users: int) -> None:
+    total = sum(row["requests"] for row in summary.values())
+    errors = sum(row["errors"] for row in summary.values())
+    print(f"{virtual_users} virtual users, {elapsed:.1f}s: {total} requests ({total / elapsed:.1f}/s), {errors} errors")
+    print(f"{'endpoint':<22} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          + " ".join(f"{f'p{p}':>8}" for p in PERCENTILES) + f" {'max':>8}   (ms)")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<22} {row['requests']:>8} {row['errors']:>6} {row['throughput']:>8.1f} "
+              + " ".join(f"{row[f'p{p}_ms']:>8.1f}" for p in PERCENTILES) + f" {row['max_ms']:>8.1f}")
+    for endpoint, row in summary.items():
+        print(f"  {endpoint}: " + ", ".join(f"{status} x{count}" for status, count in sorted(row["statuses"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the web app with seeded users")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Web app to test")
+    parser.add_argument("--virtual-users", type=int, default=20, help="Concurrent virtual users, each logged in as a different user")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument("--requests", type=int, default=0, help="Page requests per virtual user (default: until --duration is up)")
+    parser.add_argument("--users", type=int, default=1000, help="Number of seeded users to pick from")
+    parser.add_argument("--prefix", default=SEED_USERNAME_PREFIX, help="Username prefix of the seeded users")
+    parser.add_argument("--password", default="loadtest", help="Password of the seeded users")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for picking users, for repeatable runs")
+    parser.add_argument("--revalidate", action="store_true", help="Send If-None-Match with the last ETag, like a browser cache")
+    parser.add_argument("--output", help="Also write the results as JSON, to compare runs")
+    args = parser.parse_args()
+
+    if args.virtual_users > args.users:
+        print("Error: more virtual users than seeded users")
+        sys.exit(1)
+
+    usernames = [seed_username(number, args.prefix)
+                 for number in random.Random(args.seed).sample(range(1, args.users + 1), args.virtual_users)]
+    base_url = args.base_url.rstrip("/")
+    results = Results()
+
+    print(f"Load testing {base_url} with {args.virtual_users} virtual users")
+    started = time.monotonic()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.virtual_users) as executor:
+        for future in [executor.submit(run_virtual_user, base_url, username, args.password, deadline,
+                                       args.requests, args.revalidate, results) for username in usernames]:
+            future.result()
+    elapsed = time.monotonic() - started
+
+    if not results.latencies:
+        print("No requests were made")
+        sys.exit(1)
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed, args.virtual_users)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"base_url": base_url, "virtual_users": args.virtual_users, "elapsed": elapsed,
+                       "revalidate": args.revalidate, "endpoints": summary}, f, indent=2)
+
+    # Failed logins or requests fail the run, e.g. in CI
+    if any(row["errors"] for row in summary.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
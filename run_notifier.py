@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Notification delivery worker that drains the notification outbox.
+Failed deliveries are retried with exponential backoff.
+"""
+
+import sys
+import os
+import time
+import argparse
+from datetime import datetime
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from sqlalchemy.orm import sessionmaker
+from database import engine
+from notifier import deliver_pending, OUTBOX_BATCH_SIZE
+
+POLL_INTERVAL = float(os.getenv("NOTIFIER_POLL_INTERVAL", "10"))  # seconds
+
+
+def drain(db) -> int:
+    """Deliver batches until no due entries are left. Returns the number of entries processed."""
+    total = 0
+    while True:
+        processed = deliver_pending(db, OUTBOX_BATCH_SIZE)
+        total += processed
+        if processed < OUTBOX_BATCH_SIZE:
+            return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued notifications")
+    parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit")
+    args = parser.parse_args()
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    print(f"Starting notification worker at {datetime.now()}")
+    while True:
+        db = SessionLocal()
+        try:
+            processed = drain(db)
+            if processed:
+                print(f"Processed {processed} outbox entries at {datetime.now()}")
+        except Exception as e:
+            print(f"Error delivering notifications: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+        if args.once:
+            break
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Worker for on-demand "scrape now" requests from the web UI.
+Runs next to run_scraper.py as a priority lane: requested queries are scraped within seconds
+instead of waiting for the next cycle, and progress is recorded page by page for the browser.
+"""
+
+import sys
+import os
+import time
+import argparse
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from database import SessionLocal
+from models import ScrapeRequest
+from scraper import get_supported_sites
+from sources import OfferBatch, listen_to_pages
+from filters import select_new_offers
+from health import allow_request
+from scrape_requests import (
+    SCRAPE_WORKER_POLL_INTERVAL, add_event, claim_next_request, claim_owner, claim_query, finish_request, release_query,
+)
+from run_scraper import process_query, scrape_with_budget
+
+
+def wait_for_claim(db, scrape_request: ScrapeRequest, owner: str) -> None:
+    """Claim the query, waiting while the scraper run is scraping it, so both don't insert the same offers."""
+    waiting = False
+    while not claim_query(db, scrape_request.query_id, owner):
+        if not waiting:
+            print(f"Query {scrape_request.query_id} is being scraped by the scraper run, waiting")
+            add_event(db, scrape_request, "waiting")
+            waiting = True
+        time.sleep(SCRAPE_WORKER_POLL_INTERVAL)
+
+
+def run_request(db, scrape_request: ScrapeRequest, owner: str) -> None:
+    """Scrape the requested query once it's claimed, and release it afterwards."""
+    query = scrape_request.query
+    if query is None:
+        finish_request(db, scrape_request, error="Query not found")
+        return
+    wait_for_claim(db, scrape_request, owner)
+    try:
+        scrape_claimed_query(db, scrape_request, query)
+    finally:
+        db.rollback()
+        release_query(db, owner, query.id)
+
+
+def scrape_claimed_query(db, scrape_request: ScrapeRequest, query) -> None:
+    """Scrape the query, recording an event for every page and the new offers on it."""
+    print(f"Scraping query {query.name} (ID: {query.id}) on request {scrape_request.id}")
+    add_event(db, scrape_request, "started", query=query.name)
+
+    host = urlsplit(query.url).netloc
+    if host in get_supported_sites() and not allow_request(db, host):
+        finish_request(db, scrape_request, error=f"{host} is unavailable, try again later")
+        return
+
+    def report_page(page_number: int, offers: OfferBatch) -> None:
+        new_offers = select_new_offers(db, offers, query.filters)
+        add_event(db, scrape_request, "page", page=page_number, offers=len(offers), new_offers=[
+            {"title": offer.title, "url": offer.url, "price": offer.price, "district": offer.district}
+            for offer in new_offers
+        ])
+
+    # Always from the first page: the user wants the newest listings, not the rest of an interrupted scrape
+    with listen_to_pages(report_page):
+        outcome = scrape_with_budget(query.url)
+    result = process_query(db, query, outcome=outcome)
+
+    finish_request(
+        db, scrape_request, error=result["error"], status=query.last_scrape_status,
+        total_offers=result["total_offers"], new_offers=len(result["new_offers"]),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape queries on demand")
+    parser.add_argument("--once", action="store_true", help="Handle the pending requests once and exit")
+    args = parser.parse_args()
+
+    owner = claim_owner("worker")
+    print(f"Starting scrape worker at {datetime.now()}")
+    while True:
+        db = SessionLocal()
+        try:
+            while (scrape_request := claim_next_request(db)) is not None:
+                try:
+                    run_request(db, scrape_request, owner)
+                except Exception as e:
+                    print(f"Error handling scrape request {scrape_request.id}: {e}")
+                    db.rollback()
+                    finish_request(db, scrape_request, error=str(e))
+        except Exception as e:
+            print(f"Error handling scrape requests: {e}")
+            db.rollback()
+        finally:
+            db.close()
+
+        if args.once:
+            break
+        time.sleep(SCRAPE_WORKER_POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
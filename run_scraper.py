@@ -1,67 +1,198 @@
 #!/usr/bin/env python3
 """
-Main scraping script that processes all active queries and sends notifications.
+Main scraping script that processes all active queries and queues notifications.
+Notifications are delivered separately by run_notifier.py.
 """
 
 import sys
 import os
-from datetime import datetime
-from typing import List, Dict, Any
-import requests
-import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
 
 # Add app directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
-from sqlalchemy.orm import sessionmaker
-from database import engine
-from models import User, SearchQuery, NotificationSetting, Offer
-from scraper import scrape_query
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from database import SessionLocal
+from models import SearchQuery, Offer, ScrapeRun
+from scraper import scrape_query, get_supported_sites
+from sources import (
+    Checkpoint, Deadline, OfferBatch, ScrapeInterrupted, ScrapeTimeout, start_parse_pool, shutdown_parse_pool,
+    start_recording, stop_recording,
+)
+from notifier import enqueue_notifications
+from dedup import group_cross_posts, backfill_signatures
+from filters import select_new_offers
+from enrichment import ENRICH_DETAILS, enrich_offers, pending_offers
+from health import CLOSED, HALF_OPEN, allow_request, get_source_health, record_success, record_failure
+from archive import SCRAPE_RECORD, SCRAPE_ARCHIVE_DIR, PageArchive
+from profiling import PROFILE_MODES, SCRAPE_PROFILE, SCRAPE_PROFILE_DIR, SCRAPE_PROFILE_SLOWEST, make_profiler
+from scrape_requests import claim_owner, claim_query, release_query
 
+# Time budgets, so one slow portal can't stall the whole cycle
+SCRAPE_QUERY_BUDGET = float(os.getenv("SCRAPE_QUERY_BUDGET", "300"))  # seconds per query
+SCRAPE_CYCLE_BUDGET = float(os.getenv("SCRAPE_CYCLE_BUDGET", "1800"))  # seconds per run, 0 for no limit
 
-def send_discord_notification(webhook_url: str, new_offers: List[Offer], query_name: str) -> bool:
-    """Send Discord notification for new offers."""
+# Queries fetched at the same time; parsing runs in a pool of processes, by default one per available CPU
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "4"))
+# Two-tier scanning: new listings show up on the first page of a sorted search, so most scans
+# only poll the head; a deep scan of all pages catches bumped and re-ordered listings
+SCRAPE_HEAD_PAGES = int(os.getenv("SCRAPE_HEAD_PAGES", "1"))
+SCRAPE_HEAD_INTERVAL = float(os.getenv("SCRAPE_HEAD_INTERVAL", "0"))  # seconds, 0 to scan on every run
+SCRAPE_DEEP_INTERVAL = float(os.getenv("SCRAPE_DEEP_INTERVAL", "3600"))  # seconds, 0 for deep scans only
+
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", str(len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1)))
+
+
+@dataclass
+class ScrapeOutcome:
+    """Result of fetching a query's pages, handed from a fetcher thread to the database side."""
+    offers: OfferBatch
+    duration: float
+    interrupted: Optional[ScrapeInterrupted] = None
+    error: Optional[Exception] = None
+    deep: bool = True  # all pages, rather than only the head
+
+
+# Returned by a fetcher instead of an outcome when the scrape worker is scraping the query on request
+QUERY_BUSY = object()
+
+
+def query_checkpoint(query: SearchQuery) -> Optional[Checkpoint]:
+    """Where to continue an interrupted scrape of the query, if anywhere."""
+    if not query.checkpoint_url:
+        return None
+    return Checkpoint(url=query.checkpoint_url, page=query.checkpoint_page or 1)
+
+
+def scan_tier(query: SearchQuery, now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Which scan of the query is due: "deep" for all pages, "head" for the first SCRAPE_HEAD_PAGES,
+    or None if neither is. Interrupted deep scans are continued before anything else.
+    """
+    now = now or datetime.utcnow()
+    if (not SCRAPE_DEEP_INTERVAL or query.last_deep_scan_at is None or query.checkpoint_url
+            or query.last_deep_scan_at <= now - timedelta(seconds=SCRAPE_DEEP_INTERVAL)):
+        return "deep"
+    if (not SCRAPE_HEAD_INTERVAL or query.last_scraped_at is None
+            or query.last_scraped_at <= now - timedelta(seconds=SCRAPE_HEAD_INTERVAL)):
+        return "head"
+    return None
+
+
+def scrape_resumed(url: str, resume: Checkpoint, deadline: Optional[Deadline] = None) -> OfferBatch:
+    """
+    Continue an interrupted deep scan, polling the head first so new listings aren't held up until the
+    deep scan is done. Raises ScrapeInterrupted like scrape_query, checkpointed in the deep scan's pages.
+    """
+    head_pages = min(SCRAPE_HEAD_PAGES, resume.page - 1)
     try:
-        # Create embed for each offer (max 10 embeds per message)
-        embeds = []
-        for i, offer in enumerate(new_offers[:10]):
-            embeds.append({
-                "title": offer.title[:256],  # Discord embed title limit
-                "url": offer.url,
-                "color": 0x00ff00,  # Green color
-                "footer": {
-                    "text": f"Query: {query_name}"
-                }
-            })
-        
-        # Create the main message
-        content = f"🏠 **{len(new_offers)} new rental listing{'s' if len(new_offers) != 1 else ''} found!**"
-        if len(new_offers) > 10:
-            content += f"\n_(Showing first 10 of {len(new_offers)} offers)_"
-        
-        payload = {
-            "content": content,
-            "embeds": embeds
-        }
-        
-        response = requests.post(webhook_url,
-                               json=payload,
-                               headers={'Content-Type': 'application/json'},
-                               timeout=10)
-        
-        return response.status_code == 204
-        
+        offers = scrape_query(url, deadline=deadline, max_pages=head_pages)
+    except ScrapeInterrupted as e:
+        raise type(e)(str(e), e.offers, e.pages_fetched, resume)
+    try:
+        offers.extend(scrape_query(url, deadline=deadline, resume=resume))
+    except ScrapeInterrupted as e:
+        offers.extend(e.offers)
+        raise type(e)(str(e), offers, e.pages_fetched + head_pages, e.resume_at)
+    return offers
+
+
+def scrape_with_budget(url: str, resume: Optional[Checkpoint] = None,
+                       cycle_deadline: Optional[Deadline] = None, deep: bool = True) -> Optional[ScrapeOutcome]:
+    """
+    Fetch a query's offers within the query's time budget, all pages or only the head.
+    Doesn't touch the database, so it can run in a fetcher thread.
+    Returns None if the cycle budget ran out before the query could start.
+    """
+    if cycle_deadline is not None and cycle_deadline.expired:
+        return None
+    started = time.monotonic()
+    deadline = Deadline(SCRAPE_QUERY_BUDGET, parent=cycle_deadline)
+    max_pages = None if deep else SCRAPE_HEAD_PAGES
+    try:
+        if deep and resume and resume.page > 1:
+            offers = scrape_resumed(url, resume, deadline)
+        else:
+            offers = scrape_query(url, deadline=deadline, resume=resume if deep else None, max_pages=max_pages)
+        return ScrapeOutcome(offers=offers, duration=time.monotonic() - started, deep=deep)
+    except ScrapeInterrupted as e:
+        if e.pages_fetched or isinstance(e, ScrapeTimeout):
+            return ScrapeOutcome(offers=e.offers, duration=time.monotonic() - started, interrupted=e, deep=deep)
+        return ScrapeOutcome(offers=OfferBatch(), duration=time.monotonic() - started, error=e, deep=deep)
     except Exception as e:
-        print(f"Failed to send Discord notification: {e}")
-        return False
+        return ScrapeOutcome(offers=OfferBatch(), duration=time.monotonic() - started, error=e, deep=deep)
+
+
+def claim_and_scrape(query_id: int, owner: str, url: str, resume: Optional[Checkpoint] = None,
+                     cycle_deadline: Optional[Deadline] = None, deep: bool = True):
+    """
+    Claim the query, then scrape it; runs in a fetcher thread. Claiming just before fetching
+    keeps the scrape worker out only while the query is actually being scraped.
+    Returns QUERY_BUSY if the scrape worker holds the claim.
+    """
+    try:
+        with SessionLocal() as db:
+            if not claim_query(db, query_id, owner):
+                return QUERY_BUSY
+    except SQLAlchemyError as e:
+        return ScrapeOutcome(offers=OfferBatch(), duration=0.0, error=e, deep=deep)
+    return scrape_with_budget(url, resume, cycle_deadline, deep)
+
+
+def plan_fetches(db, queries: List[SearchQuery]) -> Tuple[List[SearchQuery], Dict[str, int], Dict[str, List[SearchQuery]]]:
+    """
+    Which queries the fetchers scrape right away. A half-open portal gets a single probe query:
+    returns the queries to fetch, the probe query id of each half-open portal, and the portal's
+    other queries, deferred until the probe's outcome has been recorded.
+    Queries of open portals are left out, for process_query to record their skip.
+    """
+    fetched, probes, deferred = [], {}, {}
+    allowed = {}
+    for query in queries:
+        host = urlsplit(query.url).netloc
+        if host not in get_supported_sites():
+            fetched.append(query)
+        elif host in probes:
+            deferred[host].append(query)
+        else:
+            if host not in allowed:
+                allowed[host] = allow_request(db, host)
+                if allowed[host] and get_source_health(db, host).state == HALF_OPEN:
+                    probes[host] = query.id
+                    deferred[host] = []
+            if allowed[host]:
+                fetched.append(query)
+    return fetched, probes, deferred
+
+
+def record_scrape_duration(query: SearchQuery, duration: float) -> None:
+    """Update the running totals used for the average scrape duration. Failed runs aren't counted."""
+    query.scrape_runs = (query.scrape_runs or 0) + 1
+    query.total_scrape_duration = (query.total_scrape_duration or 0.0) + duration
 
 
-def process_query(db_session, query: SearchQuery) -> Dict[str, Any]:
-    """Process a single search query and return results."""
+def process_query(db_session, query: SearchQuery, cycle_deadline: Optional[Deadline] = None,
+                  outcome: Optional[ScrapeOutcome] = None, deep: bool = True,
+                  scrape_run_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Process a single search query and return results.
+    The query is scraped here, all pages or only the head, unless the outcome of an earlier scrape is passed in.
+    If a page fails or the query's time budget runs out, the offers from the pages fetched so far
+    are still processed, and the next run resumes from the page that wasn't fetched.
+    Notifications queued as part of a scraper run are held until the run has finished.
+    """
     print(f"Processing query: {query.name} (ID: {query.id})")
     
-    # Check if this is the first run (never scraped before)
-    is_first_run = query.last_scraped_at is None
+    # Check if this is the first run: listings already up are only stored, not notified, until a deep scan
+    # has got through all pages, even if it takes several runs to get there
+    is_first_run = not query.initial_scan_done
     
     result = {
         "query_id": query.id,
@@ -70,48 +201,120 @@ def process_query(db_session, query: SearchQuery) -> Dict[str, Any]:
         "new_offers": [],
         "total_offers": 0,
         "error": None,
-        "is_first_run": is_first_run
+        "is_first_run": is_first_run,
+        "skipped": False,
+        "timed_out": False,
+        "interrupted": False
     }
     
+    # Portals are tracked by a circuit breaker, so a broken one isn't fetched on every cycle
+    host = urlsplit(query.url).netloc
+    tracked = host in get_supported_sites()
+    if outcome is None and tracked and not allow_request(db_session, host):
+        print(f"  Skipped: {host} is unavailable")
+        result["skipped"] = True
+        query.last_scrape_status = "source_down"
+        db_session.commit()
+        return result
+    
+    # Scrape the query, continuing an interrupted deep scan if there is one
+    deep = outcome.deep if outcome is not None else deep
+    resume = query_checkpoint(query) if deep else None
+    if resume:
+        print(f"  Resuming from page {resume.page}" + (", after a head scan" if resume.page > 1 else ""))
+    elif not deep:
+        print(f"  Head scan of the first {SCRAPE_HEAD_PAGES} pages")
+    if outcome is None:
+        outcome = scrape_with_budget(query.url, resume, cycle_deadline, deep)
+        if outcome is None:
+            print("  Skipped: cycle time budget exceeded")
+            result["skipped"] = True
+            return result
+    
     try:
-        # Scrape the query
-        offers = scrape_query(query.url)
+        if outcome.error:
+            raise outcome.error
+        
+        offers, interrupted = outcome.offers, outcome.interrupted
+        if isinstance(interrupted, ScrapeTimeout):
+            result["timed_out"] = True
+            print(f"  TIMEOUT: {interrupted}")
+        elif interrupted:
+            print(f"  INTERRUPTED: {interrupted}")
+        result["interrupted"] = interrupted is not None
         result["total_offers"] = len(offers)
         
         print(f"  Found {len(offers)} offers")
         
-        # Check for new offers (not in database yet)
+        # Check for new offers (not in database yet) that match the query's filters
+        fresh = select_new_offers(db_session, offers, query.filters)
         new_offers = []
-        for offer in offers:
-            existing = db_session.query(Offer).filter(Offer.url == offer.url).first()
-            if not existing:
-                # Create new offer record
-                new_offer = Offer(
-                    title=offer.title,
-                    url=offer.url,
-                    user_id=query.user_id,
-                    query_id=query.id
-                )
-                db_session.add(new_offer)
-                new_offers.append(new_offer)
+        if fresh:
+            # Insert straight from the batch's columns; RETURNING yields the records that
+            # cross-post detection and notifications work with
+            new_offers = list(db_session.scalars(insert(Offer).returning(Offer), [
+                {
+                    "title": title,
+                    "url": url,
+                    "price": price,
+                    "area": area,
+                    "rooms": rooms,
+                    "district": district,
+                    "user_id": query.user_id,
+                    "query_id": query.id,
+                }
+                for title, url, price, area, rooms, district in fresh.rows()
+            ]))
         
         result["new_offers"] = new_offers
         result["success"] = True
         
+        # Link listings cross-posted on other portals, so they're only notified once
+        db_session.flush()
+        original_offers = group_cross_posts(db_session, new_offers)
+        
         print(f"  {len(new_offers)} new offers")
+        if len(original_offers) < len(new_offers):
+            print(f"  ({len(new_offers) - len(original_offers)} cross-posted on other portals)")
         if is_first_run:
             print(f"  (First run - will not send notifications)")
+        elif original_offers:
+            # Queue notifications in the same transaction as the offers
+            queued = enqueue_notifications(db_session, query, original_offers, scrape_run_id)
+            print(f"  {queued} notifications queued")
         
         # Update query status
         query.last_scraped_at = datetime.utcnow()
         query.last_scrape_count = len(offers)
         
-        if len(offers) > 0:
+        if isinstance(interrupted, ScrapeTimeout):
+            query.last_scrape_status = "timeout"
+        elif interrupted:
+            query.last_scrape_status = "partial"
+        elif len(offers) > 0:
             query.last_scrape_status = "success"
         else:
             query.last_scrape_status = "no_results"
         
-        query.last_scrape_error = None
+        # Save where to continue, or clear the checkpoint once the last page was reached.
+        # Head scans leave the deep scan's checkpoint alone
+        if deep and interrupted and interrupted.resume_at.page > 1:
+            query.checkpoint_url = interrupted.resume_at.url
+            query.checkpoint_page = interrupted.resume_at.page
+        elif deep and not interrupted:
+            query.checkpoint_url = None
+            query.checkpoint_page = None
+            query.last_deep_scan_at = query.last_scraped_at
+            query.initial_scan_done = True
+        
+        query.last_scrape_error = str(interrupted) if interrupted else None
+        record_scrape_duration(query, outcome.duration)
+        if tracked:
+            if interrupted and not interrupted.pages_fetched:
+                # Not a single page within the budget
+                record_failure(db_session, host, str(interrupted))
+            else:
+                record_success(db_session, host)
         
         # Commit changes for this query immediately to ensure independence
         db_session.commit()
@@ -120,14 +323,25 @@ def process_query(db_session, query: SearchQuery) -> Dict[str, Any]:
     except Exception as e:
         error_msg = str(e)
         print(f"  ERROR: {error_msg}")
+        # A failure of our own database, e.g. a locked SQLite file, says nothing about the portal
+        source_error = not isinstance(e, SQLAlchemyError)
         
         result["error"] = error_msg
         
+        # Discard any offers added before the failure so they are not saved without their notifications
+        db_session.rollback()
+        
         # Update query status
         query.last_scraped_at = datetime.utcnow()
         query.last_scrape_count = 0
         query.last_scrape_status = "error"
         query.last_scrape_error = error_msg
+        # Start over next time, in case the checkpoint itself is what fails, e.g. a page that no longer exists
+        if deep and source_error:
+            query.checkpoint_url = None
+            query.checkpoint_page = None
+        if tracked and source_error:
+            record_failure(db_session, host, error_msg)
         
         # Commit the error state
         try:
@@ -142,76 +356,135 @@ def process_query(db_session, query: SearchQuery) -> Dict[str, Any]:
 
 def main():
     """Main scraping function."""
+    parser = argparse.ArgumentParser(description="Scrape all active queries and queue notifications")
+    parser.add_argument("--profile", choices=PROFILE_MODES, default=SCRAPE_PROFILE or None,
+                        help="Profile each query and the whole run, deterministically or by sampling")
+    parser.add_argument("--profile-dir", default=SCRAPE_PROFILE_DIR, help="Where to write the profiles")
+    parser.add_argument("--profile-slowest", type=int, default=SCRAPE_PROFILE_SLOWEST, metavar="N",
+                        help="Only keep the profiles of the N slowest queries (default: all)")
+    args = parser.parse_args()
+    
     print(f"Starting scraping run at {datetime.now()}")
+    profiler = make_profiler(args.profile or "", args.profile_dir, args.profile_slowest)
+    # cProfile can't follow other threads and processes, so a deterministically profiled run
+    # scrapes one query at a time, in this thread
+    if PARSE_PROCESSES > 1 and not profiler.serial:
+        # Started before the sampling profiler and the fetcher threads, so the workers fork from a single-threaded process
+        start_parse_pool(PARSE_PROCESSES)
+    profiler.start()
     
     # Create database session
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
+    # Queries are claimed while they're scraped, so the scrape worker doesn't scrape them at the same time
+    owner = claim_owner("scraper")
+    scrape_run = None
     
     try:
-        # Get all active queries
-        active_queries = db.query(SearchQuery).filter(SearchQuery.is_active == True).all()
+        # Notifications queued during the run are delivered once it has finished, as one digest per webhook
+        scrape_run = ScrapeRun()
+        db.add(scrape_run)
+        db.commit()
+        
+        # Get all active queries, least recently scraped first, so queries cut off
+        # by the cycle budget go first in the next run
+        active_queries = db.query(SearchQuery).filter(SearchQuery.is_active == True).order_by(
+            SearchQuery.last_scraped_at.is_not(None), SearchQuery.last_scraped_at
+        ).all()
         
         print(f"Found {len(active_queries)} active queries")
         
+        # Index offers scraped before near-duplicate detection existed
+        with profiler.section("backfill"):
+            indexed = backfill_signatures(db)
+        if indexed:
+            print(f"Indexed {indexed} offers for near-duplicate detection")
+        
         if not active_queries:
             print("No active queries to process")
             return
         
-        # Group queries by user for notification purposes
-        users_with_new_offers = {}
+        cycle_deadline = Deadline(SCRAPE_CYCLE_BUDGET)
+        if SCRAPE_RECORD:
+            start_recording(PageArchive(SCRAPE_ARCHIVE_DIR))
+            print(f"Recording fetched pages in {SCRAPE_ARCHIVE_DIR}")
         
-        # Process each query
-        for query in active_queries:
-            result = process_query(db, query)
-            
-            # If there are new offers AND it's not the first run, group them by user for notifications
-            if result["success"] and result["new_offers"] and not result["is_first_run"]:
-                user_id = query.user_id
-                if user_id not in users_with_new_offers:
-                    users_with_new_offers[user_id] = []
-                
-                users_with_new_offers[user_id].append({
-                    "query": query,
-                    "new_offers": result["new_offers"]
-                })
+        # Head or deep scan, for the queries that are due for one
+        tiers = {query.id: scan_tier(query) for query in active_queries}
+        due_queries = [query for query in active_queries if tiers[query.id]]
+        deep_count = sum(1 for tier in tiers.values() if tier == "deep")
+        print(f"{deep_count} deep scans, {len(due_queries) - deep_count} head scans, "
+              f"{len(active_queries) - len(due_queries)} queries not due")
         
-        # Note: Individual query results are already committed in process_query()
-        print("All queries processed")
-        
-        # Send notifications
-        for user_id, query_results in users_with_new_offers.items():
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user:
-                continue
-                
-            print(f"Sending notifications for user: {user.username}")
+        # Which queries the fetchers scrape; the rest are scraped by process_query, or their skip recorded there.
+        # Committed before the fetchers start, so their claims don't wait for this transaction. Run serially,
+        # process_query records each probe's outcome before the portal's next query anyway
+        fetched, probes, deferred = ([], {}, {}) if profiler.serial else plan_fetches(db, due_queries)
+        db.commit()
+        
+        # Pages are fetched and parsed in the background; database work stays on this thread
+        with ThreadPoolExecutor(max_workers=max(SCRAPE_CONCURRENCY, 1), thread_name_prefix="scrape") as fetchers:
+            scrapes = {}
+            
+            def submit(query):
+                scrapes[query.id] = fetchers.submit(profiler.run, f"query-{query.id}", claim_and_scrape,
+                                                    query.id, owner, query.url, query_checkpoint(query),
+                                                    cycle_deadline, tiers[query.id] == "deep")
             
-            # Get active notification settings for this user
-            notification_settings = db.query(NotificationSetting).filter(
-                NotificationSetting.user_id == user_id,
-                NotificationSetting.is_active == True
-            ).all()
+            for query in fetched:
+                submit(query)
             
-            # Send notification for each query with new offers
-            for query_result in query_results:
-                query = query_result["query"]
-                new_offers = query_result["new_offers"]
-                
-                print(f"  {len(new_offers)} new offers for query: {query.name}")
-                
-                # Send to each active notification channel
-                for notification in notification_settings:
-                    if notification.discord_webhook_url:
-                        success = send_discord_notification(
-                            notification.discord_webhook_url,
-                            new_offers,
-                            query.name
-                        )
-                        if success:
-                            print(f"    ✓ Discord notification sent")
-                        else:
-                            print(f"    ✗ Discord notification failed")
+            # Process each query
+            left = 0
+            for query in due_queries:
+                host = urlsplit(query.url).netloc
+                # Waiting for a probe that didn't close the circuit: an open portal's skip is recorded
+                # by process_query, a portal still half-open gets another probe next run
+                if query.id not in scrapes and host in deferred and get_source_health(db, host).state == HALF_OPEN:
+                    print(f"Query {query.name} (ID: {query.id}) waits for {host} to be probed, skipped")
+                    continue
+                outcome = None
+                if query.id in scrapes:
+                    outcome = scrapes[query.id].result()
+                elif not claim_query(db, query.id, owner):
+                    outcome = QUERY_BUSY
+                if outcome is QUERY_BUSY:
+                    print(f"Query {query.name} (ID: {query.id}) is being scraped on request, skipped")
+                    continue
+                if query.id in scrapes and outcome is None:
+                    release_query(db, owner, query.id)
+                    left += 1
+                    continue
+                with profiler.section(f"query-{query.id}"):
+                    result = process_query(db, query, cycle_deadline, outcome, deep=tiers[query.id] == "deep",
+                                           scrape_run_id=scrape_run.id)
+                    if ENRICH_DETAILS and result["success"] and not result["is_first_run"]:
+                        # Optional: fetch detail pages of the new offers
+                        try:
+                            enrich_offers(db, result["new_offers"])
+                        except Exception as e:
+                            print(f"  Enrichment failed: {e}")
+                            db.rollback()
+                release_query(db, owner, query.id)
+                # The probe succeeded, so the portal's other queries can be fetched
+                if probes.get(host) == query.id and get_source_health(db, host).state == CLOSED:
+                    for waiting in deferred.pop(host):
+                        submit(waiting)
+        
+        if ENRICH_DETAILS:
+            # Detail pages that failed to load or were never fetched, e.g. offers of a query's first run
+            with profiler.section("enrichment"):
+                try:
+                    enrich_offers(db, pending_offers(db))
+                except Exception as e:
+                    print(f"Enrichment failed: {e}")
+                    db.rollback()
+        
+        if left:
+            print(f"Cycle time budget exceeded, {left} queries left for the next run")
+        else:
+            print("All queries processed")
+        
+        # Note: Individual query results are already committed in process_query()
         
         print(f"Scraping run completed at {datetime.now()}")
         
@@ -219,7 +492,25 @@ def main():
         print(f"Fatal error during scraping: {e}")
         # Individual queries already handle their own commits/rollbacks
     finally:
+        stop_recording()
+        shutdown_parse_pool()
+        try:
+            # Claims of queries not processed because of an error
+            db.rollback()
+            release_query(db, owner)
+            if scrape_run is not None:
+                scrape_run.finished_at = datetime.utcnow()
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"Failed to release query claims or finish the run: {e}")
         db.close()
+        profiler.stop()
+        try:
+            profile_dir = profiler.write()
+            if profile_dir:
+                print(f"Profiles written to {profile_dir}")
+        except OSError as e:
+            print(f"Failed to write profiles: {e}")
 
 
 if __name__ == "__main__":
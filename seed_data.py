@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Fill the database with synthetic users, search queries, notification settings and offers,
+to see how the web app behaves at scale (see run_load_test.py). Every seeded user has the same password.
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# Add app directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from database import engine
+from auth import get_password_hash
+from seeding import SEED_BATCH_SIZE, SEED_USERNAME_PREFIX, SeedScale, seed, seed_username
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic data")
+    parser.add_argument("--users", type=int, default=1000, help="Number of users")
+    parser.add_argument("--queries", type=int, default=20000, help="Number of search queries, spread evenly over the users")
+    parser.add_argument("--offers", type=int, default=1000000, help="Number of offers, spread randomly over the queries")
+    parser.add_argument("--notifications", type=int, help="Number of notification settings (default: one per user)")
+    parser.add_argument("--password", default="loadtest", help="Password of all seeded users")
+    parser.add_argument("--prefix", default=SEED_USERNAME_PREFIX, help="Username prefix of the seeded users")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed, for the same data on every run")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="Rows per bulk insert")
+    args = parser.parse_args()
+
+    scale = SeedScale(
+        users=args.users, queries=args.queries, offers=args.offers,
+        notifications=args.users if args.notifications is None else args.notifications,
+    )
+    print(f"Seeding {scale.users} users, {scale.queries} queries, {scale.notifications} notification settings "
+          f"and {scale.offers} offers")
+    started = time.monotonic()
+    try:
+        # Hashed once: bcrypt takes a few hundred milliseconds per hash
+        counts = seed(engine, scale, get_password_hash(args.password), prefix=args.prefix,
+                      random_seed=args.seed, batch_size=args.batch_size)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    elapsed = time.monotonic() - started
+    print(f"Seeded {', '.join(f'{count} {name}' for name, count in counts.items())} in {elapsed:.1f}s")
+    if scale.users:
+        print(f"Log in as {seed_username(1, args.prefix)} .. {seed_username(scale.users, args.prefix)} with password '{args.password}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from database import Base
+from models import User, SearchQuery
+
+
+@pytest.fixture
+def db():
+    """A session on a fresh in-memory database."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def query(db):
+    """A "Flats" query owned by alice."""
+    user = User(username="alice", hashed_password="x")
+    db.add(user)
+    db.flush()
+    query = SearchQuery(name="Flats", url="https://www.olx.pl/a", user_id=user.id)
+    db.add(query)
+    db.commit()
+    return query
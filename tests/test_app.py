@@ -0,0 +1,141 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from urllib.parse import urlencode
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+# Allow importing from app/ and the scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app as web
+from app import queries_page, query_offer_stats, update_query
+from database import Base
+from models import User, SearchQuery, Offer
+from run_scraper import ScrapeOutcome, process_query
+from sources import OfferBatch
+
+NOW = datetime(2026, 3, 1, 12)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A file database, set up through a sync session and read by the routes through an async one."""
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([User(username="alice", hashed_password="x"), User(username="bob", hashed_password="x")])
+    db.flush()
+    db.add_all([
+        SearchQuery(name="Flats", url="https://www.olx.pl/a", user_id=1),
+        SearchQuery(name="Rooms", url="https://www.olx.pl/b", user_id=1),
+        SearchQuery(name="Other", url="https://www.olx.pl/c", user_id=2),
+    ])
+    db.commit()
+    yield db, url.replace("sqlite://", "sqlite+aiosqlite://")
+    db.close()
+    engine.dispose()
+
+
+def run_async(url, route):
+    """Run a coroutine function with an async session on the database."""
+    async def run():
+        engine = create_async_engine(url)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await route(db)
+        finally:
+            await engine.dispose()
+    return asyncio.run(run())
+
+
+def test_offer_stats_count_totals_and_recent_offers_per_query(database):
+    db, url = database
+    for number, age in enumerate([timedelta(hours=1), timedelta(hours=23), timedelta(days=2), timedelta(days=6),
+                                  timedelta(days=8), timedelta(days=30)]):
+        db.add(Offer(title=f"Flat {number}", url=f"https://www.olx.pl/flat-{number}", user_id=1, query_id=1,
+                     scraped_at=NOW - age))
+    db.add(Offer(title="Room", url="https://www.olx.pl/room", user_id=1, query_id=2, scraped_at=NOW - timedelta(days=3)))
+    db.add(Offer(title="Bob's", url="https://www.olx.pl/bob", user_id=2, query_id=3, scraped_at=NOW))
+    db.commit()
+
+    stats = run_async(url, lambda session: query_offer_stats(session, 1, NOW))
+    assert stats == {1: (6, 2, 4), 2: (1, 0, 1)}
+
+
+def make_request(method="GET", headers=None, form=None):
+    body = urlencode(form or {}).encode()
+    headers = dict(headers or {})
+    if form is not None:
+        headers["content-type"] = "application/x-www-form-urlencoded"
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({
+        "type": "http", "method": method, "path": "/queries", "query_string": b"", "session": {"user_id": 1},
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }, receive)
+
+
+@pytest.fixture
+def queries(database, monkeypatch):
+    """GET /queries as alice, with an optional If-None-Match, at a fixed time."""
+    db, url = database
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 3, 1, 12, 0, 30, tzinfo=tz)
+
+    # Relative times on the page are bucketed by the minute, so the clock is held still
+    monkeypatch.setattr(web, "datetime", FrozenDatetime)
+    alice = db.get(User, 1)
+
+    def get(**headers):
+        return run_async(url, lambda session: queries_page(make_request(headers=headers), alice, session))
+    return get
+
+
+def test_unchanged_queries_page_is_not_modified(queries):
+    response = queries()
+    assert response.status_code == 200
+    etag, last_modified = response.headers["etag"], response.headers["last-modified"]
+
+    assert queries(**{"If-None-Match": etag}).status_code == 304
+    assert queries(**{"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert queries(**{"If-Modified-Since": last_modified}).status_code == 304
+    assert queries(**{"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_editing_a_query_changes_the_etag(database, queries):
+    db, url = database
+    etag = queries().headers["etag"]
+
+    form = {"name": "Flats in Oliwa", "url": "https://www.olx.pl/a"}
+    response = run_async(url, lambda session: update_query(make_request("POST", form=form), 1, **form,
+                                                           current_user=db.get(User, 1), db=session))
+    assert response.status_code == 303
+
+    response = queries(**{"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+
+
+def test_finishing_a_scrape_changes_the_etag(database, queries):
+    db, _ = database
+    etag = queries().headers["etag"]
+
+    offers = OfferBatch()
+    offers.add(title="Flat", url="https://www.olx.pl/d/oferta/1")
+    process_query(db, db.get(SearchQuery, 1), outcome=ScrapeOutcome(offers=offers, duration=1.0))
+
+    response = queries(**{"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
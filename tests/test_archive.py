@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+
+import pytest
+import requests
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import sources
+from archive import PageArchive, iter_archived_pages, read_page
+from reparse import reparse_archive
+from sources import fetch_page
+
+OLX_PAGE = """<html><body>
+<div data-cy="l-card"><div data-cy="ad-card-title"><a href="/d/oferta/{slug}.html">{title}</a></div>
+<p data-testid="location-date">Gdańsk, Wrzeszcz - dzisiaj</p><p>2 500 zł</p></div>
+</body></html>"""
+
+
+class FakeResponse:
+    encoding = "utf-8"
+    headers = {"Content-Type": "text/html; charset=utf-8"}
+
+    def __init__(self, text: str, status_code: int = 200):
+        self.text = text
+        self.content = text.encode()
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = PageArchive(str(tmp_path), level=3)
+    sources.start_recording(archive)
+    yield archive
+    sources.stop_recording()
+
+
+def test_recorded_pages_read_back_in_order(archive, tmp_path):
+    archive.record("https://www.olx.pl/a", 200, {}, b"<p>first</p>")
+    archive.record("https://gratka.pl/b", 200, {}, "<p>drugi – ż</p>".encode(), encoding="utf-8")
+
+    pages = list(iter_archived_pages(str(tmp_path)))
+    assert [page.host for page in pages] == ["www.olx.pl", "gratka.pl"]
+    assert read_page(str(tmp_path), pages[1]).decode() == "<p>drugi – ż</p>"
+    assert [page.url for page in iter_archived_pages(str(tmp_path), host="gratka.pl")] == ["https://gratka.pl/b"]
+
+
+def test_fetched_pages_are_recorded(archive, tmp_path, monkeypatch):
+    html = OLX_PAGE.format(slug="mieszkanie-ID1", title="Mieszkanie")
+    monkeypatch.setattr(sources.requests, "get", lambda url, headers, timeout, stream=False: FakeResponse(html))
+    fetch_page("https://www.olx.pl/nieruchomosci/")
+
+    page, = iter_archived_pages(str(tmp_path))
+    assert page.url == "https://www.olx.pl/nieruchomosci/"
+    assert page.headers["Content-Type"] == "text/html; charset=utf-8"
+    assert read_page(str(tmp_path), page).decode() == html
+
+
+def test_error_pages_are_recorded(archive, tmp_path, monkeypatch):
+    monkeypatch.setattr(sources.requests, "get",
+                        lambda url, headers, timeout, stream=False: FakeResponse("<p>Too many requests</p>", 429))
+    with pytest.raises(requests.HTTPError):
+        fetch_page("https://www.olx.pl/nieruchomosci/")
+
+    page, = iter_archived_pages(str(tmp_path))
+    assert page.status == 429
+    assert read_page(str(tmp_path), page).decode() == "<p>Too many requests</p>"
+    result, = reparse_archive([page], str(tmp_path))
+    assert len(result.offers) == 0 and result.error is None
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_reparse_runs_current_parsers_over_the_archive(archive, tmp_path, processes):
+    for number in range(3):
+        html = OLX_PAGE.format(slug=f"mieszkanie-ID{number}", title=f"Mieszkanie {number}")
+        archive.record(f"https://www.olx.pl/nieruchomosci/?page={number}", 200, {}, html.encode(), "utf-8")
+    archive.record("https://example.com/", 200, {}, b"<p></p>")
+
+    results = list(reparse_archive(iter_archived_pages(str(tmp_path)), str(tmp_path), processes))
+    assert [result.offers[0].title for result in results[:3]] == ["Mieszkanie 0", "Mieszkanie 1", "Mieszkanie 2"]
+    assert results[0].offers[0].district == "Wrzeszcz"
+    assert results[3].error == "No parser for example.com"
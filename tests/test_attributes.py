@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from sources import extract_attributes, parse_district
+
+# fmt: off
+CARDS = [
+    pytest.param(
+        "Mieszkanie 2 pokoje Wrzeszcz 2 500 zł + opłaty 400 zł 45 m² - 55.56 zł/m²",
+        {"price": 2500, "area": 45.0, "rooms": 2},
+        id="olx",
+    ),
+    pytest.param("Kawalerka 28,5 m2 1800,00 zł", {"price": 1800, "area": 28.5, "rooms": 1}, id="decimal-comma"),
+    pytest.param("Przestronne 3-pokojowe mieszkanie", {"rooms": 3}, id="rooms-only"),
+    pytest.param("Mieszkanie do wynajęcia", {}, id="nothing"),
+]
+# fmt: on
+
+
+@pytest.mark.parametrize("text,expected", CARDS)
+def test_extract_attributes(text, expected):
+    assert extract_attributes(text) == expected
+
+
+def test_parse_district():
+    assert parse_district("Gdańsk, Wrzeszcz - Odświeżono dnia 12 października 2025") == "Wrzeszcz"
+    assert parse_district("Gdańsk - Dzisiaj o 12:00") is None
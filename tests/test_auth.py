@@ -0,0 +1,139 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import bcrypt
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import auth
+from database import Base
+from models import User
+from auth import LoginThrottle, authenticate_user, get_current_user, invalidate_user, needs_rehash
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_throttle_blocks_after_limit_until_window_passes(clock):
+    throttle = LoginThrottle(limit=3, window=60)
+    for _ in range(3):
+        assert throttle.retry_after("10.0.0.1") == 0
+        throttle.record("10.0.0.1")
+    assert throttle.retry_after("10.0.0.1") == 60
+    assert throttle.retry_after("10.0.0.2") == 0
+
+    clock[0] += 59
+    assert throttle.retry_after("10.0.0.1") == 1
+    clock[0] += 1
+    assert throttle.retry_after("10.0.0.1") == 0
+
+
+def test_username_lockout_only_applies_to_the_failing_client(clock):
+    throttle = LoginThrottle(limit=2, window=60)
+    for _ in range(2):
+        throttle.record(("alice", "203.0.113.7"))
+    assert throttle.retry_after(("alice", "203.0.113.7")) == 60
+    assert throttle.retry_after(("alice", "198.51.100.1")) == 0
+
+    throttle.reset(("alice", "203.0.113.7"))
+    assert throttle.retry_after(("alice", "203.0.113.7")) == 0
+
+
+def test_expired_keys_are_evicted_without_being_looked_up(clock):
+    throttle = LoginThrottle(limit=2, window=60)
+    for username in ("alice", "bob", "carol"):
+        throttle.record((username, "203.0.113.7"))
+
+    clock[0] += 30
+    throttle.record(("dave", "203.0.113.7"))
+    clock[0] += 31
+    throttle.record(("erin", "203.0.113.7"))
+    assert set(throttle._attempts) == {("dave", "203.0.113.7"), ("erin", "203.0.113.7")}
+
+
+def test_needs_rehash(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    assert not needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=5)).decode())
+    assert needs_rehash(bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode())
+    assert needs_rehash("not a bcrypt hash")
+
+
+async def _authenticate(username, password, users):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        db.add_all(users)
+        await db.commit()
+        user = await authenticate_user(db, username, password)
+    await engine.dispose()
+    return user
+
+
+def test_unknown_username_is_checked_against_the_dummy_hash(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(auth, "_dummy_hash", None)
+    checked = []
+    verify_password = auth.verify_password
+    monkeypatch.setattr(auth, "verify_password", lambda password, hashed: checked.append(hashed) or verify_password(password, hashed))
+
+    assert asyncio.run(_authenticate("mallory", "secret", [])) is False
+    assert checked == [auth._dummy_hash]
+
+
+def test_login_rehashes_password_with_the_configured_cost(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    old_hash = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode()
+
+    user = asyncio.run(_authenticate("alice", "secret", [User(username="alice", hashed_password=old_hash)]))
+    assert user.hashed_password != old_hash
+    assert not needs_rehash(user.hashed_password)
+    assert auth.verify_password("secret", user.hashed_password)
+    assert asyncio.run(_authenticate("alice", "wrong", [User(username="alice", hashed_password=old_hash)])) is False
+
+
+@pytest.fixture
+def user_loads(monkeypatch):
+    loaded = []
+
+    async def load_user(user_id):
+        loaded.append(user_id)
+        return User(id=user_id, username="alice", hashed_password="x")
+
+    monkeypatch.setattr(auth, "_user_cache", {})
+    monkeypatch.setattr(auth, "_load_user", load_user)
+    return loaded
+
+
+def test_current_user_is_cached_until_the_ttl_runs_out(clock, user_loads):
+    request = SimpleNamespace(session={"user_id": 1})
+    first = asyncio.run(get_current_user(request))
+    assert asyncio.run(get_current_user(request)) is first
+    assert user_loads == [1]
+
+    clock[0] += auth.USER_CACHE_TTL
+    assert asyncio.run(get_current_user(request)) is not first
+    assert user_loads == [1, 1]
+
+    invalidate_user(1)
+    asyncio.run(get_current_user(request))
+    assert user_loads == [1, 1, 1]
+
+
+def test_rehash_on_login_invalidates_the_cached_user(monkeypatch, clock, user_loads):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    old_hash = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode()
+    asyncio.run(get_current_user(SimpleNamespace(session={"user_id": 1})))
+    assert 1 in auth._user_cache
+
+    asyncio.run(_authenticate("alice", "secret", [User(id=1, username="alice", hashed_password=old_hash)]))
+    assert 1 not in auth._user_cache
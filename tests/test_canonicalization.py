@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from sources import canonicalize_url
+
+# fmt: off
+SAME_LISTING = [
+    pytest.param(
+        [
+            "https://www.olx.pl/d/oferta/mieszkanie-2-pokoje-CID3-ID10abcd.html",
+            "https://m.olx.pl/d/oferta/mieszkanie-2-pokoje-CID3-ID10abcd.html",
+            "https://www.olx.pl/d/oferta/mieszkanie-2-pokoje-CID3-ID10abcd.html?reason=extended_search_extended_delivery",
+            "/d/oferta/mieszkanie-2-pokoje-CID3-ID10abcd.html?search_reason=search%7Corganic#123;promoted",
+        ],
+        id="olx",
+    ),
+    pytest.param(
+        [
+            "https://gratka.pl/nieruchomosci/mieszkanie-gdansk/ob/12345678",
+            "/nieruchomosci/mieszkanie-gdansk/ob/12345678?utm_source=x",
+        ],
+        id="gratka",
+    ),
+]
+# fmt: on
+
+
+@pytest.mark.parametrize("urls", SAME_LISTING)
+def test_variants_map_to_one_url(urls):
+    """Tracking parameters, mobile hosts and fragments shouldn't produce distinct offer URLs."""
+    default_host = urls[0].split("/")[2]
+    assert len({canonicalize_url(url, default_host=default_host) for url in urls}) == 1
+
+
+def test_unknown_host_keeps_identifying_params():
+    """Hosts without a rule only lose known tracking parameters."""
+    url = canonicalize_url("https://example.com/offer?id=5&utm_source=newsletter&fbclid=abc")
+    assert url == "https://example.com/offer?id=5"
@@ -0,0 +1,28 @@
+import sys
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import database
+from database import AsyncSessionLocal, async_database_url, get_async_engine
+
+
+def test_async_database_url_picks_async_driver():
+    assert async_database_url("sqlite:///./rent_scraper.db") == "sqlite+aiosqlite:///./rent_scraper.db"
+    assert async_database_url("postgresql://app:secret@db:5432/rent") == "postgresql+asyncpg://app:secret@db:5432/rent"
+    assert async_database_url("postgresql+psycopg2://app:secret@db/rent") == "postgresql+asyncpg://app:secret@db/rent"
+    # Already async, or a backend without a known async driver: left alone
+    assert async_database_url("sqlite+aiosqlite:////data/app.db") == "sqlite+aiosqlite:////data/app.db"
+    assert async_database_url("mysql://app@db/rent") == "mysql://app@db/rent"
+
+
+def test_async_engine_is_created_on_first_use(monkeypatch):
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setitem(AsyncSessionLocal.kw, "bind", None)
+    monkeypatch.setattr(database, "SQLALCHEMY_DATABASE_URL", "sqlite:///./rent_scraper.db")
+
+    engine = get_async_engine()
+    assert engine.url.drivername == "sqlite+aiosqlite"
+    assert get_async_engine() is engine
+    assert AsyncSessionLocal.kw["bind"] is engine
@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from models import Offer
+from dedup import band_hashes, estimate_similarity, group_cross_posts, minhash, normalize_text
+
+
+def test_normalize_text_ignores_case_diacritics_and_punctuation():
+    assert normalize_text("Garaż, BALKON!  Łódź") == "garaz balkon lodz"
+
+
+def test_cross_posted_titles_share_a_bucket():
+    """Near-identical titles should be estimated as similar and land in a common LSH bucket."""
+    a = minhash("Przytulne mieszkanie 2 pokoje Wrzeszcz, balkon, garaż")
+    b = minhash("Przytulne mieszkanie 2-pokoje Wrzeszcz balkon garaz")
+
+    assert estimate_similarity(a, b) > 0.7
+    assert set(enumerate(band_hashes(a))) & set(enumerate(band_hashes(b)))
+
+
+def test_different_titles_are_not_similar():
+    a = minhash("Przytulne mieszkanie 2 pokoje Wrzeszcz, balkon, garaż")
+    b = minhash("Dom z ogrodem w Osowej, 5 pokoi")
+
+    assert estimate_similarity(a, b) < 0.3
+    assert not set(enumerate(band_hashes(a))) & set(enumerate(band_hashes(b)))
+
+
+def test_signatures_are_deterministic():
+    assert minhash("Kawalerka Oliwa") == minhash("Kawalerka Oliwa")
+
+
+def _post(db, query, url, price, area=48.0, rooms=2):
+    offer = Offer(title="Mieszkanie 2 pokoje Wrzeszcz", url=url, price=price, area=area, rooms=rooms,
+                  user_id=query.user_id, query_id=query.id)
+    db.add(offer)
+    db.flush()
+    return group_cross_posts(db, [offer])
+
+
+def test_cross_post_with_matching_attributes_is_linked(db, query):
+    _post(db, query, "https://www.olx.pl/d/oferta/1", 2500)
+    assert _post(db, query, "https://www.otodom.pl/pl/oferta/1", 2550) == []
+
+
+def test_same_title_with_different_price_is_not_a_duplicate(db, query):
+    _post(db, query, "https://www.olx.pl/d/oferta/1", 2500)
+    assert len(_post(db, query, "https://www.otodom.pl/pl/oferta/1", 3200)) == 1
+    assert len(_post(db, query, "https://www.morizon.pl/oferta/1", 2500, rooms=3)) == 1
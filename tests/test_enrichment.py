@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import enrichment
+from models import Offer, OfferDetail
+from enrichment import ENRICH_MAX_ATTEMPTS, enrich_offers, pending_offers, url_hash
+
+
+def _offer(db, query, url):
+    offer = Offer(title="Mieszkanie", url=url, user_id=query.user_id, query_id=query.id)
+    db.add(offer)
+    db.commit()
+    return offer
+
+
+def test_failed_fetches_are_retried_up_to_the_limit(db, query, monkeypatch):
+    fetched = []
+
+    def fetch_detail(url, limiter):
+        fetched.append(url)
+        return {"url_hash": url_hash(url), "url": url, "error": "HTTP 503"}
+
+    monkeypatch.setattr(enrichment, "fetch_detail", fetch_detail)
+    failing = _offer(db, query, "https://www.olx.pl/d/oferta/1")
+    never_fetched = _offer(db, query, "https://www.olx.pl/d/oferta/2")
+
+    enrich_offers(db, [failing])
+    assert pending_offers(db) == [never_fetched, failing]
+
+    for _ in range(ENRICH_MAX_ATTEMPTS):
+        enrich_offers(db, [failing])
+    assert len(fetched) == ENRICH_MAX_ATTEMPTS
+    assert db.get(OfferDetail, url_hash(failing.url)).attempts == ENRICH_MAX_ATTEMPTS
+    assert pending_offers(db) == [never_fetched]
+
+
+def test_fetched_details_are_not_fetched_again(db, query, monkeypatch):
+    monkeypatch.setattr(enrichment, "fetch_detail",
+                        lambda url, limiter: {"url_hash": url_hash(url), "url": url, "description": "Balkon"})
+    offer = _offer(db, query, "https://www.olx.pl/d/oferta/1")
+
+    assert enrich_offers(db, [offer]) == 1
+    assert enrich_offers(db, [offer]) == 0
+    assert pending_offers(db) == []
+
+
+def test_successful_retry_clears_the_earlier_failure(db, query, monkeypatch):
+    results = [{"error": "HTTP 503", "status_code": 503}, {"description": "Balkon", "status_code": 200}]
+    monkeypatch.setattr(enrichment, "fetch_detail",
+                        lambda url, limiter: {"url_hash": url_hash(url), "url": url, **results.pop(0)})
+    offer = _offer(db, query, "https://www.olx.pl/d/oferta/1")
+
+    enrich_offers(db, [offer])
+    assert pending_offers(db) == [offer]
+    enrich_offers(db, [offer])
+
+    detail = db.get(OfferDetail, url_hash(offer.url))
+    assert (detail.error, detail.status_code, detail.description, detail.attempts) == (None, 200, "Balkon", 2)
+    assert pending_offers(db) == []
+    assert enrich_offers(db, [offer]) == 0
@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+import sys
+from datetime import date, datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from database import Base
+from models import User, SearchQuery, Offer
+from export import EXPORT_COLUMNS, export_offers, iter_offer_chunks, export_statement
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    alice = User(username="alice", hashed_password="x")
+    bob = User(username="bob", hashed_password="x")
+    db.add_all([alice, bob])
+    db.flush()
+    flats = SearchQuery(name="Flats", url="https://www.olx.pl/a", user_id=alice.id)
+    rooms = SearchQuery(name="Rooms", url="https://www.olx.pl/b", user_id=alice.id)
+    other = SearchQuery(name="Other", url="https://www.olx.pl/c", user_id=bob.id)
+    db.add_all([flats, rooms, other])
+    db.flush()
+    for day in range(1, 6):
+        db.add(Offer(title=f"Flat {day}", url=f"https://www.olx.pl/flat-{day}", price=2000 + day, user_id=alice.id,
+                     query_id=flats.id, scraped_at=datetime(2026, 3, day, 12)))
+    db.add(Offer(title="Room", url="https://www.olx.pl/room", user_id=alice.id, query_id=rooms.id,
+                 scraped_at=datetime(2026, 3, 2)))
+    db.add(Offer(title="Bob's", url="https://www.olx.pl/bob", user_id=bob.id, query_id=other.id,
+                 scraped_at=datetime(2026, 3, 2)))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+def test_rows_are_read_in_fixed_size_chunks(engine):
+    chunks = list(iter_offer_chunks(engine, export_statement(), chunk_size=3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+
+
+def test_csv_export_filters_by_user_query_and_days(engine):
+    text = "".join(export_offers(engine, "csv", user_id=1, query_id=1, since=date(2026, 3, 2), until=date(2026, 3, 4)))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [row["title"] for row in rows] == ["Flat 2", "Flat 3", "Flat 4"]
+    assert rows[0]["query_name"] == "Flats"
+    assert rows[0]["price"] == "2002"
+    assert rows[0]["scraped_at"] == "2026-03-02T12:00:00"
+
+
+def test_csv_export_without_offers_has_header(engine):
+    text = "".join(export_offers(engine, "csv", user_id=99))
+    assert text.strip() == ",".join(EXPORT_COLUMNS)
+
+
+def test_ndjson_export_writes_one_object_per_line(engine):
+    lines = "".join(export_offers(engine, "ndjson", user_id=1)).splitlines()
+    records = [json.loads(line) for line in lines]
+    assert len(records) == 6
+    assert set(records[0]) == set(EXPORT_COLUMNS)
+    assert records[-1]["title"] == "Room"
+    assert records[-1]["price"] is None
+
+
+def test_unsupported_format_is_rejected(engine):
+    with pytest.raises(ValueError):
+        export_offers(engine, "xlsx")
@@ -0,0 +1,51 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from health import (
+    CIRCUIT_BASE_DELAY, CIRCUIT_FAILURE_THRESHOLD, allow_request, get_source_health, record_failure, record_success,
+)
+
+HOST = "www.olx.pl"
+
+
+def test_circuit_opens_after_consecutive_failures(db):
+    now = datetime(2026, 1, 1)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD - 1):
+        record_failure(db, HOST, "HTTP 503", now=now)
+    assert allow_request(db, HOST, now=now)
+
+    record_failure(db, HOST, "HTTP 503", now=now)
+    assert get_source_health(db, HOST).state == "open"
+    assert not allow_request(db, HOST, now=now + timedelta(seconds=CIRCUIT_BASE_DELAY - 1))
+
+
+def test_failed_probe_backs_off_exponentially(db):
+    now = datetime(2026, 1, 1)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        record_failure(db, HOST, "HTTP 503", now=now)
+
+    probe_at = now + timedelta(seconds=CIRCUIT_BASE_DELAY)
+    assert allow_request(db, HOST, now=probe_at)
+    assert get_source_health(db, HOST).state == "half_open"
+
+    record_failure(db, HOST, "HTTP 503", now=probe_at)
+    health = get_source_health(db, HOST)
+    assert health.state == "open"
+    assert health.retry_at == probe_at + timedelta(seconds=2 * CIRCUIT_BASE_DELAY)
+
+
+def test_successful_probe_closes_circuit(db):
+    now = datetime(2026, 1, 1)
+    for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+        record_failure(db, HOST, "HTTP 503", now=now)
+
+    probe_at = now + timedelta(seconds=CIRCUIT_BASE_DELAY)
+    assert allow_request(db, HOST, now=probe_at)
+    record_success(db, HOST, now=probe_at)
+
+    health = get_source_health(db, HOST)
+    assert (health.state, health.consecutive_failures, health.last_success_at) == ("closed", 0, probe_at)
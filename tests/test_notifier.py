@@ -0,0 +1,278 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+# Allow importing from app/ and the scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import notifier
+import run_scraper
+from models import NotificationOutbox, NotificationSetting, Offer as OfferRecord, ScrapeRun, SearchQuery
+from notifier import (
+    DIGEST_MAX_EMBEDS, DIGEST_MAX_MESSAGES, OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RUN_TIMEOUT, NotificationError, backoff_delay, build_digest_messages, deliver_digest, deliver_pending,
+    normalize_webhook_url,
+)
+from run_scraper import ScrapeOutcome, process_query
+from sources import Offer, OfferBatch
+
+WEBHOOK = "https://discord.com/api/webhooks/1/token"
+
+
+def test_normalize_webhook_url_collapses_aliases():
+    """Different spellings of the same Discord webhook should normalize to one URL."""
+    urls = [
+        "https://discord.com/api/webhooks/1/token",
+        " https://discordapp.com/api/webhooks/1/token/ ",
+        "https://Discord.com/api/webhooks/1/token#fragment",
+    ]
+    assert len({normalize_webhook_url(url) for url in urls}) == 1
+
+
+def test_digest_splits_into_few_messages():
+    """A digest should use full messages and only put the summary in the first one."""
+    items = [(Offer(title=f"Offer {i}", url=f"https://example.com/{i}"), ["q"]) for i in range(25)]
+    messages = build_digest_messages(items)
+
+    assert len(messages) == 3
+    assert [len(payload["embeds"]) for payload, _ in messages] == [10, 10, 5]
+    assert "25 new rental listings" in messages[0][0]["content"]
+    assert all("content" not in payload for payload, _ in messages[1:])
+
+
+def test_digest_covers_truncated_offers():
+    """Offers beyond the message cap are summarized and still covered by the last message."""
+    total = DIGEST_MAX_EMBEDS * DIGEST_MAX_MESSAGES + 3
+    items = [(Offer(title=f"Offer {i}", url=f"https://example.com/{i}"), ["a", "b"]) for i in range(total)]
+    messages = build_digest_messages(items)
+
+    assert len(messages) == DIGEST_MAX_MESSAGES
+    assert sum(len(offers) for _, offers in messages) == total
+    assert "Queries: a, b" in messages[0][0]["embeds"][0]["footer"]["text"]
+
+
+@pytest.fixture
+def setting(db, query):
+    setting = NotificationSetting(user_id=query.user_id, discord_webhook_url=WEBHOOK)
+    db.add(setting)
+    # Past the first run, so new offers are notified
+    query.initial_scan_done = True
+    db.commit()
+    return setting
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Just after the outbox entries of the test are created
+    now = [datetime.utcnow() + timedelta(seconds=1)]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now[0]
+
+    monkeypatch.setattr(notifier, "datetime", FakeDatetime)
+    return now
+
+
+@pytest.fixture
+def discord(monkeypatch):
+    posted, failures = [], []
+
+    def post_discord_message(webhook_url, payload):
+        if failures:
+            raise failures.pop(0)
+        posted.append((webhook_url, payload))
+
+    monkeypatch.setattr(notifier, "post_discord_message", post_discord_message)
+    return posted, failures
+
+
+def _outcome(*numbers):
+    offers = OfferBatch()
+    for number in numbers:
+        offers.add(title=f"Flat {number}", url=f"https://www.olx.pl/d/oferta/{number}")
+    return ScrapeOutcome(offers=offers, duration=1.0)
+
+
+def test_offers_and_notifications_are_committed_together(db, query, setting):
+    process_query(db, query, outcome=_outcome(1, 2))
+
+    db.rollback()
+    assert db.query(OfferRecord).count() == 2
+    assert db.query(NotificationOutbox).filter_by(status="pending").count() == 2
+
+
+def test_failed_enqueue_rolls_back_the_offers(monkeypatch, db, query, setting):
+    def enqueue_then_fail(db, query, offers, scrape_run_id=None):
+        notifier.enqueue_notifications(db, query, offers, scrape_run_id)
+        db.flush()
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(run_scraper, "enqueue_notifications", enqueue_then_fail)
+    result = process_query(db, query, outcome=_outcome(1, 2))
+
+    assert "database is locked" in result["error"]
+    assert db.query(OfferRecord).count() == 0
+    assert db.query(NotificationOutbox).count() == 0
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    assert backoff_delay(1) == timedelta(seconds=OUTBOX_BACKOFF_BASE)
+    assert backoff_delay(2) == timedelta(seconds=2 * OUTBOX_BACKOFF_BASE)
+    assert backoff_delay(3) == timedelta(seconds=4 * OUTBOX_BACKOFF_BASE)
+    assert backoff_delay(100) == timedelta(seconds=OUTBOX_BACKOFF_MAX)
+
+
+def test_failed_delivery_is_retried_with_growing_delays(db, query, setting, clock, discord):
+    posted, failures = discord
+    process_query(db, query, outcome=_outcome(1))
+    entry = db.query(NotificationOutbox).one()
+
+    failures.append(NotificationError("Discord returned status 500"))
+    deliver_pending(db)
+    assert (entry.status, entry.attempts) == ("pending", 1)
+    assert entry.next_attempt_at == clock[0] + backoff_delay(1)
+
+    # Not due yet
+    assert deliver_pending(db) == 0
+
+    clock[0] = entry.next_attempt_at
+    failures.append(NotificationError("Discord returned status 500"))
+    deliver_pending(db)
+    assert entry.attempts == 2
+    assert entry.next_attempt_at == clock[0] + backoff_delay(2) and backoff_delay(2) > backoff_delay(1)
+
+    clock[0] = entry.next_attempt_at
+    failures.append(NotificationError("Rate limited by Discord", retry_after=10 * OUTBOX_BACKOFF_BASE))
+    deliver_pending(db)
+    assert entry.attempts == 3
+    # The longer of the backoff and Discord's retry_after
+    assert entry.next_attempt_at == clock[0] + timedelta(seconds=10 * OUTBOX_BACKOFF_BASE)
+
+    clock[0] = entry.next_attempt_at
+    deliver_pending(db)
+    assert entry.status == "sent" and entry.last_error is None
+    assert len(posted) == 1
+
+
+def test_delivery_gives_up_after_the_last_attempt(db, query, setting, clock, discord):
+    _, failures = discord
+    process_query(db, query, outcome=_outcome(1))
+    entry = db.query(NotificationOutbox).one()
+
+    for _ in range(OUTBOX_MAX_ATTEMPTS):
+        failures.append(NotificationError("Discord returned status 500"))
+        clock[0] = entry.next_attempt_at
+        deliver_pending(db)
+    assert (entry.status, entry.attempts) == ("failed", OUTBOX_MAX_ATTEMPTS)
+
+
+def test_delivered_entries_are_not_sent_twice(db, query, setting, clock, discord):
+    posted, _ = discord
+    process_query(db, query, outcome=_outcome(1, 2))
+
+    assert deliver_pending(db) == 2
+    clock[0] += timedelta(days=1)
+    assert deliver_pending(db) == 0
+    process_query(db, query, outcome=_outcome(1, 2, 3))
+    deliver_pending(db)
+
+    assert [len(payload["embeds"]) for _, payload in posted] == [2, 1]
+    assert db.query(NotificationOutbox).filter_by(status="sent").count() == 3
+
+
+@pytest.fixture
+def rooms(db, query):
+    rooms = SearchQuery(name="Rooms", url="https://www.olx.pl/b", user_id=query.user_id, initial_scan_done=True)
+    db.add(rooms)
+    db.commit()
+    return rooms
+
+
+def test_digest_waits_for_the_scraper_run_to_finish(db, query, rooms, setting, clock, discord):
+    posted, _ = discord
+    scrape_run = ScrapeRun()
+    db.add(scrape_run)
+    db.commit()
+
+    # Each query is committed on its own, but the run's offers go out as one digest
+    process_query(db, query, outcome=_outcome(1, 2), scrape_run_id=scrape_run.id)
+    assert deliver_pending(db) == 0
+    process_query(db, rooms, outcome=_outcome(3), scrape_run_id=scrape_run.id)
+    assert deliver_pending(db) == 0
+
+    scrape_run.finished_at = clock[0]
+    db.commit()
+    assert deliver_pending(db) == 3
+    (_, payload), = posted
+    assert "3 new rental listings" in payload["content"]
+    assert [embed["footer"]["text"] for embed in payload["embeds"]] == ["Query: Flats", "Query: Flats", "Query: Rooms"]
+
+
+def test_digest_of_a_crashed_run_is_sent_after_the_timeout(db, query, setting, clock, discord):
+    posted, _ = discord
+    scrape_run = ScrapeRun(started_at=clock[0])
+    db.add(scrape_run)
+    db.commit()
+    process_query(db, query, outcome=_outcome(1), scrape_run_id=scrape_run.id)
+
+    clock[0] += timedelta(seconds=OUTBOX_RUN_TIMEOUT - 1)
+    assert deliver_pending(db) == 0
+    clock[0] += timedelta(seconds=1)
+    assert deliver_pending(db) == 1
+    assert len(posted) == 1
+
+
+def test_digest_window_holds_entries_until_the_oldest_leaves_it(db, query, setting, clock, discord):
+    posted, _ = discord
+    setting.digest_window_minutes = 30
+    db.commit()
+    process_query(db, query, outcome=_outcome(1))
+    entry = db.query(NotificationOutbox).one()
+
+    deliver_pending(db)
+    assert posted == []
+    assert entry.next_attempt_at == entry.created_at + timedelta(minutes=30)
+
+    clock[0] = entry.next_attempt_at
+    deliver_pending(db)
+    assert len(posted) == 1 and entry.status == "sent"
+
+
+def test_digest_merges_settings_sharing_a_webhook(db, query, setting, clock, discord):
+    posted, _ = discord
+    db.add(NotificationSetting(user_id=query.user_id, discord_webhook_url=" https://discordapp.com/api/webhooks/1/token/"))
+    db.add(NotificationSetting(user_id=query.user_id, discord_webhook_url=WEBHOOK, is_active=False))
+    db.commit()
+    process_query(db, query, outcome=_outcome(1, 2))
+
+    # Inactive settings don't get entries queued
+    assert deliver_pending(db) == 4
+    (webhook_url, payload), = posted
+    assert webhook_url == WEBHOOK
+    assert len(payload["embeds"]) == 2
+    assert db.query(NotificationOutbox).filter_by(status="sent").count() == 4
+
+
+def test_failed_digest_message_only_retries_its_own_offers(db, query, setting, clock, monkeypatch):
+    sent = []
+
+    def post_discord_message(webhook_url, payload):
+        if sent:
+            raise NotificationError("Discord returned status 500")
+        sent.append(payload)
+
+    monkeypatch.setattr(notifier, "post_discord_message", post_discord_message)
+    monkeypatch.setattr(notifier, "DIGEST_MESSAGE_DELAY", 0)
+    process_query(db, query, outcome=_outcome(*range(DIGEST_MAX_EMBEDS + 3)))
+    entries = db.query(NotificationOutbox).order_by(NotificationOutbox.id).all()
+
+    deliver_digest(db, WEBHOOK, entries, clock[0])
+    assert [entry.status for entry in entries] == ["sent"] * DIGEST_MAX_EMBEDS + ["pending"] * 3
+    assert all(entry.attempts == 1 and entry.next_attempt_at == clock[0] + backoff_delay(1)
+               for entry in entries[DIGEST_MAX_EMBEDS:])
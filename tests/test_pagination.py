@@ -0,0 +1,208 @@
+import pickle
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import requests
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import sources
+from sources import Checkpoint, Deadline, Offer, OfferBatch, PageEnd, ScrapeInterrupted, ScrapeTimeout, fetch_page, paginate
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+def parse_numbered_page(page, url):
+    """Pages look like '<p>3</p>'; page 3 is the last one."""
+    number = int(page.p.text)
+    offers = OfferBatch()
+    offers.add(title=f"Offer {number}", url=f"https://example.com/{number}")
+    return offers, f"https://example.com/?page={number + 1}" if number < 3 else None
+
+
+@pytest.fixture
+def portal(monkeypatch):
+    requested = []
+
+    def get(url, headers, timeout, stream=False):
+        requested.append((url, timeout))
+        number = int(url.rsplit("=", 1)[1]) if "=" in url else 1
+        return FakeResponse(f"<p>{number}</p>")
+
+    monkeypatch.setattr(sources.requests, "get", get)
+    return requested
+
+
+def test_paginate_follows_all_pages(portal):
+    offers = paginate("https://example.com/", parse_numbered_page)
+    assert sorted(offer.title for offer in offers) == ["Offer 1", "Offer 2", "Offer 3"]
+    assert all(timeout == (sources.SCRAPE_CONNECT_TIMEOUT, sources.SCRAPE_READ_TIMEOUT) for _, timeout in portal)
+
+
+def test_read_timeout_is_capped_by_deadline(portal):
+    paginate("https://example.com/", parse_numbered_page, max_pages=1, deadline=Deadline(2))
+    (_, (connect_timeout, read_timeout)), = portal
+    assert read_timeout <= 2 and connect_timeout <= 2
+
+
+def test_expired_deadline_keeps_fetched_pages(portal):
+    deadline = Deadline(60)
+
+    def parse_then_expire(page, url):
+        offers, next_url = parse_numbered_page(page, url)
+        if page.p.text == "2":
+            deadline.expires_at = time.monotonic()
+        return offers, next_url
+
+    with pytest.raises(ScrapeTimeout) as excinfo:
+        paginate("https://example.com/", parse_then_expire, deadline=deadline)
+
+    assert excinfo.value.pages_fetched == 2
+    assert sorted(offer.title for offer in excinfo.value.offers) == ["Offer 1", "Offer 2"]
+    assert len(portal) == 2
+
+
+def test_timeout_without_deadline_is_an_error(monkeypatch):
+    def get(url, headers, timeout, stream=False):
+        raise requests.ReadTimeout("portal hung")
+
+    monkeypatch.setattr(sources.requests, "get", get)
+    with pytest.raises(ScrapeInterrupted) as excinfo:
+        paginate("https://example.com/", parse_numbered_page, deadline=Deadline(60))
+
+    # A portal that stopped responding is a failure, not a budget that ran out
+    assert not isinstance(excinfo.value, ScrapeTimeout)
+    assert isinstance(excinfo.value.__cause__, requests.Timeout)
+
+
+def test_nested_deadline_uses_the_earlier_expiry():
+    cycle = Deadline(5)
+    assert Deadline(300, parent=cycle).remaining() <= 5
+    assert Deadline(None).remaining() is None
+
+
+def test_failed_page_keeps_fetched_pages_and_resumes(monkeypatch):
+    def get(url, headers, timeout, stream=False):
+        if url.endswith("page=3"):
+            raise requests.ConnectionError("connection reset")
+        number = int(url.rsplit("=", 1)[1]) if "=" in url else 1
+        return FakeResponse(f"<p>{number}</p>")
+
+    monkeypatch.setattr(sources.requests, "get", get)
+    with pytest.raises(ScrapeInterrupted) as excinfo:
+        paginate("https://example.com/", parse_numbered_page)
+
+    assert sorted(offer.title for offer in excinfo.value.offers) == ["Offer 1", "Offer 2"]
+    assert excinfo.value.resume_at == Checkpoint(url="https://example.com/?page=3", page=3)
+
+
+def test_paginate_resumes_from_checkpoint(portal):
+    resume = Checkpoint(url="https://example.com/?page=3", page=3)
+    offers = paginate("https://example.com/", parse_numbered_page, resume=resume)
+
+    assert [offer.title for offer in offers] == ["Offer 3"]
+    assert [url for url, _ in portal] == ["https://example.com/?page=3"]
+
+
+class FakeStreamingResponse:
+    encoding = "utf-8"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.chunks_read = 0
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.chunks_read += 1
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+PAGE_END = PageEnd(
+    is_listing=lambda element: element.tag == "li",
+    is_pagination=lambda element: element.tag == "a" and element.get("rel") == "next",
+)
+
+
+def test_streaming_fetch_stops_after_pagination_below_listings(monkeypatch):
+    response = FakeStreamingResponse([
+        '<html><body><a rel="next" href="/?page=2">Następna</a><ul>'.encode(),
+        b"<li>Kawalerka</li><li>Dwa pokoje</li></ul>",
+        b'<a rel="next" href="/?page=2">Dalej</a>',
+        b"<script>" + b"x" * 100_000 + b"</script>",
+        b"</body></html>",
+    ])
+    monkeypatch.setattr(sources.requests, "get", lambda url, headers, timeout, stream=False: response)
+
+    html = fetch_page("https://example.com/", page_end=PAGE_END)
+
+    # The pagination above the listings doesn't stop the download, the one below does
+    assert response.chunks_read == 3
+    assert "Następna" in html and "Dwa pokoje" in html and "<script>" not in html
+
+
+def test_streaming_fetch_reads_whole_page_without_pagination(monkeypatch):
+    response = FakeStreamingResponse([b"<html><body><ul><li>Kawalerka</li></ul>", b"</body></html>"])
+    monkeypatch.setattr(sources.requests, "get", lambda url, headers, timeout, stream=False: response)
+
+    assert fetch_page("https://example.com/", page_end=PAGE_END).endswith("</html>")
+    assert response.chunks_read == 2
+
+
+def test_parse_pool_gives_the_same_offers(monkeypatch):
+    html = "<html><body>" + "".join(
+        f'<div data-cy="l-card"><div data-cy="ad-card-title"><a href="/d/oferta/mieszkanie-ID{i}.html">'
+        f'Mieszkanie {i}, 2 pokoje</a></div></div>'
+        for i in range(20)
+    ) + "</body></html>"
+    monkeypatch.setattr(sources.requests, "get", lambda url, headers, timeout, stream=False: FakeResponse(html))
+    monkeypatch.setattr(sources, "SCRAPE_STREAMING", False)
+
+    in_process = sources.get_olx_offers("https://www.olx.pl/nieruchomosci/")
+    sources.start_parse_pool(2)
+    try:
+        in_pool = sources.get_olx_offers("https://www.olx.pl/nieruchomosci/")
+    finally:
+        sources.shutdown_parse_pool()
+
+    assert len(in_process) == 20
+    assert sorted(in_pool, key=lambda offer: offer.url) == sorted(in_process, key=lambda offer: offer.url)
+
+
+def test_offer_batch_keeps_first_offer_per_url_and_survives_pickling():
+    batch = OfferBatch()
+    assert batch.add("Kawalerka", "https://example.com/1", price=1800)
+    assert batch.add("Dwa pokoje", "https://example.com/2", rooms=2)
+    assert not batch.add("Kawalerka (edited)", "https://example.com/1", price=1700)
+
+    restored = pickle.loads(pickle.dumps(batch))
+    assert len(restored) == 2
+    assert restored[0] == Offer("Kawalerka", "https://example.com/1") and restored[0].price == 1800
+    assert not restored.add("Again", "https://example.com/2")
+    assert [offer.title for offer in restored.take([1])] == ["Dwa pokoje"]
+
+
+def test_page_listener_sees_every_page(portal):
+    seen = []
+    with sources.listen_to_pages(lambda number, offers: seen.append((number, [offer.title for offer in offers]))):
+        paginate("https://example.com/", parse_numbered_page)
+    paginate("https://example.com/", parse_numbered_page)
+
+    assert seen == [(1, ["Offer 1"]), (2, ["Offer 2"]), (3, ["Offer 3"])]
@@ -0,0 +1,54 @@
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from profiling import DeterministicProfiler, SamplingProfiler
+
+
+def busy(seconds: float) -> None:
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_deterministic_profiles_keep_only_the_slowest_queries(tmp_path):
+    profiler = DeterministicProfiler(str(tmp_path), slowest=1)
+    with profiler.section("backfill"):
+        busy(0.01)
+    with profiler.section("query-1"):
+        busy(0.01)
+    with profiler.section("query-2"):
+        busy(0.05)
+    # A query's fetching and processing add up
+    with profiler.section("query-1"):
+        busy(0.01)
+
+    directory = profiler.write()
+    assert sorted(path.name for path in directory.iterdir()) == [
+        "backfill.pstats", "cycle.pstats", "query-2.pstats", "summary.txt",
+    ]
+    functions = {function for _, _, function in pstats.Stats(str(directory / "query-2.pstats")).stats}
+    assert "busy" in functions
+    assert profiler.durations["query-1"] >= 0.02
+
+
+def test_sampling_attributes_samples_to_the_thread_section(tmp_path):
+    profiler = SamplingProfiler(str(tmp_path), interval=0.001)
+    profiler.start()
+    worker = threading.Thread(target=profiler.run, args=("query-7", busy, 0.1), name="scrape_0")
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    directory = profiler.write()
+    stacks = (directory / "query-7.folded").read_text().splitlines()
+    assert stacks
+    assert all(line.startswith("scrape_0;") for line in stacks)
+    # Most common stack first
+    assert "busy (test_profiling.py" in stacks[0]
+    assert (directory / "cycle.folded").exists()
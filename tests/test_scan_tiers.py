@@ -0,0 +1,141 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+
+# Allow importing from app/ and the scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import run_scraper
+from health import get_source_health
+from models import NotificationOutbox, NotificationSetting, SearchQuery
+from run_scraper import ScrapeOutcome, plan_fetches, process_query, scan_tier, scrape_with_budget
+from sources import Checkpoint, OfferBatch, ScrapeInterrupted, ScrapeTimeout
+
+NOW = datetime(2026, 3, 1, 12)
+
+
+def test_deep_scan_first_then_head_scans_until_due(monkeypatch, query):
+    monkeypatch.setattr(run_scraper, "SCRAPE_DEEP_INTERVAL", 3600)
+    monkeypatch.setattr(run_scraper, "SCRAPE_HEAD_INTERVAL", 300)
+    assert scan_tier(query, NOW) == "deep"
+
+    query.last_deep_scan_at = query.last_scraped_at = NOW
+    assert scan_tier(query, NOW + timedelta(seconds=60)) is None
+    assert scan_tier(query, NOW + timedelta(seconds=300)) == "head"
+    assert scan_tier(query, NOW + timedelta(seconds=3600)) == "deep"
+
+    # An interrupted deep scan is continued right away
+    query.checkpoint_url = "https://example.com/flats?page=3"
+    assert scan_tier(query, NOW + timedelta(seconds=60)) == "deep"
+
+
+def test_head_scan_keeps_the_deep_scan_checkpoint(db, query):
+    query.last_scraped_at = query.last_deep_scan_at = NOW
+    query.checkpoint_url, query.checkpoint_page = "https://example.com/flats?page=3", 3
+    offers = OfferBatch()
+    offers.add(title="New flat", url="https://example.com/new")
+
+    process_query(db, query, outcome=ScrapeOutcome(offers=offers, duration=1.0, deep=False))
+    assert query.checkpoint_page == 3
+    assert query.last_deep_scan_at == NOW
+    assert query.last_scraped_at > NOW
+
+    process_query(db, query, outcome=ScrapeOutcome(offers=offers, duration=1.0))
+    assert query.checkpoint_url is None
+    assert query.last_deep_scan_at == query.last_scraped_at
+
+
+def _offers(*numbers):
+    offers = OfferBatch()
+    for number in numbers:
+        offers.add(title=f"Flat {number}", url=f"https://example.com/{number}")
+    return offers
+
+
+def test_interrupted_first_deep_scan_doesnt_notify_the_remaining_pages(db, query):
+    db.add(NotificationSetting(user_id=query.user_id, discord_webhook_url="https://discord.com/api/webhooks/1/token"))
+    db.commit()
+
+    interrupted = ScrapeTimeout("Query budget exceeded", _offers(1, 2), 2,
+                                Checkpoint(url="https://example.com/flats?page=3", page=3))
+    outcome = ScrapeOutcome(offers=interrupted.offers, duration=1.0, interrupted=interrupted)
+    result = process_query(db, query, outcome=outcome)
+    assert result["is_first_run"] and query.checkpoint_page == 3
+
+    # A failed page on the resumed scan keeps it a first run too
+    failed = ScrapeInterrupted("HTTP 503", _offers(3), 1, Checkpoint(url="https://example.com/flats?page=4", page=4))
+    outcome = ScrapeOutcome(offers=failed.offers, duration=1.0, interrupted=failed)
+    assert process_query(db, query, outcome=outcome)["is_first_run"]
+
+    result = process_query(db, query, outcome=ScrapeOutcome(offers=_offers(4, 5), duration=1.0))
+    assert result["is_first_run"] and len(result["new_offers"]) == 2
+    assert query.initial_scan_done
+    assert db.query(NotificationOutbox).count() == 0
+
+    result = process_query(db, query, outcome=ScrapeOutcome(offers=_offers(1, 6), duration=1.0, deep=False))
+    assert not result["is_first_run"]
+    assert [entry.offer.url for entry in db.query(NotificationOutbox)] == ["https://example.com/6"]
+
+
+def test_failed_runs_are_left_out_of_the_average_duration(db, query):
+    process_query(db, query, outcome=ScrapeOutcome(offers=OfferBatch(), duration=300.0, error=Exception("HTTP 503")))
+    assert query.last_scrape_status == "error"
+    assert (query.scrape_runs, query.total_scrape_duration) == (0, 0.0)
+
+    process_query(db, query, outcome=ScrapeOutcome(offers=_offers(1), duration=2.5))
+    assert (query.scrape_runs, query.total_scrape_duration) == (1, 2.5)
+
+
+def test_database_errors_dont_count_against_the_portal(monkeypatch, db, query):
+    def locked(*args):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+    failures = []
+    monkeypatch.setattr(run_scraper, "group_cross_posts", locked)
+    monkeypatch.setattr(run_scraper, "record_failure", lambda db, host, error: failures.append(host))
+    query.url = "https://www.olx.pl/nieruchomosci/"
+    query.checkpoint_url, query.checkpoint_page = "https://www.olx.pl/nieruchomosci/?page=3", 3
+    db.commit()
+    offers = OfferBatch()
+    offers.add(title="New flat", url="https://www.olx.pl/d/oferta/new")
+
+    result = process_query(db, query, outcome=ScrapeOutcome(offers=offers, duration=1.0))
+    assert "database is locked" in result["error"]
+    assert query.last_scrape_status == "error"
+    assert query.checkpoint_page == 3
+    assert failures == []
+
+
+def test_half_open_portal_gets_a_single_probe(db, query):
+    query.url = "https://example.com/flats"
+    health = get_source_health(db, "www.olx.pl")
+    health.state, health.retry_at = "open", datetime.utcnow() - timedelta(seconds=1)
+    queries = [SearchQuery(name=f"Flats {n}", url=f"https://www.olx.pl/flats/{n}", user_id=query.user_id)
+               for n in range(3)]
+    db.add_all(queries)
+    db.commit()
+
+    fetched, probes, deferred = plan_fetches(db, [query] + queries)
+    assert fetched == [query, queries[0]]
+    assert probes == {"www.olx.pl": queries[0].id}
+    assert deferred == {"www.olx.pl": queries[1:]}
+
+
+def test_resumed_deep_scan_polls_the_head_first(monkeypatch):
+    calls = []
+
+    def scrape_query(url, deadline=None, resume=None, max_pages=None):
+        calls.append((resume.page if resume else 1, max_pages))
+        offers = OfferBatch()
+        offers.add(title="Flat", url=f"https://example.com/{len(calls)}")
+        if resume:
+            raise ScrapeTimeout("Query budget exceeded", offers, 1, Checkpoint(url="https://example.com/flats?page=5", page=5))
+        return offers
+
+    monkeypatch.setattr(run_scraper, "scrape_query", scrape_query)
+    outcome = scrape_with_budget("https://example.com/flats", Checkpoint(url="https://example.com/flats?page=3", page=3))
+    assert calls == [(1, run_scraper.SCRAPE_HEAD_PAGES), (3, None)]
+    assert outcome.offers.urls == ["https://example.com/1", "https://example.com/2"]
+    assert outcome.interrupted.resume_at.page == 5
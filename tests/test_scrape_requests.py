@@ -0,0 +1,65 @@
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from scrape_requests import (
+    SCRAPE_CLAIM_TIMEOUT, SCRAPE_REQUEST_EXPIRY, add_event, claim_next_request, claim_query, events_after,
+    finish_request, format_sse, release_query, request_scrape,
+)
+
+
+def test_query_is_queued_once_until_scraped(db, query):
+    first = request_scrape(db, query)
+    assert request_scrape(db, query).id == first.id
+
+    assert claim_next_request(db).id == first.id
+    assert claim_next_request(db) is None
+    assert request_scrape(db, query).id == first.id
+
+    finish_request(db, first, total_offers=3)
+    assert first.status == "done"
+    assert request_scrape(db, query).id != first.id
+
+
+def test_stale_requests_are_failed_instead_of_claimed(db, query):
+    scrape_request = request_scrape(db, query)
+    later = datetime.utcnow() + timedelta(seconds=SCRAPE_REQUEST_EXPIRY + 1)
+
+    assert claim_next_request(db, now=later) is None
+    assert scrape_request.status == "error"
+    assert events_after(db, scrape_request.id)[-1].kind == "error"
+
+
+def test_events_stream_in_order_from_the_last_seen(db, query):
+    scrape_request = request_scrape(db, query)
+    started = add_event(db, scrape_request, "started", query=query.name)
+    add_event(db, scrape_request, "page", page=1, offers=2, new_offers=[])
+    finish_request(db, scrape_request, total_offers=2)
+
+    events = events_after(db, scrape_request.id, after_id=started.id)
+    assert [event.kind for event in events] == ["page", "done"]
+    message = format_sse(events[0])
+    assert message.startswith(f"id: {events[0].id}\nevent: page\ndata: ") and message.endswith("\n\n")
+    assert json.loads(message.split("data: ", 1)[1]) == {"page": 1, "offers": 2, "new_offers": []}
+
+
+def test_query_is_scraped_by_one_process_at_a_time(db, query):
+    updated_at = query.updated_at
+    assert claim_query(db, query.id, "scraper-1")
+    assert claim_query(db, query.id, "scraper-1")
+    assert not claim_query(db, query.id, "worker-2")
+
+    release_query(db, "worker-2", query.id)
+    assert not claim_query(db, query.id, "worker-2")
+    release_query(db, "scraper-1", query.id)
+    assert claim_query(db, query.id, "worker-2")
+    db.refresh(query)
+    assert query.updated_at == updated_at
+
+    # A claim left behind by a crashed process runs out
+    later = datetime.utcnow() + timedelta(seconds=SCRAPE_CLAIM_TIMEOUT + 1)
+    assert claim_query(db, query.id, "scraper-3", now=later)
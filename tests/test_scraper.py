@@ -0,0 +1,74 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import scraper
+from scraper import normalize_query_url, preview_query
+from sources import OfferBatch
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # Only the preview cache sees the fake clock; the event loop keeps the real one
+    monkeypatch.setattr(scraper, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(scraper, "_preview_cache", {})
+    monkeypatch.setattr(scraper, "_preview_inflight", {})
+    return now
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    fetched = []
+    release = threading.Event()
+
+    def fetch_first_page(url):
+        fetched.append(url)
+        release.wait(5)
+        offers = OfferBatch()
+        for number in range(7):
+            offers.add(title=f"Offer {number}", url=f"https://example.com/{number}")
+        return offers
+
+    monkeypatch.setattr(scraper, "fetch_first_page", fetch_first_page)
+    return SimpleNamespace(urls=fetched, release=release)
+
+
+def test_concurrent_previews_share_one_fetch_until_the_ttl_runs_out(clock, fetches):
+    async def preview_twice():
+        first = asyncio.ensure_future(preview_query("https://www.olx.pl/a?b=2&a=1"))
+        second = asyncio.ensure_future(preview_query("https://WWW.olx.pl/a?a=1&b=2"))
+        while not fetches.urls:
+            await asyncio.sleep(0.01)
+        fetches.release.set()
+        return await asyncio.gather(first, second)
+
+    (offers, has_more), same = asyncio.run(preview_twice())
+    assert fetches.urls == ["https://www.olx.pl/a?b=2&a=1"]
+    assert [offer.title for offer in offers] == [f"Offer {number}" for number in range(5)] and has_more
+    assert same == (offers, has_more)
+    assert not scraper._preview_inflight
+
+    clock[0] += scraper.PREVIEW_CACHE_TTL - 1
+    asyncio.run(preview_query("https://www.olx.pl/a?a=1&b=2"))
+    assert len(fetches.urls) == 1
+
+    clock[0] += 1
+    asyncio.run(preview_query("https://www.olx.pl/a?a=1&b=2"))
+    assert len(fetches.urls) == 2
+
+
+def test_preview_cache_evicts_the_oldest_entry(monkeypatch, clock, fetches):
+    monkeypatch.setattr(scraper, "PREVIEW_CACHE_MAX_ENTRIES", 2)
+    fetches.release.set()
+    for name in ("a", "b", "c"):
+        asyncio.run(preview_query(f"https://www.olx.pl/{name}"))
+
+    assert list(scraper._preview_cache) == [normalize_query_url(f"https://www.olx.pl/{name}") for name in ("b", "c")]
@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, create_mock_engine
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from models import User, SearchQuery, Offer
+from search import ensure_search_index, search_offers, search_supported
+
+
+@pytest.fixture
+def db(db):
+    ensure_search_index(db.get_bind())
+    for username in ("alice", "bob"):
+        user = User(username=username, hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(SearchQuery(name="Flats", url="https://www.olx.pl/a", user_id=user.id))
+    db.commit()
+    return db
+
+
+def _add(db, title, user_id=1, district=None):
+    offer = Offer(title=title, url=f"https://www.olx.pl/d/oferta/{title}-{user_id}", district=district,
+                  user_id=user_id, query_id=user_id)
+    db.add(offer)
+    db.commit()
+    return offer
+
+
+def _titles(results):
+    return sorted(result.title for result in results)
+
+
+def test_search_supported_only_on_sqlite():
+    assert search_supported(create_engine("sqlite://"))
+    assert not search_supported(create_mock_engine("postgresql://app@db/rent", executor=None))
+
+
+def test_search_folds_diacritics_and_matches_prefixes(db):
+    _add(db, "Mieszkanie z garażem", district="Żabianka")
+    _add(db, "Kawalerka bez garazu")
+
+    assert _titles(search_offers(db, 1, "garaz")[0]) == ["Kawalerka bez garazu", "Mieszkanie z garażem"]
+    assert _titles(search_offers(db, 1, "zabianka")[0]) == ["Mieszkanie z garażem"]
+    assert search_offers(db, 1, "!!!") == ([], None)
+
+
+def test_index_follows_inserts_updates_and_deletes(db):
+    offer = _add(db, "Mieszkanie balkon")
+    _add(db, "Mieszkanie balkon", user_id=2)
+    assert _titles(search_offers(db, 1, "balkon")[0]) == ["Mieszkanie balkon"]
+
+    offer.title = "Mieszkanie ogród"
+    db.commit()
+    assert search_offers(db, 1, "balkon")[0] == []
+    assert _titles(search_offers(db, 1, "ogrod")[0]) == ["Mieszkanie ogród"]
+
+    db.delete(offer)
+    db.commit()
+    assert search_offers(db, 1, "ogrod")[0] == []
+
+
+def test_keyset_pagination_visits_every_result_once(db):
+    for number in range(7):
+        _add(db, f"Mieszkanie {number}")
+
+    seen, cursor = [], None
+    while True:
+        results, cursor = search_offers(db, 1, "mieszkanie", after=cursor, limit=3)
+        seen.extend(result.id for result in results)
+        if cursor is None:
+            break
+    assert len(seen) == 7 and len(set(seen)) == 7
+
+    with pytest.raises(ValueError):
+        search_offers(db, 1, "mieszkanie", after="not-a-cursor")
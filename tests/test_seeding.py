@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+# Allow importing from app/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from database import Base
+from models import User, SearchQuery, NotificationSetting, Offer
+from seeding import SeedScale, seed
+from sources import HANDLERS
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username="alice", hashed_password="x"))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+def test_seed_inserts_consistent_data_in_batches(engine):
+    counts = seed(engine, SeedScale(users=4, queries=10, offers=250, notifications=4), "hash", batch_size=100)
+    assert counts == {"users": 4, "queries": 10, "notifications": 4, "offers": 250}
+
+    db = sessionmaker(bind=engine)()
+    users = db.query(User).filter(User.username.startswith("loadtest-")).order_by(User.id).all()
+    assert [user.username for user in users] == ["loadtest-00001", "loadtest-00002", "loadtest-00003", "loadtest-00004"]
+    # Ids continue after the existing user
+    assert users[0].id == 2
+    # Queries are spread evenly over the users
+    per_user = dict(db.query(SearchQuery.user_id, func.count(SearchQuery.id)).group_by(SearchQuery.user_id))
+    assert sorted(per_user.values()) == [2, 2, 3, 3]
+    # Queries search portals the scraper handles
+    assert all(query.url.split("/")[2] in HANDLERS for query in db.query(SearchQuery))
+    # Every offer belongs to its query's user and is on the query's portal
+    for offer in db.query(Offer).limit(50):
+        assert offer.user_id == offer.query.user_id
+        assert offer.url.split("/")[2] == offer.query.url.split("/")[2]
+    assert db.query(NotificationSetting).count() == 4
+    db.close()
+
+
+def _offer_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(Offer.title, Offer.price, Offer.district).order_by(Offer.id)).all()
+
+
+def test_seed_is_repeatable_and_refuses_existing_prefix(engine):
+    scale = SeedScale(users=2, queries=3, offers=20, notifications=0)
+    seed(engine, scale, "hash", random_seed=7)
+    with pytest.raises(ValueError):
+        seed(engine, scale, "hash", random_seed=7)
+
+    other = create_engine("sqlite://")
+    Base.metadata.create_all(other)
+    seed(other, scale, "hash", prefix="other-", random_seed=7)
+    assert _offer_rows(other) == _offer_rows(engine)